@@ -0,0 +1,30 @@
+"""extend ix_conversation_user_char with id
+
+Revision ID: 5e1f8a3c7d20
+Revises: 3b7d2c9e41a6
+Create Date: 2026-10-17 10:02:47.118530
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e1f8a3c7d20'
+down_revision: Union[str, Sequence[str], None] = '3b7d2c9e41a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_conversation_user_char', table_name='conversations')
+    op.create_index('ix_conversation_user_char', 'conversations', ['user_id', 'character_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversation_user_char', table_name='conversations')
+    op.create_index('ix_conversation_user_char', 'conversations', ['user_id', 'character_id'], unique=False)
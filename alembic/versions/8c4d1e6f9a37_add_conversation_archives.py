@@ -0,0 +1,42 @@
+"""add conversation_archives
+
+Revision ID: 8c4d1e6f9a37
+Revises: 5e1f8a3c7d20
+Create Date: 2026-10-17 11:20:05.631942
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4d1e6f9a37'
+down_revision: Union[str, Sequence[str], None] = '5e1f8a3c7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('conversation_archives',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('character_id', sa.Integer(), nullable=False),
+    sa.Column('first_conversation_id', sa.Integer(), nullable=False),
+    sa.Column('last_conversation_id', sa.Integer(), nullable=False),
+    sa.Column('turn_count', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.LargeBinary().with_variant(mysql.MEDIUMBLOB(), 'mysql'), nullable=False),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=False),
+    sa.ForeignKeyConstraint(['character_id'], ['characters.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_archive_user_char', 'conversation_archives', ['user_id', 'character_id', 'last_conversation_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_archive_user_char', table_name='conversation_archives')
+    op.drop_table('conversation_archives')
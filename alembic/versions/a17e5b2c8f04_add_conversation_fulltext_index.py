@@ -0,0 +1,32 @@
+"""add FULLTEXT ngram index on conversations
+
+Revision ID: a17e5b2c8f04
+Revises: 8c4d1e6f9a37
+Create Date: 2026-10-17 12:41:19.250876
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a17e5b2c8f04'
+down_revision: Union[str, Sequence[str], None] = '8c4d1e6f9a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 需要 MySQL 5.7.6+ 内置的 ngram 分词器；大表上建索引耗时较长，建议在低峰期执行
+    op.create_index(
+        'ft_conversation_messages', 'conversations', ['user_message', 'ai_message'],
+        unique=False, mysql_prefix='FULLTEXT', mysql_with_parser='ngram'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ft_conversation_messages', table_name='conversations')
@@ -0,0 +1,33 @@
+"""add missing lookup indexes
+
+Revision ID: c2b9f4d6e813
+Revises: a17e5b2c8f04
+Create Date: 2026-10-17 13:55:42.804117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2b9f4d6e813'
+down_revision: Union[str, Sequence[str], None] = 'a17e5b2c8f04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # user_info 与 users 一对一：按 user_id 查询走唯一索引
+    # （若已有重复数据，需要先清理，否则建唯一索引会失败）
+    op.create_index(op.f('ix_user_info_user_id'), 'user_info', ['user_id'], unique=True)
+    # 单列 user_id 索引是 ix_conversation_user_char 的最左前缀，属于冗余索引，删除以减少写入开销
+    op.drop_index(op.f('ix_conversations_user_id'), table_name='conversations')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_conversations_user_id'), 'conversations', ['user_id'], unique=False)
+    op.drop_index(op.f('ix_user_info_user_id'), table_name='user_info')
@@ -0,0 +1,29 @@
+"""add conversation_summaries.restored_at
+
+Revision ID: d4e7a1c9b352
+Revises: c2b9f4d6e813
+Create Date: 2026-10-17 16:20:08.113502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4e7a1c9b352'
+down_revision: Union[str, Sequence[str], None] = 'c2b9f4d6e813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 从归档恢复的时间：恢复的对话在线满一个归档周期之前不再被归档任务选中
+    op.add_column('conversation_summaries', sa.Column('restored_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('conversation_summaries', 'restored_at')
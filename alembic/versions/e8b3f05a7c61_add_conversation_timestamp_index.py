@@ -0,0 +1,30 @@
+"""add conversation timestamp index
+
+Revision ID: e8b3f05a7c61
+Revises: d4e7a1c9b352
+Create Date: 2026-10-17 16:42:57.390114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f05a7c61'
+down_revision: Union[str, Sequence[str], None] = 'd4e7a1c9b352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # 归档任务（timestamp < cutoff 后按用户、角色分组）与按时间范围导出都依赖该索引
+    # （InnoDB 在线建索引，不阻塞写入，大表上仍需一段时间）
+    op.create_index('ix_conversation_timestamp', 'conversations', ['timestamp'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_conversation_timestamp', table_name='conversations')
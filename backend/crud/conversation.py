@@ -1,6 +1,13 @@
 # backend/crud/conversations.py
-from backend.database import AsyncSessionLocal
-from backend.models.conversation import Conversation
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional
+from sqlalchemy import and_, or_, delete, insert, update, func, tuple_
+from sqlalchemy.dialects.mysql import match
+from sqlmodel import select
+from backend.database import AsyncSessionLocal, ReadSessionLocal, mark_written, read_session
+from backend.models.conversation import Conversation, ConversationSummary, ConversationArchive
 
 async def save_conversation(user_id: int, character_id: int, user_msg: str, ai_msg: str):
     async with AsyncSessionLocal() as db:
@@ -15,8 +22,401 @@ async def save_conversation(user_id: int, character_id: int, user_msg: str, ai_m
             
             db.add(record)
             await db.commit()
-            await db.refresh(record)  # 刷新以获取ID等数据库生成的值
+            mark_written(user_id)
             return True
         except Exception as e:
             await db.rollback()
             raise Exception(f"[DB] Failed to save conversation for user {user_id}: {e}")
+
+async def save_conversations_bulk(records: list[dict]) -> int:
+    """
+    批量写入对话记录（多行 INSERT，一次提交）
+    :param records: 包含 user_id, character_id, user_message, ai_message（可选 timestamp）的字典列表
+    :return: 写入条数
+    """
+    if not records:
+        return 0
+    async with AsyncSessionLocal() as db:
+        try:
+            await db.execute(insert(Conversation), records)
+            await db.commit()
+            mark_written(*{r["user_id"] for r in records})
+            return len(records)
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[DB] Failed to bulk save {len(records)} conversations: {e}")
+
+async def get_recent_conversations(user_id: int, character_id: int, after_id: int = 0, limit: int = 20) -> list[dict]:
+    """
+    查询某用户与某角色最近的若干轮对话（只取 id > after_id 的记录）
+    :return: 按时间正序排列的对话列表
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Conversation.id, Conversation.user_message, Conversation.ai_message)
+            .where(
+                Conversation.user_id == user_id,
+                Conversation.character_id == character_id,
+                Conversation.id > after_id
+            )
+            .order_by(Conversation.id.desc())
+            .limit(limit)
+        )
+        rows = result.all()
+        return [{
+            "id": r.id,
+            "user_message": r.user_message,
+            "ai_message": r.ai_message
+        } for r in reversed(rows)]
+
+async def get_oldest_conversations(user_id: int, character_id: int, after_id: int, limit: int) -> list[dict]:
+    """
+    查询尚未折叠进摘要的最早若干轮对话（按时间正序）
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(Conversation.id, Conversation.user_message, Conversation.ai_message)
+            .where(
+                Conversation.user_id == user_id,
+                Conversation.character_id == character_id,
+                Conversation.id > after_id
+            )
+            .order_by(Conversation.id.asc())
+            .limit(limit)
+        )
+        return [{
+            "id": r.id,
+            "user_message": r.user_message,
+            "ai_message": r.ai_message
+        } for r in result.all()]
+
+async def get_conversation_page(user_id: int, character_id: int, before_id: Optional[int], limit: int) -> list[dict]:
+    """
+    历史记录分页（keyset 分页）：取 id < before_id 的最近 limit 条，走 (user_id, character_id, id) 索引，
+    无论翻到多早的记录都只扫描 limit 行
+    :return: 按 id 倒序排列的对话列表
+    """
+    conditions = [Conversation.user_id == user_id, Conversation.character_id == character_id]
+    if before_id is not None:
+        conditions.append(Conversation.id < before_id)
+    async with read_session(user_id) as db:
+        result = await db.execute(
+            select(Conversation.id, Conversation.user_message, Conversation.ai_message, Conversation.timestamp)
+            .where(*conditions)
+            .order_by(Conversation.id.desc())
+            .limit(limit)
+        )
+        return [{
+            "id": r.id,
+            "user_message": r.user_message,
+            "ai_message": r.ai_message,
+            "timestamp": r.timestamp.isoformat() if r.timestamp else None
+        } for r in result.all()]
+
+async def search_conversations(
+    user_id: int,
+    keyword: str,
+    character_id: Optional[int] = None,
+    offset: int = 0,
+    limit: int = 20
+) -> list[dict]:
+    """
+    在某用户的对话中全文检索（FULLTEXT ngram 索引，自然语言模式），按相关度降序分页
+
+    已知限制：InnoDB 的 FULLTEXT 索引不能带 user_id 前缀列，MATCH 总是在全表的倒排索引上求出所有命中行，
+    user_id / character_id 条件在其后逐行过滤（也无法改写为先按 user_id 取子集再 MATCH：
+    MATCH 只能作用于带 FULLTEXT 索引的基表列）。因此耗时取决于关键词在全表中的命中数，而不是该用户的对话量，
+    常见词在大表上会明显变慢。路由层用 SEARCH_MIN_KEYWORD / SEARCH_MAX_PAGES 限制了最坏情况；
+    若全表命中数成为瓶颈，需要按用户分区的检索方案（如外部搜索引擎以 user_id 作路由键）
+    """
+    score = match(Conversation.user_message, Conversation.ai_message, against=keyword).in_natural_language_mode()
+    conditions = [Conversation.user_id == user_id, score]
+    if character_id is not None:
+        conditions.append(Conversation.character_id == character_id)
+    async with ReadSessionLocal() as db:
+        result = await db.execute(
+            select(
+                Conversation.id, Conversation.character_id,
+                Conversation.user_message, Conversation.ai_message, Conversation.timestamp,
+                score.label("score")
+            )
+            .where(*conditions)
+            .order_by(score.desc(), Conversation.id.desc())
+            .offset(offset)
+            .limit(limit)
+        )
+        return [{
+            "id": r.id,
+            "character_id": r.character_id,
+            "user_message": r.user_message,
+            "ai_message": r.ai_message,
+            "timestamp": r.timestamp.isoformat() if r.timestamp else None,
+            "score": round(float(r.score), 4)
+        } for r in result.all()]
+
+async def get_history_version(user_id: int, character_id: int, before_id: Optional[int] = None) -> str:
+    """
+    id < before_id 范围内历史记录的版本标识（仅读索引），用于生成历史分页的 ETag：
+    在线表的最新 id 与条数 + 归档块数与最后归档的 id，新增对话、归档、恢复都会改变它
+    """
+    conditions = [Conversation.user_id == user_id, Conversation.character_id == character_id]
+    if before_id is not None:
+        conditions.append(Conversation.id < before_id)
+    # 归档表的聚合作为标量子查询并入同一条语句，每次请求只往返一次
+    archived = (ConversationArchive.user_id == user_id, ConversationArchive.character_id == character_id)
+    archived_count = select(func.count(ConversationArchive.id)).where(*archived).scalar_subquery()
+    archived_last = select(func.max(ConversationArchive.last_conversation_id)).where(*archived).scalar_subquery()
+    async with read_session(user_id) as db:
+        row = (await db.execute(
+            select(func.max(Conversation.id), func.count(Conversation.id), archived_count, archived_last)
+            .where(*conditions)
+        )).one()
+    return f"{row[0] or 0}.{row[1]}.{row[2]}.{row[3] or 0}"
+
+async def iter_conversations(
+    after_id: int = 0,
+    character_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    chunk_size: int = 1000,
+) -> AsyncIterator[list[dict]]:
+    """
+    按 id 正序流式读取对话记录（服务端游标），每次产出 chunk_size 条，内存占用与表大小无关
+    """
+    conditions = [Conversation.id > after_id]
+    if character_id is not None:
+        conditions.append(Conversation.character_id == character_id)
+    if user_id is not None:
+        conditions.append(Conversation.user_id == user_id)
+    if since is not None:
+        conditions.append(Conversation.timestamp >= since)
+    if until is not None:
+        conditions.append(Conversation.timestamp < until)
+
+    async with ReadSessionLocal() as db:
+        result = await db.stream(
+            select(
+                Conversation.id, Conversation.user_id, Conversation.character_id,
+                Conversation.user_message, Conversation.ai_message, Conversation.timestamp
+            )
+            .where(*conditions)
+            .order_by(Conversation.id.asc())
+            .execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions():
+            yield [{
+                "id": r.id,
+                "user_id": r.user_id,
+                "character_id": r.character_id,
+                "user_message": r.user_message,
+                "ai_message": r.ai_message,
+                "timestamp": r.timestamp
+            } for r in rows]
+
+async def get_summary(user_id: int, character_id: int) -> dict | None:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ConversationSummary.summary, ConversationSummary.last_conversation_id)
+            .where(
+                ConversationSummary.user_id == user_id,
+                ConversationSummary.character_id == character_id
+            )
+        )
+        row = result.one_or_none()
+        if not row:
+            return None
+        return {
+            "summary": row.summary or "",
+            "last_conversation_id": row.last_conversation_id
+        }
+
+async def save_summary(user_id: int, character_id: int, summary: str, last_conversation_id: int):
+    """
+    创建或更新 (user_id, character_id) 的滚动摘要
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            result = await db.execute(
+                select(ConversationSummary).where(
+                    ConversationSummary.user_id == user_id,
+                    ConversationSummary.character_id == character_id
+                )
+            )
+            record = result.scalar_one_or_none()
+            if record:
+                record.summary = summary
+                record.last_conversation_id = last_conversation_id
+            else:
+                record = ConversationSummary(
+                    user_id=user_id,
+                    character_id=character_id,
+                    summary=summary,
+                    last_conversation_id=last_conversation_id
+                )
+            db.add(record)
+            await db.commit()
+            return True
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[DB] Failed to save summary for user {user_id}: {e}")
+
+# ======================
+# 归档（冷数据压缩存储）
+# ======================
+
+def _pack_turns(turns: list[dict]) -> bytes:
+    return zlib.compress(json.dumps(turns, ensure_ascii=False).encode("utf-8"), 6)
+
+def _unpack_turns(payload: bytes) -> list[dict]:
+    return json.loads(zlib.decompress(payload).decode("utf-8"))
+
+async def get_archivable_pairs(
+    cutoff: datetime, after: Optional[tuple[int, int]] = None, limit: int = 1000
+) -> list[dict]:
+    """
+    按 (user_id, character_id) 顺序分页查找有可归档对话的组合：早于 cutoff 且已折叠进滚动摘要的轮次；
+    after 为上一页最后一个组合（键集分页），最近恢复过归档（restored_at 晚于 cutoff）的组合跳过
+    :return: [{"user_id", "character_id", "max_id", "turns"}]
+    """
+    conditions = [
+        Conversation.timestamp < cutoff,
+        Conversation.id <= ConversationSummary.last_conversation_id,
+        or_(ConversationSummary.restored_at.is_(None), ConversationSummary.restored_at < cutoff)
+    ]
+    if after is not None:
+        conditions.append(tuple_(Conversation.user_id, Conversation.character_id) > after)
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(
+                Conversation.user_id,
+                Conversation.character_id,
+                func.max(Conversation.id).label("max_id"),
+                func.count().label("turns")
+            )
+            .join(ConversationSummary, and_(
+                ConversationSummary.user_id == Conversation.user_id,
+                ConversationSummary.character_id == Conversation.character_id
+            ))
+            .where(*conditions)
+            .group_by(Conversation.user_id, Conversation.character_id)
+            .order_by(Conversation.user_id, Conversation.character_id)
+            .limit(limit)
+        )
+        return [{
+            "user_id": r.user_id,
+            "character_id": r.character_id,
+            "max_id": r.max_id,
+            "turns": r.turns
+        } for r in result.all()]
+
+async def archive_conversations(user_id: int, character_id: int, max_id: int, batch_size: int = 500) -> int:
+    """
+    将 id <= max_id 的最早 batch_size 轮对话压缩为一个归档块，并在同一事务中从 conversations 删除
+    :return: 归档条数（0 表示已无可归档记录）
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            result = await db.execute(
+                select(Conversation.id, Conversation.user_message, Conversation.ai_message, Conversation.timestamp)
+                .where(
+                    Conversation.user_id == user_id,
+                    Conversation.character_id == character_id,
+                    Conversation.id <= max_id
+                )
+                .order_by(Conversation.id.asc())
+                .limit(batch_size)
+            )
+            rows = result.all()
+            if not rows:
+                return 0
+
+            db.add(ConversationArchive(
+                user_id=user_id,
+                character_id=character_id,
+                first_conversation_id=rows[0].id,
+                last_conversation_id=rows[-1].id,
+                turn_count=len(rows),
+                payload=_pack_turns([{
+                    "id": r.id,
+                    "user_message": r.user_message,
+                    "ai_message": r.ai_message,
+                    "timestamp": r.timestamp.isoformat() if r.timestamp else None
+                } for r in rows])
+            ))
+            await db.execute(delete(Conversation).where(Conversation.id.in_([r.id for r in rows])))
+            await db.commit()
+            mark_written(user_id)
+            return len(rows)
+        except Exception as e:
+            await db.rollback()
+            raise Exception(f"[DB] Failed to archive conversations for user {user_id}: {e}")
+
+async def get_archived_page(user_id: int, character_id: int, before_id: Optional[int], limit: int) -> list[dict]:
+    """
+    从归档块中按需解压读取 id < before_id 的最近 limit 条（按 id 倒序），格式与 get_conversation_page 一致
+    """
+    turns: list[dict] = []
+    cursor = before_id
+    async with read_session(user_id) as db:
+        while len(turns) < limit:
+            conditions = [ConversationArchive.user_id == user_id, ConversationArchive.character_id == character_id]
+            if cursor is not None:
+                conditions.append(ConversationArchive.first_conversation_id < cursor)
+            result = await db.execute(
+                select(ConversationArchive.first_conversation_id, ConversationArchive.payload)
+                .where(*conditions)
+                .order_by(ConversationArchive.last_conversation_id.desc())
+                .limit(1)
+            )
+            row = result.one_or_none()
+            if not row:
+                break
+            for turn in reversed(_unpack_turns(row.payload)):
+                if cursor is None or turn["id"] < cursor:
+                    turns.append(turn)
+            cursor = row.first_conversation_id
+    return turns[:limit]
+
+async def restore_archives(user_id: int, character_id: int) -> int:
+    """
+    将某用户与某角色的全部归档块解压写回 conversations（保留原 id），并删除归档块；
+    同时在摘要行记下恢复时间，避免下一次归档任务立刻把这些旧时间戳的对话再次归档
+    :return: 恢复条数
+    """
+    restored = 0
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(ConversationArchive.id)
+            .where(ConversationArchive.user_id == user_id, ConversationArchive.character_id == character_id)
+            .order_by(ConversationArchive.first_conversation_id.asc())
+        )
+        archive_ids = result.scalars().all()
+
+        # 逐块恢复、逐块提交，中断后可重复执行
+        for archive_id in archive_ids:
+            try:
+                archive = await db.get(ConversationArchive, archive_id)
+                turns = _unpack_turns(archive.payload)
+                await db.execute(insert(Conversation), [{
+                    "id": t["id"],
+                    "user_id": user_id,
+                    "character_id": character_id,
+                    "user_message": t["user_message"],
+                    "ai_message": t["ai_message"],
+                    # 早期数据可能没有时间戳，以归档时间兜底（timestamp 列不允许为空）
+                    "timestamp": datetime.fromisoformat(t["timestamp"]) if t["timestamp"] else archive.archived_at
+                } for t in turns])
+                await db.execute(
+                    update(ConversationSummary)
+                    .where(ConversationSummary.user_id == user_id, ConversationSummary.character_id == character_id)
+                    .values(restored_at=datetime.now(timezone.utc))
+                )
+                await db.delete(archive)
+                await db.commit()
+                mark_written(user_id)
+                restored += len(turns)
+            except Exception as e:
+                await db.rollback()
+                raise Exception(f"[DB] Failed to restore archive {archive_id} for user {user_id}: {e}")
+    return restored
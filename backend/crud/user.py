@@ -1,27 +1,40 @@
 # backend/crud/users.py
 from sqlmodel import select
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy.exc import IntegrityError, NoResultFound
 from backend.models.user import User, User_Info
-from backend.database import AsyncSessionLocal
+from backend.database import AsyncSessionLocal, mark_written, read_session
 
-async def check_user(account: str, password: str) -> tuple[int, str]:
+async def get_user_by_account(account: str) -> tuple[int, str] | None:
+    """
+    按账号查询用户
+    :return: (用户 ID, 密码哈希)，不存在时返回 None
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.id, User.password).where(User.account == account))
+        row = result.one_or_none()
+        return (row.id, row.password) if row else None
+
+async def create_user(account: str, password_hash: str) -> tuple[int, str, bool]:
+    """
+    注册新用户；同一账号被并发注册时以先写入者为准（依赖 users.account 唯一索引）
+    :return: (用户 ID, 库中的密码哈希, 账号是否已存在)
+    """
     async with AsyncSessionLocal() as db:
-        # 查询用户是否存在
-        result = await db.execute(select(User).where(User.account == account))
+        new_user = User(account=account, password=password_hash)
+        db.add(new_user)
         try:
-            user = result.scalar_one()
-            return user.id, user.password, True
-        except NoResultFound:
-            # 创建新用户
-            new_user = User(account=account, password=password)
-            db.add(new_user)
             await db.commit()
-            await db.refresh(new_user)  # 刷新以获取新用户的ID
-
-            return new_user.id, password, False
+        except IntegrityError:
+            # 另一个请求抢先注册了该账号，按已存在的用户处理
+            await db.rollback()
+            result = await db.execute(select(User.id, User.password).where(User.account == account))
+            row = result.one()
+            return row.id, row.password, True
+        await db.refresh(new_user)  # 刷新以获取新用户的ID
+        return new_user.id, password_hash, False
 
 async def get_user_info(user_id: int):
-    async with AsyncSessionLocal() as db:
+    async with read_session(user_id) as db:
         # 查询用户信息
         result = await db.execute(select(User_Info).where(User_Info.user_id == user_id))
         try:
@@ -30,6 +43,25 @@ async def get_user_info(user_id: int):
         except NoResultFound:
             return None
         
+async def get_user_profile(user_id: int) -> dict | None:
+    """
+    只读取用户资料中常用的几列（学号、姓名、学院），供资料缓存使用
+    """
+    async with read_session(user_id) as db:
+        result = await db.execute(
+            select(User_Info.user_id, User_Info.stu_id, User_Info.name, User_Info.college)
+            .where(User_Info.user_id == user_id)
+        )
+        row = result.one_or_none()
+        if not row:
+            return None
+        return {
+            "user_id": row.user_id,
+            "stu_id": row.stu_id,
+            "name": row.name,
+            "college": row.college
+        }
+
 async def create_or_update_user_info(user_id: int, user_info_data: dict):
     """
     创建或更新用户的详细信息
@@ -56,5 +88,6 @@ async def create_or_update_user_info(user_id: int, user_info_data: dict):
             db.add(new_info)
             existing_info = new_info
         await db.commit()
+        mark_written(user_id)
         await db.refresh(existing_info)  # 刷新以获取最新数据（如主键）
         return existing_info
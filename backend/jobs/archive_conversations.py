@@ -0,0 +1,82 @@
+# backend/jobs/archive_conversations.py
+"""
+归档旧对话：把早于阈值、且已折叠进滚动摘要的对话压缩成归档块（conversation_archives），
+并从 conversations 表删除，控制在线表与索引的体积。每个 (用户, 角色) 的摘要行保留原处，
+对话上下文继续使用摘要；历史记录接口会按需从归档块解压读取。
+
+用法：
+    python -m backend.jobs.archive_conversations                     # 归档 ARCHIVE_AFTER_DAYS 天前的对话
+    python -m backend.jobs.archive_conversations --older-than-days 30 --dry-run
+    python -m backend.jobs.archive_conversations --restore 12 3      # 把用户 12 与角色 3 的归档写回在线表
+
+如需导出训练数据，请在归档前运行 backend.jobs.export_conversations。
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from setting import ENV_CONFIG
+from backend.crud import conversation
+from backend.database import dispose_engines
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_AFTER_DAYS = int(ENV_CONFIG.get("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH_SIZE = int(ENV_CONFIG.get("ARCHIVE_BATCH_SIZE", "500"))   # 单个归档块的对话轮数
+
+
+async def archive(older_than_days: int, batch_size: int, dry_run: bool = False) -> int:
+    """
+    :return: 归档条数（dry_run 时为可归档条数）
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    total = 0
+    after = None
+    # 按 (user_id, character_id) 键集分页，每页只扫描上一页之后的组合，不重复全表分组
+    while pairs := await conversation.get_archivable_pairs(cutoff, after):
+        after = (pairs[-1]["user_id"], pairs[-1]["character_id"])
+        if dry_run:
+            for p in pairs:
+                logger.info(f"🗄️ User {p['user_id']}, character {p['character_id']}: {p['turns']} turns archivable")
+                total += p["turns"]
+            continue
+
+        for p in pairs:
+            archived = 0
+            # 每个归档块单独一个事务，锁持有时间短，中断后重跑即可继续
+            while count := await conversation.archive_conversations(
+                p["user_id"], p["character_id"], p["max_id"], batch_size
+            ):
+                archived += count
+            total += archived
+            logger.info(f"🗄️ Archived {archived} turns for user {p['user_id']}, character {p['character_id']}")
+    return total
+
+
+async def run(args) -> int:
+    try:
+        if args.restore:
+            user_id, character_id = args.restore
+            restored = await conversation.restore_archives(user_id, character_id)
+            logger.info(f"♻️ Restored {restored} turns for user {user_id}, character {character_id}")
+            return restored
+        total = await archive(args.older_than_days, args.batch_size, args.dry_run)
+        logger.info(f"✅ Archive finished: {total} turns{' archivable (dry run)' if args.dry_run else ''}")
+        return total
+    finally:
+        await dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="归档或恢复旧对话")
+    parser.add_argument("--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS, help="归档多少天前的对话")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="单个归档块的对话轮数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计，不做修改")
+    parser.add_argument("--restore", type=int, nargs=2, metavar=("USER_ID", "CHARACTER_ID"),
+                        help="把指定用户与角色的归档写回在线表")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
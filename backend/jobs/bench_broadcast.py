@@ -0,0 +1,110 @@
+# backend/jobs/bench_broadcast.py
+"""
+聊天室广播压测（进程内）：用内存中的假 WebSocket 连接代替真实客户端，
+测量 RoomBroadcaster 从 broadcast() 调用到各连接 send_text 完成的投递延迟，以及 broadcast() 本身的耗时。
+
+用法：
+    python -m backend.jobs.bench_broadcast                              # 1k / 2k / 5k / 10k 个连接
+    python -m backend.jobs.bench_broadcast --clients 10000 --messages 50
+    python -m backend.jobs.bench_broadcast --slow 0.01                  # 1% 的连接卡住不收，观察对其他连接的影响
+
+假连接的 send_text 只让出一次事件循环，不含网络与帧编码开销，结果反映的是调度与排队本身的延迟下限。
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from backend.services.broadcast import RoomBroadcaster
+
+logger = logging.getLogger(__name__)
+
+
+class FakeWebSocket:
+    """
+    记录每条消息的投递延迟；stall=True 时 send_text 永不返回，模拟接收过慢的客户端
+    """
+
+    def __init__(self, sent_at: dict[str, float], latencies: list[float], stall: bool = False):
+        self.sent_at = sent_at
+        self.latencies = latencies
+        self.stall = stall
+
+    async def send_text(self, text: str):
+        if self.stall:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(0)
+        self.latencies.append(time.perf_counter() - self.sent_at[text])
+
+    async def close(self, code: int = 1000, reason: str = None):
+        pass
+
+
+def percentile(samples: list[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def bench(clients: int, messages: int, interval: float, slow: float) -> dict:
+    broadcaster = RoomBroadcaster(send_timeout=1.0)
+    sent_at: dict[str, float] = {}
+    latencies: list[float] = []
+    fanout: list[float] = []
+    stalled = int(clients * slow)
+    sockets = [FakeWebSocket(sent_at, latencies, stall=i < stalled) for i in range(clients)]
+    for ws in sockets:
+        broadcaster.connect(ws)
+    await asyncio.sleep(0)
+
+    for i in range(messages):
+        # 与 broadcast() 相同的序列化结果作为键，投递时据此查到发出时间
+        text = f'{{"i":{i},"content":"你好，大家好"}}'
+        sent_at[text] = started = time.perf_counter()
+        broadcaster.broadcast({"i": i, "content": "你好，大家好"})
+        fanout.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+    # 等待快客户端收完、慢客户端超时断开
+    deadline = time.perf_counter() + broadcaster.send_timeout + 2
+    while len(latencies) < (clients - stalled) * messages and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(broadcaster.send_timeout if stalled else 0)
+    for ws in sockets:
+        await broadcaster.disconnect(ws)
+
+    return {
+        "clients": clients,
+        "delivered": len(latencies),
+        "expected": (clients - stalled) * messages,
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "latency_max_ms": round(max(latencies, default=0.0) * 1000, 2),
+        "broadcast_call_p50_ms": round(percentile(fanout, 0.50) * 1000, 2),
+        "broadcast_call_max_ms": round(max(fanout, default=0.0) * 1000, 2),
+        "slow_disconnects": broadcaster.slow_disconnects,
+    }
+
+
+async def run(client_counts: list[int], messages: int, interval: float, slow: float) -> list[dict]:
+    return [await bench(n, messages, interval, slow) for n in client_counts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="进程内聊天室广播压测：投递延迟分位数")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1000, 2000, 5000, 10000], help="连接数（可多个）")
+    parser.add_argument("--messages", type=int, default=20, help="每轮广播的消息条数")
+    parser.add_argument("--interval", type=float, default=0.05, help="两条广播之间的间隔（秒）")
+    parser.add_argument("--slow", type=float, default=0.0, help="卡住不收的连接比例（0~1）")
+    args = parser.parse_args()
+
+    # 慢客户端断开时逐条打印的告警会干扰计时
+    logging.getLogger("backend.services.broadcast").setLevel(logging.ERROR)
+    for result in asyncio.run(run(args.clients, args.messages, args.interval, args.slow)):
+        logger.info(f"📣 Broadcast benchmark: {result}")
+
+
+if __name__ == "__main__":
+    main()
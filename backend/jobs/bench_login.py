@@ -0,0 +1,132 @@
+# backend/jobs/bench_login.py
+"""
+登录压测（进程内）：用 httpx.ASGITransport 直接调用 POST /login，用户查询与资料读取替换为内存实现，
+只测量密码校验、会话创建与 Cookie 签发本身的吞吐，同时用定时器任务测量事件循环延迟（loop lag）。
+
+用法：
+    python -m backend.jobs.bench_login                          # 默认 1000 次登录、并发 64
+    python -m backend.jobs.bench_login --logins 5000 --concurrency 128
+    python -m backend.jobs.bench_login --inline                 # 对照组：在事件循环线程内直接校验密码
+
+输出：吞吐（次/秒）、单次登录 p50/p95/p99，以及事件循环延迟 p50/p99/max；
+inline 模式下事件循环在压测期间一直被占用，延迟采样只有一次，其值约等于整个压测时长。
+"""
+import argparse
+import asyncio
+import logging
+import time
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+import jwt_handler
+from backend.routes import pages
+from backend.services.sessions import SessionManager, MemorySessionBackend
+
+logger = logging.getLogger(__name__)
+
+LAG_INTERVAL = 0.005    # 事件循环延迟采样间隔（秒）
+ACCOUNTS = 100          # 压测账号数，登录请求在其间轮换
+
+
+def percentile(samples: list[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+async def measure_lag(samples: list[float], stop: asyncio.Event):
+    """
+    每 LAG_INTERVAL 秒醒来一次，实际醒来时间比预期晚多少即为事件循环被阻塞的时长
+    """
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(loop.time() - started - LAG_INTERVAL)
+
+
+def install_fakes(inline: bool):
+    """
+    用户与资料查询替换为内存实现；inline=True 时在事件循环线程内同步校验密码（对照组）
+    """
+    hashed = jwt_handler.get_password_hash("bench-password")
+    users = {f"bench-{i}": (i + 1, hashed) for i in range(ACCOUNTS)}
+
+    async def get_user_by_account(account):
+        return users.get(account)
+
+    async def get_profile(user_id):
+        return SimpleNamespace(is_complete=True)
+
+    async def verify_inline(plain_password, hashed_password):
+        return jwt_handler.verify_password(plain_password, hashed_password)
+
+    pages.get_user_by_account = get_user_by_account
+    pages.user_profile_cache.get = get_profile
+    pages.session_manager = SessionManager(MemorySessionBackend())
+    if inline:
+        pages.verify_password_async = verify_inline
+
+
+async def bench(logins: int, concurrency: int) -> dict:
+    app = FastAPI()
+    app.include_router(pages.router)
+    latencies: list[float] = []
+    lags: list[float] = []
+    stop = asyncio.Event()
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(logins):
+        queue.put_nowait(i)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            while not queue.empty():
+                i = queue.get_nowait()
+                started = time.perf_counter()
+                resp = await client.post("/login", json={"account": f"bench-{i % ACCOUNTS}", "password": "bench-password"})
+                latencies.append(time.perf_counter() - started)
+                if resp.status_code != 200:
+                    raise RuntimeError(f"login failed [{resp.status_code}]: {resp.text}")
+
+        lag_task = asyncio.create_task(measure_lag(lags, stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await lag_task
+
+    return {
+        "logins": logins,
+        "elapsed_s": round(elapsed, 2),
+        "logins_per_s": round(logins / elapsed, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "loop_lag_p50_ms": round(percentile(lags, 0.50) * 1000, 2),
+        "loop_lag_p99_ms": round(percentile(lags, 0.99) * 1000, 2),
+        "loop_lag_max_ms": round(max(lags, default=0.0) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="进程内登录压测：吞吐与事件循环延迟")
+    parser.add_argument("--logins", type=int, default=1000, help="登录次数")
+    parser.add_argument("--concurrency", type=int, default=64, help="并发请求数")
+    parser.add_argument("--inline", action="store_true", help="在事件循环线程内校验密码（对照组）")
+    args = parser.parse_args()
+
+    # 逐条登录日志会干扰计时
+    logging.getLogger(pages.__name__).setLevel(logging.WARNING)
+    logging.getLogger("backend.services.sessions").setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    install_fakes(args.inline)
+    result = asyncio.run(bench(args.logins, args.concurrency))
+    mode = "inline" if args.inline else f"executor ({jwt_handler.PASSWORD_HASH_WORKERS} workers)"
+    logger.info(f"🔐 Login benchmark [{mode}]: {result}")
+
+
+if __name__ == "__main__":
+    main()
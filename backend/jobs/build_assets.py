@@ -0,0 +1,185 @@
+# backend/jobs/build_assets.py
+"""
+构建静态资源：把 frontend/static 下的文件复制为带内容哈希的文件名，
+为文本资源生成 gzip / brotli 预压缩版本，为图片生成 WebP / AVIF 版本，并写出 manifest.json。
+模板中通过 {{ asset_url('文件名') }} 引用资源，服务端按清单返回 /assets/ 下的哈希文件（长期缓存）。
+
+用法：
+    python -m backend.jobs.build_assets                 # 构建到 ASSET_BUILD_DIR（默认 data/assets）
+    python -m backend.jobs.build_assets --no-images     # 跳过图片转码
+    python -m backend.jobs.build_assets --clean         # 删除不在新清单中的旧哈希文件
+
+可选依赖：brotli（br 压缩）、Pillow（WebP / AVIF；AVIF 需要 Pillow 编译时带 libavif 或安装 pillow-avif-plugin）。
+未安装时对应步骤会跳过。重新构建后需重启服务以加载新清单。
+旧的哈希文件默认保留，已缓存旧页面的客户端仍可取到资源。
+"""
+import argparse
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+
+from setting import FRONTEND_DIR
+from backend.services.assets import ASSET_BUILD_DIR, ASSET_FILES_DIR, ASSET_MANIFEST, ENCODINGS, IMAGE_FORMATS
+
+logger = logging.getLogger(__name__)
+
+SOURCE_DIR = FRONTEND_DIR / "static"
+
+# 值得预压缩的文本类资源
+COMPRESSIBLE = {".css", ".js", ".html", ".json", ".svg", ".txt", ".map"}
+# 可转码为 WebP / AVIF 的图片
+IMAGES = {".png", ".jpg", ".jpeg"}
+
+# 清单中的编码 / 格式名 -> 变体文件后缀（与服务端 AssetFiles 一致）
+VARIANT_SUFFIXES = {name: suffix for name, suffix, _ in ENCODINGS + IMAGE_FORMATS}
+
+
+def hashed_name(relative: Path, data: bytes) -> Path:
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    return relative.with_name(f"{relative.stem}.{digest}{relative.suffix}")
+
+
+def write_once(path: Path, data: bytes):
+    """
+    文件名带内容哈希，已存在即内容相同，无需重写
+    """
+    if path.exists():
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+
+
+def compress_variants(data: bytes) -> dict[str, tuple[str, bytes]]:
+    """
+    :return: 编码名 -> (后缀, 压缩后字节)；只保留比原文件小的版本
+    """
+    variants = {"gzip": (VARIANT_SUFFIXES["gzip"], gzip.compress(data, compresslevel=9, mtime=0))}
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+    if brotli is not None:
+        variants["br"] = (VARIANT_SUFFIXES["br"], brotli.compress(data, quality=11))
+    return {k: v for k, v in variants.items() if len(v[1]) < len(data)}
+
+
+def image_variants(data: bytes, quality: int) -> dict[str, tuple[str, bytes]]:
+    """
+    :return: 格式名 -> (后缀, 转码后字节)；只保留比原文件小的版本
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+    try:
+        import pillow_avif  # noqa: F401  为旧版 Pillow 注册 AVIF 编码器
+    except ImportError:
+        pass
+
+    variants = {}
+    with Image.open(io.BytesIO(data)) as image:
+        image.load()
+        for fmt in ("webp", "avif"):
+            buf = io.BytesIO()
+            try:
+                image.save(buf, format=fmt.upper(), quality=quality)
+            except (KeyError, OSError, ValueError) as e:
+                logger.warning(f"🖼️ {fmt} encoding unavailable: {e}")
+                continue
+            if buf.tell() < len(data):
+                variants[fmt] = (VARIANT_SUFFIXES[fmt], buf.getvalue())
+    return variants
+
+
+def build(source: Path, out_dir: Path, images: bool = True, quality: int = 80) -> dict[str, dict]:
+    """
+    :return: 清单条目（源文件相对路径 -> 条目）
+    """
+    files_dir = out_dir / ASSET_FILES_DIR.relative_to(ASSET_BUILD_DIR)
+    manifest = {}
+    for path in sorted(source.rglob("*")):
+        if not path.is_file() or path.name.startswith("."):
+            continue
+        relative = path.relative_to(source)
+        data = path.read_bytes()
+        target = hashed_name(relative, data)
+        write_once(files_dir / target, data)
+
+        entry = {"path": target.as_posix(), "size": len(data)}
+        suffix = relative.suffix.lower()
+        if suffix in COMPRESSIBLE:
+            variants = compress_variants(data)
+            for name, (ext, body) in variants.items():
+                write_once(files_dir / f"{target}{ext}", body)
+            entry["encodings"] = sorted(variants)
+        elif suffix in IMAGES and images:
+            variants = image_variants(data, quality)
+            for name, (ext, body) in variants.items():
+                write_once(files_dir / f"{target}{ext}", body)
+            entry["formats"] = sorted(variants)
+
+        manifest[relative.as_posix()] = entry
+        extras = entry.get("encodings") or entry.get("formats") or []
+        logger.info(f"📦 {relative} -> {target} ({len(data)} bytes{', ' + ', '.join(extras) if extras else ''})")
+    return manifest
+
+
+def write_manifest(path: Path, files: dict[str, dict]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({
+        "built_at": datetime.now().isoformat(timespec="seconds"),
+        "files": files
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def clean(out_dir: Path, files: dict[str, dict]) -> int:
+    """
+    删除不属于当前清单的旧文件
+    :return: 删除的文件数
+    """
+    files_dir = out_dir / ASSET_FILES_DIR.relative_to(ASSET_BUILD_DIR)
+    keep = set()
+    for entry in files.values():
+        keep.add(entry["path"])
+        for name in entry.get("encodings", []) + entry.get("formats", []):
+            keep.add(entry["path"] + VARIANT_SUFFIXES[name])
+    removed = 0
+    for path in files_dir.rglob("*"):
+        if path.is_file() and path.relative_to(files_dir).as_posix() not in keep:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="构建带内容哈希与预压缩版本的静态资源")
+    parser.add_argument("--source", type=Path, default=SOURCE_DIR, help="源目录")
+    parser.add_argument("--out-dir", type=Path, default=ASSET_BUILD_DIR, help="输出目录")
+    parser.add_argument("--no-images", action="store_true", help="跳过 WebP / AVIF 转码")
+    parser.add_argument("--quality", type=int, default=80, help="WebP / AVIF 质量（1-100）")
+    parser.add_argument("--clean", action="store_true", help="删除不在新清单中的旧哈希文件")
+    args = parser.parse_args()
+
+    for module, feature in (("brotli", "br 预压缩"), ("PIL", "WebP / AVIF 转码")):
+        if importlib.util.find_spec(module) is None:
+            logger.warning(f"⚠️ 未安装 {module}，跳过 {feature}")
+
+    files = build(args.source, args.out_dir, images=not args.no_images, quality=args.quality)
+    manifest_path = args.out_dir / ASSET_MANIFEST.relative_to(ASSET_BUILD_DIR)
+    write_manifest(manifest_path, files)
+    if args.clean:
+        logger.info(f"🧹 Removed {clean(args.out_dir, files)} stale files")
+    logger.info(f"✅ Built {len(files)} assets, manifest written to {manifest_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# backend/jobs/explain_audit.py
+"""
+索引审计：依次调用 CRUD 模块中的只读查询，记录它们实际发出的 SELECT 语句，
+再对每条语句执行 EXPLAIN，发现全表扫描（type=ALL）或全索引扫描（type=index）时报告并以非零状态退出，
+可放在迁移之后或 CI 中运行。
+
+用法：
+    python -m backend.jobs.explain_audit                       # 自动从 conversations 表取样本 user_id / character_id
+    python -m backend.jobs.explain_audit --user 12 --character 3
+
+注意：请在有代表性数据量的库上运行，表很小时 MySQL 优化器可能主动选择全表扫描。
+会写库的 CRUD 函数（create_user、save_* 等）不在审计范围内，它们的查询条件与下列只读查询相同。
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, text
+
+from backend.crud import character, conversation, user
+from backend.database import engine, read_engine, AsyncSessionLocal, dispose_engines
+from backend.jobs.archive_conversations import ARCHIVE_AFTER_DAYS
+
+logger = logging.getLogger(__name__)
+
+# 行数很少、全表扫描可以接受的表
+SMALL_TABLES = {"characters"}
+
+
+async def first_chunk(chunks):
+    """
+    流式读取的异步生成器只取第一块即可捕获其 SELECT，随后关闭游标
+    """
+    try:
+        await anext(chunks)
+    except StopAsyncIteration:
+        pass
+    finally:
+        await chunks.aclose()
+
+
+def days_ago(days: int) -> datetime:
+    return datetime.now(timezone.utc) - timedelta(days=days)
+
+
+# 被审计的只读查询：名称 -> 以 (user_id, character_id) 为参数的调用
+AUDITED_QUERIES = {
+    "user.get_user_by_account": lambda uid, cid: user.get_user_by_account(f"audit-{uid}"),
+    "user.get_user_info": lambda uid, cid: user.get_user_info(uid),
+    "user.get_user_profile": lambda uid, cid: user.get_user_profile(uid),
+    "character.get_all_characters": lambda uid, cid: character.get_all_characters(),
+    "character.get_character_by_id": lambda uid, cid: character.get_character_by_id(cid),
+    "conversation.get_recent_conversations": lambda uid, cid: conversation.get_recent_conversations(uid, cid),
+    "conversation.get_oldest_conversations": lambda uid, cid: conversation.get_oldest_conversations(uid, cid, 0, 20),
+    "conversation.get_summary": lambda uid, cid: conversation.get_summary(uid, cid),
+    "conversation.get_conversation_page": lambda uid, cid: conversation.get_conversation_page(uid, cid, None, 21),
+    "conversation.get_history_version": lambda uid, cid: conversation.get_history_version(uid, cid),
+    "conversation.search_conversations": lambda uid, cid: conversation.search_conversations(uid, "你好", cid),
+    "conversation.get_archived_page": lambda uid, cid: conversation.get_archived_page(uid, cid, None, 21),
+    # 离线任务：归档候选（按 timestamp 过滤后分组）与导出（按用户 / 角色或按时间范围过滤）
+    "conversation.get_archivable_pairs": lambda uid, cid: conversation.get_archivable_pairs(days_ago(ARCHIVE_AFTER_DAYS)),
+    "conversation.iter_conversations[user,character]": lambda uid, cid: first_chunk(
+        conversation.iter_conversations(user_id=uid, character_id=cid, since=days_ago(30))
+    ),
+    "conversation.iter_conversations[since,until]": lambda uid, cid: first_chunk(
+        conversation.iter_conversations(since=days_ago(30), until=days_ago(1))
+    ),
+}
+
+
+async def sample_ids() -> tuple[int, int]:
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(text("SELECT user_id, character_id FROM conversations LIMIT 1"))).first()
+    return (row.user_id, row.character_id) if row else (1, 1)
+
+
+async def capture(name: str, call) -> list[tuple[str, object]]:
+    """
+    执行一次 CRUD 调用，返回其发出的 SELECT 语句与参数
+    """
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    # 只读查询可能发往副本，两个引擎都要监听
+    engines = {engine.sync_engine, read_engine.sync_engine}
+    for sync_engine in engines:
+        event.listen(sync_engine, "before_cursor_execute", on_execute)
+    try:
+        await call
+    except Exception as e:
+        logger.warning(f"🔍 {name} raised {e!r}; auditing the statements issued before the error")
+    finally:
+        for sync_engine in engines:
+            event.remove(sync_engine, "before_cursor_execute", on_execute)
+    return statements
+
+
+async def explain(statement: str, parameters) -> list[dict]:
+    async with engine.connect() as conn:
+        result = await conn.exec_driver_sql(f"EXPLAIN {statement}", parameters)
+        return [dict(row._mapping) for row in result]
+
+
+async def audit(user_id: int, character_id: int) -> list[str]:
+    """
+    :return: 发现的问题列表（为空表示全部通过）
+    """
+    problems = []
+    for name, factory in AUDITED_QUERIES.items():
+        statements = await capture(name, factory(user_id, character_id))
+        if not statements:
+            logger.warning(f"🔍 {name}: no SELECT captured")
+        for statement, parameters in statements:
+            for row in await explain(statement, parameters):
+                table, access, key = row.get("table"), row.get("type"), row.get("key")
+                status = "✅"
+                if access in ("ALL", "index") and table not in SMALL_TABLES:
+                    status = "❌"
+                    problems.append(f"{name}: {access} scan on {table} (rows≈{row.get('rows')})")
+                logger.info(f"{status} {name}: table={table} type={access} key={key} rows≈{row.get('rows')}")
+    return problems
+
+
+async def run(user_id, character_id) -> list[str]:
+    try:
+        if user_id is None or character_id is None:
+            sample_user, sample_char = await sample_ids()
+            user_id = sample_user if user_id is None else user_id
+            character_id = sample_char if character_id is None else character_id
+        return await audit(user_id, character_id)
+    finally:
+        await dispose_engines()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对 CRUD 查询执行 EXPLAIN，检查全表扫描")
+    parser.add_argument("--user", type=int, help="样本 user_id")
+    parser.add_argument("--character", type=int, help="样本 character_id")
+    args = parser.parse_args()
+
+    problems = asyncio.run(run(args.user, args.character))
+    if problems:
+        logger.error("❌ Full scans found:\n" + "\n".join(f"  - {p}" for p in problems))
+        sys.exit(1)
+    logger.info("✅ All audited queries use an index")
+
+
+if __name__ == "__main__":
+    main()
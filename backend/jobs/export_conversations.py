@@ -0,0 +1,210 @@
+# backend/jobs/export_conversations.py
+"""
+导出对话记录为微调用的 JSONL（每个角色一个文件），数据经服务端游标分块读取，内存占用恒定。
+
+用法：
+    python -m backend.jobs.export_conversations --out-dir exports
+    python -m backend.jobs.export_conversations --out-dir exports --character 3 --since 2026-01-01 --compress gzip
+    python -m backend.jobs.export_conversations --out-dir exports --resume     # 从上次导出的最后一条 id 继续（导出条件须与上次相同）
+
+每行格式：
+    {"id": ..., "user_id": ..., "character_id": ..., "timestamp": "...",
+     "messages": [{"role": "system", ...}, {"role": "user", ...}, {"role": "assistant", ...}]}
+"""
+import argparse
+import asyncio
+import gzip
+import io
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Optional
+
+from backend.crud import character, conversation
+from backend.database import dispose_engines
+from backend.services.character_catalog import build_system_prompt
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "export_state.json"
+SUFFIXES = {"none": ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+
+
+def open_output(path: Path, compress: str) -> IO[str]:
+    """
+    以追加方式打开输出文件；gzip / zstd 每次打开到关闭写成一个完整的帧，多帧文件标准解压工具可直接读取
+    """
+    if compress == "gzip":
+        return gzip.open(path, "at", encoding="utf-8")
+    if compress == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise SystemExit("❌ zstd 压缩需要安装 zstandard：pip install zstandard")
+        return io.TextIOWrapper(zstandard.ZstdCompressor().stream_writer(open(path, "ab")), encoding="utf-8")
+    return open(path, "a", encoding="utf-8")
+
+
+def load_state(out_dir: Path) -> Optional[dict]:
+    path = out_dir / STATE_FILE
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_state(out_dir: Path, last_id: int, exported: int, filters: dict, sizes: dict[str, int]):
+    """
+    记录进度：最后一条 id、导出条件，以及每个输出文件在该进度时的字节数（续传时据此截掉写了一半的尾部）
+    """
+    path = out_dir / STATE_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({
+        "last_id": last_id,
+        "exported": exported,
+        "filters": filters,
+        "sizes": sizes,
+        "updated_at": datetime.now().isoformat(timespec="seconds")
+    }), encoding="utf-8")
+    tmp.replace(path)
+
+
+def output_files(out_dir: Path, compress: str) -> list[Path]:
+    return list(out_dir.glob(f"character_*{SUFFIXES[compress]}"))
+
+
+def truncate_outputs(out_dir: Path, compress: str, sizes: dict[str, int]):
+    """
+    把输出文件恢复到上次记录进度时的大小：进程在写某一块时被杀，尾部残缺的帧会被截掉
+    """
+    for path in output_files(out_dir, compress):
+        size = sizes.get(path.name, 0)
+        if path.stat().st_size <= size:
+            continue
+        logger.warning(f"✂️ Truncating {path.name} to {size} bytes (incomplete chunk from an interrupted export)")
+        if size == 0:
+            path.unlink()
+        else:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+
+async def export(
+    out_dir: Path,
+    after_id: int = 0,
+    character_id: Optional[int] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    compress: str = "none",
+    chunk_size: int = 1000,
+    with_system: bool = True,
+    resume: bool = False,
+) -> tuple[int, int]:
+    """
+    resume=True 时从 STATE_FILE 记录的进度继续（忽略 after_id），导出条件与上次不同则拒绝续传
+    :return: (本次导出条数, 最后一条 id)
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    filters = {
+        "character_id": character_id,
+        "user_id": user_id,
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+        "compress": compress,
+        "with_system": with_system,
+    }
+
+    state = load_state(out_dir) if resume else None
+    if state is not None:
+        if state.get("filters") != filters:
+            raise SystemExit(
+                f"❌ 导出条件与上次不同，不能续传（上次 {state.get('filters')}，本次 {filters}），请换一个输出目录"
+            )
+        after_id = state["last_id"]
+        sizes = state["sizes"]
+        truncate_outputs(out_dir, compress, sizes)
+        logger.info(f"📤 Resuming export after id {after_id}")
+    else:
+        sizes = {path.name: path.stat().st_size for path in output_files(out_dir, compress)}
+    total = state["exported"] if state is not None else 0
+
+    prompts = {c["id"]: build_system_prompt(c) for c in await character.get_all_characters()}
+    exported, last_id = 0, after_id
+    async for rows in conversation.iter_conversations(
+        after_id=after_id, character_id=character_id, user_id=user_id,
+        since=since, until=until, chunk_size=chunk_size
+    ):
+        lines: dict[int, list[str]] = {}
+        for r in rows:
+            cid = r["character_id"]
+            messages = []
+            if with_system and cid in prompts:
+                messages.append({"role": "system", "content": prompts[cid]})
+            messages.append({"role": "user", "content": r["user_message"] or ""})
+            messages.append({"role": "assistant", "content": r["ai_message"] or ""})
+            lines.setdefault(cid, []).append(json.dumps({
+                "id": r["id"],
+                "user_id": r["user_id"],
+                "character_id": cid,
+                "timestamp": r["timestamp"].isoformat() if r["timestamp"] else None,
+                "messages": messages
+            }, ensure_ascii=False) + "\n")
+
+        # 每块单独打开、写完即关闭（gzip / zstd 帧完整结束）后再记录进度与文件大小：
+        # 进程被杀时 --resume 截掉未记录的尾部，从最后一个完整的块继续，不丢不重
+        for cid, chunk in lines.items():
+            path = out_dir / f"character_{cid}{SUFFIXES[compress]}"
+            with open_output(path, compress) as writer:
+                writer.writelines(chunk)
+            sizes[path.name] = path.stat().st_size
+        exported += len(rows)
+        last_id = rows[-1]["id"]
+        save_state(out_dir, last_id, total + exported, filters, sizes)
+        logger.info(f"📤 Exported {exported} conversations (last id {last_id})")
+
+    return exported, last_id
+
+
+async def run(**kwargs) -> tuple[int, int]:
+    try:
+        return await export(**kwargs)
+    finally:
+        await dispose_engines()
+
+
+def parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出对话记录为微调用 JSONL")
+    parser.add_argument("--out-dir", type=Path, required=True, help="输出目录（每个角色一个文件）")
+    parser.add_argument("--character", type=int, help="只导出指定角色")
+    parser.add_argument("--user", type=int, help="只导出指定用户")
+    parser.add_argument("--since", type=parse_time, help="起始时间（含），ISO 格式")
+    parser.add_argument("--until", type=parse_time, help="截止时间（不含），ISO 格式")
+    parser.add_argument("--after-id", type=int, help="只导出 id 大于该值的记录")
+    parser.add_argument("--resume", action="store_true", help=f"从输出目录下 {STATE_FILE} 记录的位置继续")
+    parser.add_argument("--compress", choices=list(SUFFIXES), default="none")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="每次从游标读取的行数")
+    parser.add_argument("--no-system", action="store_true", help="不写入角色系统提示词")
+    args = parser.parse_args()
+
+    exported, last_id = asyncio.run(run(
+        out_dir=args.out_dir,
+        after_id=args.after_id or 0,
+        resume=args.resume,
+        character_id=args.character,
+        user_id=args.user,
+        since=args.since,
+        until=args.until,
+        compress=args.compress,
+        chunk_size=args.chunk_size,
+        with_system=not args.no_system,
+    ))
+    logger.info(f"✅ Export finished: {exported} conversations, last id {last_id}")
+
+
+if __name__ == "__main__":
+    main()
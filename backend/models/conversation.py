@@ -1,8 +1,10 @@
 # backend/models/conversation.py
+from typing import Optional
 from pydantic import BaseModel
 from sqlmodel import Field
-from sqlalchemy import Column, Text, Index
-from datetime import datetime
+from sqlalchemy import Column, DateTime, LargeBinary, Text, Index, text
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
+from datetime import datetime, timezone
 from .base import Base,created_at_column
 
 class Conversation(Base, table=True):
@@ -10,7 +12,8 @@ class Conversation(Base, table=True):
 
     id: int = Field(default=None, primary_key=True)
 
-    user_id: int = Field(index=True, nullable=False, description="用户ID")
+    # user_id 的查询都由下方 (user_id, character_id, id) 复合索引的最左前缀覆盖，不再单独建索引
+    user_id: int = Field(nullable=False, description="用户ID")
     character_id: int = Field(foreign_key="characters.id", nullable=False)
 
     user_message: str = Field(sa_column=Column("user_message", Text))
@@ -18,9 +21,80 @@ class Conversation(Base, table=True):
 
     timestamp: datetime = Field(sa_column=created_at_column)
 
+class ConversationSummary(Base, table=True):
+    __tablename__ = "conversation_summaries"
+
+    id: int = Field(default=None, primary_key=True)
+
+    user_id: int = Field(nullable=False, description="用户ID")
+    character_id: int = Field(foreign_key="characters.id", nullable=False)
+
+    summary: str = Field(sa_column=Column("summary", Text), description="滚动摘要")
+    last_conversation_id: int = Field(default=0, nullable=False, description="已折叠进摘要的最后一条对话ID")
+
+    updated_at: datetime = Field(sa_column=Column(
+        "updated_at",
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc),
+        server_default=text("CURRENT_TIMESTAMP"),
+    ))
+
+    # 最近一次从归档恢复的时间：恢复的对话保留原时间戳，需在线满一个归档周期后才会再次归档
+    restored_at: Optional[datetime] = Field(default=None, sa_column=Column(
+        "restored_at",
+        DateTime(timezone=True),
+        nullable=True,
+    ))
+
+class ConversationArchive(Base, table=True):
+    __tablename__ = "conversation_archives"
+
+    id: int = Field(default=None, primary_key=True)
+
+    user_id: int = Field(nullable=False, description="用户ID")
+    character_id: int = Field(foreign_key="characters.id", nullable=False)
+
+    first_conversation_id: int = Field(nullable=False, description="归档块中最早一条对话ID")
+    last_conversation_id: int = Field(nullable=False, description="归档块中最后一条对话ID")
+    turn_count: int = Field(nullable=False, description="归档块包含的对话轮数")
+
+    # zlib 压缩的 JSON 数组：[{"id", "user_message", "ai_message", "timestamp"}, ...]
+    payload: bytes = Field(sa_column=Column(
+        "payload",
+        LargeBinary().with_variant(MEDIUMBLOB(), "mysql"),
+        nullable=False
+    ))
+
+    archived_at: datetime = Field(sa_column=Column(
+        "archived_at",
+        DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=text("CURRENT_TIMESTAMP"),
+    ))
+
 class CreateConversationRequest(BaseModel):
     character_id: int
     user_message: str
+    deadline: Optional[float] = None  # 可选：本次请求等待模型的最长秒数
+
+class BatchChatRequest(BaseModel):
+    character_id: int
+    messages: list[str]
+    trait: Optional[str] = None       # 可选：临时覆盖人物设定用于评测，此时不保存对话记录
+    persist: bool = True              # 是否将结果一次性批量写入对话记录
 
 # 手动创建复合索引（在 metadata 创建时自动应用）
-Index("ix_conversation_user_char", Conversation.user_id, Conversation.character_id)
+# 末尾带上 id，历史分页（WHERE user_id, character_id AND id < ? ORDER BY id DESC）可直接按索引顺序读取
+Index("ix_conversation_user_char", Conversation.user_id, Conversation.character_id, Conversation.id)
+# 归档任务按 timestamp < cutoff 筛选旧对话、导出按时间范围筛选，避免全表扫描
+Index("ix_conversation_timestamp", Conversation.timestamp)
+# 中文全文检索：MySQL FULLTEXT + ngram 分词（按 ngram_token_size 切分，默认 2 个字）
+Index(
+    "ft_conversation_messages", Conversation.user_message, Conversation.ai_message,
+    mysql_prefix="FULLTEXT", mysql_with_parser="ngram"
+)
+Index("ux_summary_user_char", ConversationSummary.user_id, ConversationSummary.character_id, unique=True)
+Index("ix_archive_user_char", ConversationArchive.user_id, ConversationArchive.character_id, ConversationArchive.last_conversation_id)
@@ -54,8 +54,8 @@ class User_Info(Base, table=True):
 
     political_status: Optional[str] = Field(sa_type=String(20), default="群众")  # 不强制“群众”
 
-    # 外键
-    user_id: int = Field(foreign_key="users.id", nullable=False)
+    # 外键（一对一，唯一索引；登录、/room 页面与 WebSocket 连接都按 user_id 查询）
+    user_id: int = Field(foreign_key="users.id", nullable=False, unique=True, index=True)
 
     # 关系
     user: User = Relationship(back_populates="user_info")
@@ -1,21 +1,139 @@
 # backend/routes/api.py
-from fastapi import APIRouter, Body, Request, Depends, HTTPException
+from fastapi import APIRouter, Body, Query, Request, Depends, HTTPException, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import Optional
+import asyncio
 import httpx
+import json
 import logging
 
-from jwt_handler import get_current_user_id
-from backend.crud import character, conversation
-from backend.models.conversation import CreateConversationRequest
+from setting import ENV_CONFIG
+from jwt_handler import get_current_user_id, token_cache
+from backend.crud import conversation
+from backend.models.conversation import CreateConversationRequest, BatchChatRequest
+from backend.services import llm_client
+from backend.services.llm_client import (
+    MODEL_NAME, LLM_CHAT_DEADLINE, LLM_FIRST_TOKEN_DEADLINE, LLM_HEDGE_AFTER, resolve_deadline, deadline_at
+)
+from backend.services.balancer import pool, NoBackendAvailable, BackendError
+from backend.services.scheduler import scheduler, SchedulerRejected
+from backend.services.reply_cache import reply_cache, make_key
+from backend.services import context
+from backend.services.memory import memory_store
+from backend.services.write_behind import conversation_writer
+from backend.services.character_catalog import character_catalog, build_system_prompt
+from backend.services.user_profile import user_profile_cache
+from backend.services.sessions import session_manager
+from backend.services.templates import static_pages
+from backend.services.broadcast import room_broadcaster
 
 logger = logging.getLogger(__name__)
 
+# 模型未生成内容时的兜底回复
+FALLBACK_REPLY = "嗯……我暂时不知道该怎么回答。"
+
+# 采样参数（同时作为回复缓存键的一部分）
+SAMPLING_PARAMS = {
+    "temperature": 0.85,
+    "top_p": 0.95,
+    "max_tokens": 512,
+}
+
+# 检测客户端断开的轮询间隔（秒）
+DISCONNECT_POLL_INTERVAL = float(ENV_CONFIG.get("DISCONNECT_POLL_INTERVAL", "0.5"))
+
+# 批量对话：单次请求的消息数上限与并发数（并发不超过调度器的单用户上限，不挤占交互请求）
+BATCH_MAX_MESSAGES = int(ENV_CONFIG.get("BATCH_MAX_MESSAGES", "500"))
+BATCH_CONCURRENCY = min(int(ENV_CONFIG.get("BATCH_CONCURRENCY", "2")), scheduler.max_per_user)
+
+# 历史记录分页大小
+HISTORY_PAGE_SIZE = int(ENV_CONFIG.get("HISTORY_PAGE_SIZE", "20"))
+HISTORY_MAX_PAGE_SIZE = 100
+
+# 全文检索：关键词最短长度（与 MySQL ngram_token_size 一致）与最多可翻的页数
+SEARCH_MIN_KEYWORD = int(ENV_CONFIG.get("SEARCH_MIN_KEYWORD", "2"))
+SEARCH_MAX_PAGES = int(ENV_CONFIG.get("SEARCH_MAX_PAGES", "50"))
+
+# 客户端中途断开、生成被取消的次数
+disconnect_stats = {"chat": 0, "stream": 0, "batch": 0}
+
+_STREAM_END = object()
+
 router = APIRouter(prefix="/ai", tags=["AI_chat"])
-@router.post("/chat")
-async def dashscope_chat(
-    request: Request,
-    data: CreateConversationRequest = Body(...),
-    current_user_id: int = Depends(get_current_user_id)
-):
+
+
+class ClientDisconnected(Exception):
+    """
+    客户端在回复生成完成前断开了连接
+    """
+
+
+async def _cancel_on_disconnect(request: Request, task: asyncio.Task):
+    """
+    轮询客户端连接状态，断开时取消生成任务（调度名额与上游连接随之释放）
+    """
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+    task.cancel()
+
+
+def _disconnected(watcher: asyncio.Task) -> bool:
+    # 监视任务正常结束即表示客户端已断开；同时取走异常，避免未处理异常告警
+    return watcher.done() and not watcher.cancelled() and watcher.exception() is None
+
+
+async def _run_until_disconnect(request: Request, coro):
+    """
+    运行生成协程，客户端断开时取消它并抛出 ClientDisconnected
+    """
+    task = asyncio.ensure_future(coro)
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, task))
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if _disconnected(watcher):
+            raise ClientDisconnected() from None
+        raise
+    finally:
+        watcher.cancel()
+
+
+async def _stream_until_disconnect(request: Request, source):
+    """
+    在独立任务中消费异步生成器并转发其输出；客户端断开时取消该任务，
+    使正在进行的模型生成立即中止，而不是等到下一次写出时才发现
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for item in source:
+                queue.put_nowait(item)
+        finally:
+            queue.put_nowait(_STREAM_END)
+
+    producer = asyncio.create_task(pump())
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, producer))
+    try:
+        while (item := await queue.get()) is not _STREAM_END:
+            yield item
+        if producer.cancelled():
+            if _disconnected(watcher):
+                raise ClientDisconnected()
+            return
+        if producer.exception() is not None:
+            raise producer.exception()
+    finally:
+        # 响应被中止（如服务端取消）时同样要停止生成
+        producer.cancel()
+        watcher.cancel()
+
+
+async def _resolve_chat(request: Request, data: CreateConversationRequest, current_user_id: int) -> dict:
+    """
+    校验登录状态与请求参数，并查询目标角色
+    :return: 角色信息字典
+    """
     client_ip = request.client.host
 
     if not current_user_id:
@@ -24,87 +142,186 @@ async def dashscope_chat(
 
     logger.info(f"💬 User {current_user_id} sending message from {client_ip}")
 
-    character_id = data.character_id
-    user_message = data.user_message
-
-    if not character_id or not user_message:
+    if not data.character_id or not data.user_message:
         logger.warning(f"User {current_user_id}: Missing params in chat request - {data}")
         raise HTTPException(status_code=400, detail="缺少必要参数")
 
-    characters = await character.get_character_by_id(character_id)
+    # 角色信息来自进程内目录缓存（含预生成的系统提示词），无需每次查库
+    characters = await character_catalog.get(data.character_id)
     if not characters:
-        logger.warning(f"User {current_user_id}: Invalid character ID {character_id}")
+        logger.warning(f"User {current_user_id}: Invalid character ID {data.character_id}")
         raise HTTPException(status_code=404, detail="角色不存在")
+    return characters
+
+
+def _build_payload(messages: list[dict], stream: bool) -> dict:
+    """
+    构造发送给 Ollama 的请求体
+    """
+    return {
+        "model": MODEL_NAME,
+        "messages": messages,
+        **SAMPLING_PARAMS,
+        "stream": stream
+    }
 
-    system_prompt = f"""
-    你正在扮演 {characters['name']}。
-    人物设定：{characters['trait']}
-    请始终以这个角色的身份、语气和思维方式回答问题。
-    不要暴露你是 AI 的事实。
-    """.strip()
 
+async def _generate_reply(user_id: int, character_id: int, payload: dict, expires_at: float) -> str:
+    """
+    经调度器与节点池调用模型（非流式），返回去除首尾空白后的回复文本；
+    到达 expires_at（事件循环时钟，见 deadline_at）仍未完成时返回 504，节点熔断时由节点池直接拒绝
+    """
+    # 复用应用级连接池，避免每条消息都重新建连；经调度器限流后再访问模型
+    client = llm_client.get_client()
+
+    async def call(endpoint) -> httpx.Response:
+        resp = await client.post(
+            f"{endpoint.url}/v1/chat/completions",
+            json=payload
+        )
+        if resp.status_code >= 500:
+            # 服务端错误计入熔断统计（并触发对冲请求的另一路）
+            raise BackendError(resp.status_code, resp.text)
+        return resp
+
+    pool.ensure_available()
     try:
-        # 使用本地 Ollama 服务地址（支持 OpenAI 兼容接口）
-        OLLAMA_BASE_URL = "http://localhost:11434"
-        MODEL_NAME = "qwen3:8b"
+        # 截止时间套在排队与节点租用之外：排队时间计入预算，对冲补发共用剩余时间；
+        # 到期时以取消的形式穿过 lease，不计为节点失败
+        async with asyncio.timeout_at(expires_at):
+            async with scheduler.slot(user_id):
+                resp = await pool.hedged((user_id, character_id), call, LLM_HEDGE_AFTER)
+    except BackendError as e:
+        logger.error(f"🤖 Ollama API error [{e.status_code}]: {e.detail}")
+        raise HTTPException(status_code=e.status_code, detail=f"Ollama 错误: {e.detail}")
+    except (TimeoutError, httpx.TimeoutException):
+        logger.error("⏱️ Ollama did not finish before the request deadline")
+        raise HTTPException(status_code=504, detail="模型响应超时，请稍后再试")
 
-        headers = {
-            "Content-Type": "application/json"
-        }
+    if resp.status_code != 200:
+        error_detail = resp.text
+        logger.error(f"🤖 Ollama API error [{resp.status_code}]: {error_detail}")
+        raise HTTPException(
+            status_code=resp.status_code,
+            detail=f"Ollama 错误: {error_detail}"
+        )
 
-        payload = {
-            "model": MODEL_NAME,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message}
-            ],
-            "temperature": 0.85,
-            "top_p": 0.95,
-            "max_tokens": 512,
-            "stream": False
-        }
+    result = resp.json()
+    logger.info(f"🤖 Raw Ollama response: {result}")
 
-        async with httpx.AsyncClient(timeout=180.0) as client:
-            resp = await client.post(
-                f"{OLLAMA_BASE_URL}/v1/chat/completions",
-                json=payload,
-                headers=headers
-            )
+    # 安全访问嵌套字段
+    if not result.get("choices"):
+        logger.error("❌ Ollama returned no choices in response")
+        raise HTTPException(status_code=500, detail="模型未生成任何回复")
+
+    choice = result["choices"][0]
+    message = choice.get("message", {})
+    return message.get("content", "").strip()
+
+
+def _rejected(e: SchedulerRejected) -> HTTPException:
+    """
+    将调度器拒绝转换为带 Retry-After 的 HTTP 错误
+    """
+    return HTTPException(
+        status_code=e.status_code,
+        detail=e.detail,
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
+def _unavailable(e: NoBackendAvailable) -> HTTPException:
+    """
+    没有可用节点（含全部熔断）时立即返回 503
+    """
+    return HTTPException(
+        status_code=503,
+        detail="大模型服务暂不可用，请稍后再试",
+        headers={"Retry-After": str(e.retry_after)} if e.retry_after else None
+    )
 
-        if resp.status_code != 200:
-            error_detail = resp.text
-            logger.error(f"🤖 Ollama API error [{resp.status_code}]: {error_detail}")
-            raise HTTPException(
-                status_code=resp.status_code,
-                detail=f"Ollama 错误: {error_detail}"
-            )
 
-        result = resp.json()
-        logger.info(f"🤖 Raw Ollama response: {result}")
+async def _persist_turn(user_id: int, character_id: int, user_message: str, reply: str):
+    """
+    保存一轮对话（开启 write-behind 时异步批量落库），并送入长期记忆索引
+    """
+    await conversation_writer.save(user_id, character_id, user_message, reply)
+    memory_store.remember(user_id, character_id, user_message, reply)
 
-        # 安全访问嵌套字段
-        if not result.get("choices"):
-            logger.error("❌ Ollama returned no choices in response")
-            raise HTTPException(status_code=500, detail="模型未生成任何回复")
-        
-        choice = result["choices"][0]
-        message = choice.get("message", {})
-        content = message.get("content", "").strip()
+
+def _sse(data: dict, event: str | None = None) -> str:
+    """
+    按 Server-Sent Events 格式编码一条消息
+    """
+    body = json.dumps(data, ensure_ascii=False)
+    if event:
+        return f"event: {event}\ndata: {body}\n\n"
+    return f"data: {body}\n\n"
+
+
+@router.post("/chat")
+async def dashscope_chat(
+    request: Request,
+    data: CreateConversationRequest = Body(...),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    # 截止时间从请求到达时开始计算
+    expires_at = deadline_at(resolve_deadline(data.deadline, LLM_CHAT_DEADLINE))
+    characters = await _resolve_chat(request, data, current_user_id)
+    character_id = data.character_id
+    user_message = data.user_message
+
+    try:
+        # 在 token 预算内拼装历史上下文（摘要 + 最近轮次）
+        messages, has_history = await context.build_messages(
+            current_user_id, character_id, characters["system_prompt"], user_message
+        )
+        payload = _build_payload(messages, stream=False)
+
+        # 客户端断开时取消生成，及时归还推理名额
+        if has_history:
+            # 带历史的回复依赖上下文，不走缓存
+            content = await _run_until_disconnect(
+                request, _generate_reply(current_user_id, character_id, payload, expires_at)
+            )
+            cached = False
+        else:
+            # 相同角色、相同开场白的请求可命中缓存，或与正在进行的同一请求合并
+            cache_key = make_key(character_id, user_message, MODEL_NAME, SAMPLING_PARAMS)
+            content, cached = await _run_until_disconnect(request, reply_cache.get_or_generate(
+                cache_key,
+                lambda: _generate_reply(current_user_id, character_id, payload, expires_at)
+            ))
+        if cached:
+            logger.info(f"♻️ Reply cache hit for user {current_user_id}, character {character_id}")
 
         if not content:
             logger.warning("⚠️ Model returned empty content")
             # 可以设置一个兜底回复
-            content = "嗯……我暂时不知道该怎么回答。"
+            content = FALLBACK_REPLY
 
         reply = content
 
         # 保存对话记录
-        await conversation.save_conversation(current_user_id, character_id, user_message, reply)
+        await _persist_turn(current_user_id, character_id, user_message, reply)
 
         logger.info(f"✅ Reply generated for user {current_user_id}, length: {len(reply)} chars")
 
         return {"reply": reply}
 
+    except HTTPException:
+        raise
+    except ClientDisconnected:
+        disconnect_stats["chat"] += 1
+        logger.info(f"🔌 Client of user {current_user_id} disconnected, generation cancelled")
+        # 客户端已不在，响应内容不会被读取
+        return Response(status_code=499)
+    except SchedulerRejected as e:
+        logger.warning(f"⏳ Chat from user {current_user_id} rejected by scheduler: {e.detail}")
+        raise _rejected(e)
+    except NoBackendAvailable as e:
+        logger.critical(f"❌ 所有 Ollama 节点均不可用: {e}")
+        raise _unavailable(e)
     except httpx.ConnectError:
         logger.critical("❌ 无法连接到 Ollama 服务，请确认 'ollama serve' 是否已启动")
         raise HTTPException(status_code=503, detail="无法连接到本地大模型服务（Ollama）")
@@ -113,3 +330,345 @@ async def dashscope_chat(
         error_msg = traceback.format_exc()
         logger.critical(f"💥 Unexpected error in /api/user/chat:\n{error_msg}")
         raise HTTPException(status_code=500, detail=f"请求失败: {str(e)}")
+
+
+@router.post("/chat/stream")
+async def dashscope_chat_stream(
+    request: Request,
+    data: CreateConversationRequest = Body(...),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    流式对话：将 Ollama 的增量输出以 SSE 形式实时转发给浏览器。
+    事件格式：
+      data: {"delta": "..."}              —— 增量文本
+      event: done / data: {"reply": ...}  —— 生成结束，附带完整回复
+      event: error / data: {"message": ...}
+    """
+    # 首个 token 的截止时间从请求到达时开始计算
+    first_token_at = deadline_at(resolve_deadline(data.deadline, LLM_FIRST_TOKEN_DEADLINE))
+    characters = await _resolve_chat(request, data, current_user_id)
+    character_id = data.character_id
+    user_message = data.user_message
+    messages, has_history = await context.build_messages(
+        current_user_id, character_id, characters["system_prompt"], user_message
+    )
+    payload = _build_payload(messages, stream=True)
+    cache_key = make_key(character_id, user_message, MODEL_NAME, SAMPLING_PARAMS)
+    cached_reply = None if has_history else reply_cache.lookup(cache_key)
+
+    # 在响应开始前做准入检查，超限或熔断时直接返回 429/503（命中缓存则无需占用名额）
+    if cached_reply is None:
+        try:
+            pool.ensure_available()
+            scheduler.check_admission(current_user_id)
+        except NoBackendAvailable as e:
+            logger.warning(f"⚡ Stream chat from user {current_user_id} failed fast: {e}")
+            raise _unavailable(e)
+        except SchedulerRejected as e:
+            logger.warning(f"⏳ Stream chat from user {current_user_id} rejected by scheduler: {e.detail}")
+            raise _rejected(e)
+
+    async def cached_stream():
+        logger.info(f"♻️ Reply cache hit for user {current_user_id}, character {character_id}")
+        yield _sse({"delta": cached_reply})
+        try:
+            await _persist_turn(current_user_id, character_id, user_message, cached_reply)
+        except Exception as e:
+            logger.critical(f"💥 Unexpected error in /ai/chat/stream: {e}", exc_info=True)
+            yield _sse({"message": f"请求失败: {str(e)}"}, event="error")
+            return
+        yield _sse({"reply": cached_reply}, event="done")
+
+    async def event_stream():
+        parts: list[str] = []
+        try:
+            client = llm_client.get_client()
+            # 流式输出的总时长不计入慢调用统计；截止时间只约束首个 token（含排队），之后由读超时兜底；
+            # 截止时间套在 lease 外层，到期时不计为节点失败
+            async with asyncio.timeout_at(first_token_at) as first_token, \
+                    scheduler.slot(current_user_id), \
+                    pool.lease((current_user_id, character_id), measure_latency=False) as endpoint, \
+                    client.stream("POST", f"{endpoint.url}/v1/chat/completions", json=payload) as resp:
+                if resp.status_code != 200:
+                    error_detail = (await resp.aread()).decode("utf-8", errors="replace")
+                    if resp.status_code >= 500:
+                        raise BackendError(resp.status_code, error_detail)
+                    logger.error(f"🤖 Ollama API error [{resp.status_code}]: {error_detail}")
+                    yield _sse({"message": f"Ollama 错误: {error_detail}"}, event="error")
+                    return
+
+                # OpenAI 兼容接口按行返回 "data: {...}"，以 "data: [DONE]" 结束
+                async for line in resp.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    if first_token.when() is not None:
+                        first_token.reschedule(None)
+                    chunk = line[len("data:"):].strip()
+                    if chunk == "[DONE]":
+                        break
+                    try:
+                        choices = json.loads(chunk).get("choices") or []
+                    except json.JSONDecodeError:
+                        logger.warning(f"⚠️ Malformed stream chunk from Ollama: {chunk!r}")
+                        continue
+                    if not choices:
+                        continue
+                    delta = (choices[0].get("delta") or {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        yield _sse({"delta": delta})
+
+            reply = "".join(parts).strip()
+            if not reply:
+                logger.warning("⚠️ Model returned empty content")
+                reply = FALLBACK_REPLY
+                yield _sse({"delta": reply})
+            elif not has_history:
+                reply_cache.store(cache_key, reply)
+
+            # 完整回复生成后再保存对话记录
+            await _persist_turn(current_user_id, character_id, user_message, reply)
+            logger.info(f"✅ Streamed reply for user {current_user_id}, length: {len(reply)} chars")
+            yield _sse({"reply": reply}, event="done")
+
+        except SchedulerRejected as e:
+            logger.warning(f"⏳ Stream chat from user {current_user_id} rejected by scheduler: {e.detail}")
+            yield _sse({"message": e.detail, "retry_after": e.retry_after}, event="error")
+        except NoBackendAvailable as e:
+            logger.critical(f"❌ 所有 Ollama 节点均不可用: {e}")
+            yield _sse({"message": "大模型服务暂不可用，请稍后再试", "retry_after": e.retry_after}, event="error")
+        except BackendError as e:
+            logger.error(f"🤖 Ollama API error [{e.status_code}]: {e.detail}")
+            yield _sse({"message": f"Ollama 错误: {e.detail}"}, event="error")
+        except (TimeoutError, httpx.TimeoutException):
+            logger.error(f"⏱️ Ollama stream timed out for user {current_user_id}")
+            yield _sse({"message": "模型响应超时，请稍后再试"}, event="error")
+        except httpx.ConnectError:
+            logger.critical("❌ 无法连接到 Ollama 服务，请确认 'ollama serve' 是否已启动")
+            yield _sse({"message": "无法连接到本地大模型服务（Ollama）"}, event="error")
+        except Exception as e:
+            logger.critical(f"💥 Unexpected error in /ai/chat/stream: {e}", exc_info=True)
+            yield _sse({"message": f"请求失败: {str(e)}"}, event="error")
+
+    async def guarded_stream():
+        try:
+            async for item in _stream_until_disconnect(request, event_stream()):
+                yield item
+        except ClientDisconnected:
+            disconnect_stats["stream"] += 1
+            logger.info(f"🔌 Stream client of user {current_user_id} disconnected, generation cancelled")
+
+    return StreamingResponse(
+        guarded_stream() if cached_reply is None else cached_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # 关闭 Nginx 缓冲，保证逐块下发
+        }
+    )
+
+
+@router.post("/chat/batch")
+async def batch_chat(
+    request: Request,
+    data: BatchChatRequest = Body(...),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    批量对话（离线评测）：同一角色、多条独立的单轮消息，以有限并发调用模型，
+    每完成一条即输出一行 NDJSON：
+      {"index": 0, "message": "...", "reply": "..."}  或  {"index": 0, "message": "...", "error": "..."}
+    最后一行为汇总 {"done": true, "total": n, "failed": m, "saved": k}；
+    所有成功结果在结束时一次性批量写库（传入 trait 临时覆盖人设时不保存）
+    """
+    if not current_user_id:
+        raise HTTPException(status_code=401, detail="未授权访问")
+    if not data.character_id or not data.messages:
+        raise HTTPException(status_code=400, detail="缺少必要参数")
+    if len(data.messages) > BATCH_MAX_MESSAGES:
+        raise HTTPException(status_code=400, detail=f"单次最多 {BATCH_MAX_MESSAGES} 条消息")
+
+    characters = await character_catalog.get(data.character_id)
+    if not characters:
+        raise HTTPException(status_code=404, detail="角色不存在")
+    system_prompt = characters["system_prompt"]
+    if data.trait:
+        system_prompt = build_system_prompt({**characters, "trait": data.trait})
+    persist = data.persist and not data.trait
+
+    try:
+        pool.ensure_available()
+    except NoBackendAvailable as e:
+        raise _unavailable(e)
+
+    character_id = data.character_id
+    # 批量任务使用独立的调度键，与该用户的交互请求分开计数、轮询
+    scheduler_key = ("batch", current_user_id)
+    logger.info(f"📦 Batch chat from user {current_user_id}: {len(data.messages)} messages, character {character_id}")
+
+    async def run_one(index: int, message: str) -> dict:
+        result = {"index": index, "message": message}
+        payload = _build_payload([
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": message}
+        ], stream=False)
+        try:
+            # 每条消息单独计时：批内排在后面的消息不因前面的耗时而超时
+            expires_at = deadline_at(LLM_CHAT_DEADLINE)
+            result["reply"] = await _generate_reply(scheduler_key, character_id, payload, expires_at) or FALLBACK_REPLY
+        except HTTPException as e:
+            result["error"] = e.detail
+        except SchedulerRejected as e:
+            result["error"] = e.detail
+        except NoBackendAvailable:
+            result["error"] = "大模型服务暂不可用"
+        except Exception as e:
+            logger.error(f"📦 Batch item {index} failed: {e}", exc_info=True)
+            result["error"] = f"请求失败: {str(e)}"
+        return result
+
+    async def ndjson_stream():
+        results: asyncio.Queue = asyncio.Queue()
+        pending = iter(enumerate(data.messages))
+
+        async def worker():
+            # 多个 worker 共享同一个迭代器，保证同时在途的请求不超过 BATCH_CONCURRENCY
+            for index, message in pending:
+                results.put_nowait(await run_one(index, message))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(BATCH_CONCURRENCY, len(data.messages)))]
+        records, failed = [], 0
+        try:
+            for _ in range(len(data.messages)):
+                item = await results.get()
+                if "reply" in item:
+                    records.append({
+                        "user_id": current_user_id,
+                        "character_id": character_id,
+                        "user_message": item["message"],
+                        "ai_message": item["reply"]
+                    })
+                else:
+                    failed += 1
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+        finally:
+            for w in workers:
+                w.cancel()
+
+        saved = 0
+        if persist and records:
+            try:
+                saved = await conversation.save_conversations_bulk(records)
+            except Exception as e:
+                logger.error(f"📦 Batch persistence failed: {e}")
+        logger.info(f"📦 Batch done for user {current_user_id}: {len(records)} ok, {failed} failed, {saved} saved")
+        yield json.dumps({"done": True, "total": len(data.messages), "failed": failed, "saved": saved}) + "\n"
+
+    async def guarded_stream():
+        try:
+            async for line in _stream_until_disconnect(request, ndjson_stream()):
+                yield line
+        except ClientDisconnected:
+            disconnect_stats["batch"] += 1
+            logger.info(f"🔌 Batch client of user {current_user_id} disconnected, remaining items cancelled")
+
+    return StreamingResponse(
+        guarded_stream(),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/history")
+async def chat_history(
+    request: Request,
+    character_id: int = Query(...),
+    before_id: Optional[int] = Query(None, description="返回 id 小于该值的记录；不传则从最新一条开始"),
+    limit: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    与某角色的历史对话（keyset 分页，从新到旧翻页）：
+      {"items": [...按时间正序...], "next_before_id": 下一页游标或 null}
+    已归档的早期对话会按需从归档块中解压读取。
+    响应带 ETag（由该页范围内的最新 id、条数与归档状态生成），If-None-Match 命中时返回 304，不再读取消息正文
+    """
+    if not current_user_id:
+        raise HTTPException(status_code=401, detail="未授权访问")
+
+    version = await conversation.get_history_version(current_user_id, character_id, before_id)
+    etag = f'W/"h{current_user_id}-{character_id}-{before_id or 0}-{limit}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    # 多取一条用于判断是否还有更早的记录
+    rows = await conversation.get_conversation_page(current_user_id, character_id, before_id, limit + 1)
+    if len(rows) <= limit:
+        # 在线表中的记录不够一页：继续从归档块中按需解压读取更早的对话
+        cursor = rows[-1]["id"] if rows else before_id
+        rows += await conversation.get_archived_page(current_user_id, character_id, cursor, limit + 1 - len(rows))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return JSONResponse(
+        {
+            "items": list(reversed(rows)),
+            "next_before_id": rows[-1]["id"] if has_more else None
+        },
+        headers=headers
+    )
+
+
+@router.get("/search")
+async def search_history(
+    q: str = Query(..., description="关键词"),
+    character_id: Optional[int] = Query(None),
+    page: int = Query(1, ge=1),
+    page_size: int = Query(HISTORY_PAGE_SIZE, ge=1, le=HISTORY_MAX_PAGE_SIZE),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    """
+    在当前用户的历史对话中全文检索（仅在线表，已归档的对话不参与检索），按相关度排序分页：
+      {"items": [..., "score": 相关度], "page": n, "has_more": bool}
+    全文索引是全表共享的，检索耗时随关键词在全表中的命中数增长（见 conversation.search_conversations）
+    """
+    if not current_user_id:
+        raise HTTPException(status_code=401, detail="未授权访问")
+    keyword = q.strip()
+    if len(keyword) < SEARCH_MIN_KEYWORD:
+        raise HTTPException(status_code=400, detail=f"关键词至少 {SEARCH_MIN_KEYWORD} 个字")
+    if page > SEARCH_MAX_PAGES:
+        raise HTTPException(status_code=400, detail="页码过大，请缩小检索范围")
+
+    rows = await conversation.search_conversations(
+        current_user_id, keyword, character_id,
+        offset=(page - 1) * page_size, limit=page_size + 1
+    )
+    return {
+        "items": rows[:page_size],
+        "page": page,
+        "has_more": len(rows) > page_size
+    }
+
+
+@router.get("/stats")
+async def chat_stats(current_user_id: int = Depends(get_current_user_id)):
+    """
+    推理调度统计：队列深度、等待时间分位数、拒绝次数等
+    """
+    if not current_user_id:
+        raise HTTPException(status_code=401, detail="未授权访问")
+    return {
+        "scheduler": scheduler.stats(),
+        "backends": pool.stats(),
+        "reply_cache": reply_cache.stats(),
+        "memory": memory_store.stats(),
+        "write_behind": conversation_writer.stats(),
+        "client_disconnects": disconnect_stats,
+        "user_profiles": user_profile_cache.stats(),
+        "auth_tokens": token_cache.stats(),
+        "sessions": session_manager.stats(),
+        "static_pages": static_pages.stats(),
+        "room_websockets": room_broadcaster.stats(),
+    }
@@ -1,81 +1,174 @@
 # backend/routes/pages.py
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, Cookie, Response
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
-from jinja2 import Environment, FileSystemLoader
-import json
 import logging
-
-from jwt_handler import get_current_user_id, verify_password, get_password_hash, create_access_token
-from backend.crud.user import check_user, get_user_info
-from backend.crud.character import get_all_characters
-from setting import ENV_CONFIG, FRONTEND_DIR
+from datetime import timedelta
+from email.utils import parsedate_to_datetime
+
+from jwt_handler import (
+    get_current_user_id, verify_password_async, hash_password_async, create_access_token,
+    revoke_token, revoke_session, get_session_id, ACCESS_TOKEN_EXPIRE_MINUTES
+)
+from backend.crud.user import get_user_by_account, create_user
+from backend.services.user_profile import user_profile_cache
+from backend.services.character_catalog import character_catalog
+from backend.services.sessions import session_manager
+from backend.services.templates import render, static_pages, StaticPage
 
 logger = logging.getLogger(__name__)
 
-# 使用 Jinja2Templates 或手动加载模板（避免循环导入）
-template_env = Environment(loader=FileSystemLoader(str(FRONTEND_DIR)))
-
 router = APIRouter()
 
+def _not_modified(request: Request, page: StaticPage) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/").strip('"') for t in if_none_match.split(",")}
+        return "*" in tags or page.etag in tags or f"{page.etag}-gz" in tags
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return parsedate_to_datetime(if_modified_since).timestamp() >= page.mtime
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def _static_page(request: Request, name: str, **context) -> Response:
+    """
+    返回预渲染的页面：按 Accept-Encoding 选择原文或 gzip 字节，ETag / Last-Modified 命中时返回 304
+    """
+    page = static_pages.get(name, **context)
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "").lower()
+    headers = {
+        # 每次都向服务端验证，页面更新后立即生效；未变化时只需一次 304
+        "Cache-Control": "no-cache",
+        # 两种编码的字节不同，ETag 也要区分
+        "ETag": f'"{page.etag}-gz"' if use_gzip else f'"{page.etag}"',
+        "Last-Modified": page.last_modified,
+        "Vary": "Accept-Encoding",
+    }
+    if _not_modified(request, page):
+        static_pages.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=page.gzip_body, media_type="text/html", headers=headers)
+    return Response(content=page.body, media_type="text/html", headers=headers)
+
 @router.get("/", response_class=HTMLResponse)
-async def home():
-    template = template_env.get_template("index.html")
-    content = template.render(debug_user=None)
-    return HTMLResponse(content=content)
+async def home(request: Request):
+    # 与请求无关的页面：预渲染一次，支持 gzip 与 304
+    return _static_page(request, "index.html", debug_user=None)
+
+def _set_auth_cookies(response, user_id: int, session_id: str, refresh_token: str):
+    """
+    签发访问令牌，并把访问令牌与刷新令牌写入 HttpOnly Cookie
+    """
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(data={"sub": str(user_id), "sid": session_id}, expires_delta=access_token_expires)
+    response.set_cookie(
+        key="access_token",
+        value=access_token,
+        httponly=True,
+        secure=False,
+        samesite="lax",
+        max_age=int(access_token_expires.total_seconds())
+    )
+    response.set_cookie(
+        key="refresh_token",
+        value=refresh_token,
+        httponly=True,
+        secure=False,
+        samesite="lax",
+        max_age=int(session_manager.ttl)
+    )
+
+def _clear_auth_cookies(response):
+    response.delete_cookie(key="access_token", httponly=True, secure=False, samesite="lax")
+    response.delete_cookie(key="refresh_token", httponly=True, secure=False, samesite="lax")
 
 @router.get("/login", response_class=HTMLResponse)
-async def login_page():
-    template = template_env.get_template("login.html")
-    content = template.render()
-    return HTMLResponse(content=content)
+async def login_page(request: Request, refresh_token: str = Cookie(None)):
+    # 会话仍有效时直接换发访问令牌并回到首页，无需重新输入密码
+    if refresh_token:
+        result = await session_manager.refresh(refresh_token)
+        if result:
+            session_id, user_id, new_refresh_token = result
+            response = RedirectResponse(url="/")
+            _set_auth_cookies(response, user_id, session_id, new_refresh_token)
+            return response
+
+    # 刷新失败时不清除 Cookie：多个标签页同时刷新时，落败的一方持有的是刚被轮换掉的旧令牌，
+    # 浏览器里已经是胜出方写入的新 Cookie，清除会把用户登出；失效的 Cookie 到期后自然消失
+    return _static_page(request, "login.html")
 
 @router.get("/write_info", response_class=HTMLResponse)
-async def info_page():
-    template = template_env.get_template("info_write.html")
-    content = template.render()
-    return HTMLResponse(content=content)
+async def info_page(request: Request):
+    return _static_page(request, "info_write.html")
 
 @router.post("/login")
 async def login(request: Request):
     data = await request.json()
     account = data.get("account")
     password = data.get("password")
-    hash_password = get_password_hash(password)
 
     if not account or not password:
         logger.warning(f"Login failed: missing credentials")
         return JSONResponse({"success": False, "message": "请输入用户名和密码"}, status_code=400)
 
-    result = await check_user(account, hash_password)
-
-    user_id, hashed_password_from_db, state = result
+    # 先查后建：只有注册时才计算新哈希，哈希与校验都在线程池中执行
+    existing = await get_user_by_account(account)
+    if existing:
+        user_id, hashed_password_from_db = existing
+        state = True
+    else:
+        user_id, hashed_password_from_db, state = await create_user(account, await hash_password_async(password))
 
-    if not verify_password(password, hashed_password_from_db):
+    if state and not await verify_password_async(password, hashed_password_from_db):
         logger.warning(f"Login failed: wrong password for user {account}")
         return JSONResponse({"success": False, "message": "用户名或密码错误"}, status_code=401)
 
-    from datetime import timedelta
-    access_token_expires = timedelta(minutes=int(ENV_CONFIG.get("ACCESS_TOKEN_EXPIRE_MINUTES", 30)))
-    access_token = create_access_token(data={"sub": str(user_id)}, expires_delta=access_token_expires)
-
     if state:
         logger.info(f"🔐 User {user_id} logged in successfully")
-        data = await get_user_info(user_id)
-        if not data or not data.is_complete():
+        profile = await user_profile_cache.get(user_id)
+        if not profile or not profile.is_complete:
             logger.info(f"🔐 User {user_id} has not completed informations")
             state = False
     else:
         logger.info(f"🔐 User {user_id} registered successfully")
 
+    session_id, refresh_token = await session_manager.create(user_id)
     response = JSONResponse({"success": True, "account": account, "state": state})
-    response.set_cookie(
-        key="access_token",
-        value=access_token,
-        httponly=True,
-        secure=False,
-        samesite="lax",
-        max_age=access_token_expires.total_seconds()
-    )
+    _set_auth_cookies(response, user_id, session_id, refresh_token)
+    return response
+
+@router.post("/refresh")
+async def refresh(refresh_token: str = Cookie(None)):
+    # 用刷新令牌换发新的访问令牌，刷新令牌同时轮换，会话有效期顺延
+    result = await session_manager.refresh(refresh_token) if refresh_token else None
+    if not result:
+        # 不清除 Cookie（见 login_page）：并发刷新中落败的标签页重试时会带上新的刷新令牌
+        return JSONResponse({"success": False, "message": "登录已过期，请重新登录"}, status_code=401)
+
+    session_id, user_id, new_refresh_token = result
+    response = JSONResponse({"success": True})
+    _set_auth_cookies(response, user_id, session_id, new_refresh_token)
+    return response
+
+@router.post("/logout")
+async def logout(access_token: str = Cookie(None), refresh_token: str = Cookie(None)):
+    # 结束会话：刷新令牌随之作废；本进程内该会话的访问令牌立即失效，其他进程在访问令牌过期后失效
+    # 会话 ID 只取自签名有效的访问令牌，或 secret 与存储摘要一致的刷新令牌，伪造的 Cookie 不能结束他人的会话
+    session_id = get_session_id(access_token)
+    if session_id is not None:
+        await session_manager.revoke(session_id)
+    elif refresh_token:
+        session_id = await session_manager.end(refresh_token)
+    if session_id:
+        revoke_session(session_id)
+    if access_token:
+        revoke_token(access_token)
+    response = JSONResponse({"success": True})
+    _clear_auth_cookies(response)
     return response
 
 @router.get("/ai", response_class=HTMLResponse)
@@ -87,11 +180,7 @@ async def chat_page(request: Request, current_user_id: int = Depends(get_current
         logger.warning(f"🚫 Unauthorized access to /user from IP: {client_ip}")
         return RedirectResponse(url="/login")
 
-    template = template_env.get_template("ai_talk.html")
-    characters = await get_all_characters()
-    characters_json = json.dumps([
-        {"id": c["id"], "name": c["name"], "trait": c["trait"]}
-        for c in characters
-    ], ensure_ascii=False)
-    content = template.render(characters=characters, characters_json=characters_json, debug_user=current_user_id)
+    # 角色列表及其 JSON 均已在目录缓存中预先生成
+    characters, characters_json = await character_catalog.all()
+    content = render("ai_talk.html", characters=characters, characters_json=characters_json, debug_user=current_user_id)
     return HTMLResponse(content=content)
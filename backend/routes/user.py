@@ -3,7 +3,7 @@ from setting import logger
 from fastapi import APIRouter, HTTPException, Depends
 
 from jwt_handler import get_current_user_id
-from backend.crud.user import create_or_update_user_info
+from backend.services.user_profile import save_profile
 from backend.models.user import User_Info
 
 router = APIRouter(prefix="/user",tags=["用户信息管理"])
@@ -22,8 +22,8 @@ async def commit_user_info(
                 "message": "请求体为空"
             }
 
-        # 执行创建或更新
-        user_info = await create_or_update_user_info(user_id=current_user_id, user_info_data=data.model_dump())
+        # 执行创建或更新（同时写穿资料缓存）
+        user_info = await save_profile(user_id=current_user_id, user_info_data=data.model_dump())
 
         # ✅ 成功响应：结构化输出
         return {
@@ -4,22 +4,16 @@ from fastapi import APIRouter, Request, Depends, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse, RedirectResponse
 import json
 import logging
-from typing import List
-
-from jinja2 import Environment, FileSystemLoader
 
 from jwt_handler import get_current_user_id
-from backend.crud.user import get_user_info
-from setting import FRONTEND_DIR
+from backend.services.user_profile import user_profile_cache
+from backend.services.templates import render
+from backend.services.broadcast import room_broadcaster
 
 logger = logging.getLogger(__name__)
 
-template_env = Environment(loader=FileSystemLoader(str(FRONTEND_DIR)))
-
 router = APIRouter()
 
-# 存储活跃的 WebSocket 连接（简单示例，生产建议用 Redis 或后台任务管理）
-active_connections: List[WebSocket] = []
 
 @router.get("/room", response_class=HTMLResponse)
 async def chat_room_page(request: Request, current_user_id: int = Depends(get_current_user_id)):
@@ -30,11 +24,10 @@ async def chat_room_page(request: Request, current_user_id: int = Depends(get_cu
         logger.warning(f"🚫 Unauthorized access to /room from IP: {client_ip}")
         return RedirectResponse(url="/login")
 
-    template = template_env.get_template("room.html")
-    user_result = await get_user_info(current_user_id)
+    user_result = await user_profile_cache.get(current_user_id)
     stu_id = user_result.user_id if user_result else "Unknown"
 
-    content = template.render(debug_user=current_user_id, stu_id = stu_id)
+    content = render("room.html", debug_user=current_user_id, stu_id = stu_id)
     return HTMLResponse(content=content)
 
 @router.websocket("/ws")
@@ -52,7 +45,8 @@ async def websocket_endpoint(websocket: WebSocket, current_user_id: int = None):
             await websocket.close(code=4001, reason="Invalid or expired token")
             return
 
-        user_result = await get_user_info(current_user_id)
+        # 资料来自进程内缓存，重连风暴不会逐个打到数据库
+        user_result = await user_profile_cache.get(current_user_id)
         stu_id = user_result.stu_id if user_result else "Unknown"
     except Exception as e:
         logger.error(f"WebSocket auth failed: {e}")
@@ -60,7 +54,8 @@ async def websocket_endpoint(websocket: WebSocket, current_user_id: int = None):
         return
 
     await websocket.accept()
-    active_connections.append(websocket)
+    # 每个连接有独立的发送队列与写任务，广播不会被慢客户端阻塞
+    room_broadcaster.connect(websocket)
     logger.info(f"🟢 User {stu_id} ({current_user_id}) connected via WebSocket")
 
     try:
@@ -81,23 +76,12 @@ async def websocket_endpoint(websocket: WebSocket, current_user_id: int = None):
                 "timestamp": int(time.time())
             }
 
-            # 广播给所有连接的客户端
-            disconnected = []
-            for conn in active_connections:
-                try:
-                    await conn.send_json(response)
-                except Exception:
-                    disconnected.append(conn)
-
-            # 移除失效连接
-            for conn in disconnected:
-                if conn in active_connections:
-                    active_connections.remove(conn)
+            # 广播给所有连接的客户端（只入队，不等待发送）
+            room_broadcaster.broadcast(response)
 
     except WebSocketDisconnect:
         logger.info(f"🔴 User {stu_id} ({current_user_id}) disconnected")
     except Exception as e:
         logger.error(f"WebSocket error for user {current_user_id}: {e}")
     finally:
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        await room_broadcaster.disconnect(websocket)
@@ -0,0 +1,181 @@
+# backend/services/assets.py
+import json
+import logging
+import mimetypes
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+from setting import ENV_CONFIG, BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 静态资源配置（可在 .env 中覆盖）
+# ======================
+
+# backend.jobs.build_assets 的输出目录：manifest.json 与 files/（带内容哈希的文件）
+ASSET_BUILD_DIR = BASE_DIR / ENV_CONFIG.get("ASSET_BUILD_DIR", "data/assets")
+ASSET_FILES_DIR = ASSET_BUILD_DIR / "files"
+ASSET_MANIFEST = ASSET_BUILD_DIR / "manifest.json"
+ASSET_URL_PREFIX = "/assets/"
+
+# 带哈希的文件内容永不改变，可长期缓存
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# 预压缩编码与图片格式：按优先级排列，(清单中的名称, 文件后缀, 请求头中的标记)
+ENCODINGS = (("br", ".br", "br"), ("gzip", ".gz", "gzip"))
+IMAGE_FORMATS = (("avif", ".avif", "image/avif"), ("webp", ".webp", "image/webp"))
+
+
+def _accepts(header: str, token: str) -> bool:
+    """
+    Accept / Accept-Encoding 中是否包含 token（q=0 视为不接受）
+    """
+    for item in header.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip() != token:
+            continue
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+class AssetManifest:
+    """
+    构建清单：源文件名 -> 带哈希的文件名及其预压缩 / 转码版本
+    没有构建产物时 asset_url() 退回 /static/ 下的原文件
+    """
+
+    def __init__(self, path: Path = ASSET_MANIFEST):
+        self.path = path
+        self.files: dict[str, dict] = {}
+        # 带哈希的路径 -> 清单条目
+        self.by_path: dict[str, dict] = {}
+        # 构建时间（时间戳），没有清单时为 0
+        self.built_at = 0.0
+
+    def load(self):
+        """
+        清单缺失或损坏时退回 /static/ 下的原文件，不影响服务启动
+        """
+        self.files, self.by_path, self.built_at = {}, {}, 0.0
+        if not self.path.exists():
+            logger.info("📦 No asset manifest found, serving assets from /static")
+            return
+        try:
+            manifest = json.loads(self.path.read_text(encoding="utf-8"))
+            files = manifest["files"]
+            by_path = {entry["path"]: entry for entry in files.values()}
+            built_at = datetime.fromisoformat(manifest["built_at"]).timestamp() if manifest.get("built_at") else 0.0
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.error(f"📦 Invalid asset manifest {self.path} ({e!r}), serving assets from /static")
+            return
+        self.files, self.by_path, self.built_at = files, by_path, built_at
+        logger.info(f"📦 Loaded asset manifest with {len(self.files)} files")
+
+    def url(self, name: str) -> str:
+        entry = self.files.get(name)
+        if entry is None:
+            return f"/static/{quote(name)}"
+        return ASSET_URL_PREFIX + quote(entry["path"])
+
+    def stats(self) -> dict:
+        return {"files": len(self.files)}
+
+
+class AssetFiles(StaticFiles):
+    """
+    带哈希的静态资源：
+    - 按 Accept 返回 AVIF / WebP 版本，按 Accept-Encoding 返回 br / gzip 预压缩版本
+    - Cache-Control: immutable；条件请求（304）与 Range 请求由 StaticFiles / FileResponse 处理
+    """
+
+    def __init__(self, manifest: AssetManifest, **kwargs):
+        super().__init__(**kwargs)
+        self.manifest = manifest
+        self._root = Path(self.directory).resolve()
+
+    def _variant(self, entry: dict, full_path, headers: Headers) -> tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        :return: (变体文件路径, Content-Encoding, 媒体类型)；没有合适的变体时均为 None
+        """
+        accept = headers.get("accept", "")
+        for name, suffix, mime in IMAGE_FORMATS:
+            if name in entry.get("formats", ()) and _accepts(accept, mime):
+                return f"{full_path}{suffix}", None, mime
+        accept_encoding = headers.get("accept-encoding", "")
+        for name, suffix, token in ENCODINGS:
+            if name in entry.get("encodings", ()) and _accepts(accept_encoding, token):
+                return f"{full_path}{suffix}", name, None
+        return None, None, None
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        # 目录本身或其中的文件可能是符号链接，解析后再与（已解析的）根目录比较
+        try:
+            relative = Path(full_path).resolve().relative_to(self._root).as_posix()
+        except ValueError:
+            relative = None
+        entry = self.manifest.by_path.get(relative) if relative is not None else None
+
+        response = None
+        if entry is not None:
+            variant, encoding, media_type = self._variant(entry, full_path, request_headers)
+            if variant is not None:
+                try:
+                    variant_stat = os.stat(variant)
+                except FileNotFoundError:
+                    logger.warning(f"📦 Missing asset variant {variant}, serving original")
+                else:
+                    response = FileResponse(
+                        variant,
+                        status_code=status_code,
+                        stat_result=variant_stat,
+                        # 预压缩版本保持原文件的媒体类型
+                        media_type=media_type or mimetypes.guess_type(full_path)[0] or "text/plain",
+                    )
+                    if encoding:
+                        response.headers["content-encoding"] = encoding
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+
+        if entry is not None:
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+            if entry.get("formats") or entry.get("encodings"):
+                response.headers["vary"] = "Accept" if entry.get("formats") else "Accept-Encoding"
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+# 全局资源清单实例（进程启动时加载，重新构建后需重启生效）
+asset_manifest = AssetManifest()
+asset_manifest.load()
+
+
+def asset_url(name: str) -> str:
+    """
+    模板中使用：{{ asset_url('login.css') }}
+    """
+    return asset_manifest.url(name)
@@ -0,0 +1,292 @@
+# backend/services/balancer.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Hashable, Optional, TypeVar
+
+import httpx
+
+from setting import ENV_CONFIG
+from backend.services import llm_client
+from backend.services.circuit_breaker import CircuitBreaker
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 后端节点池配置（可在 .env 中覆盖）
+# ======================
+
+# 逗号分隔的多个 Ollama 地址；未配置时退回单节点 OLLAMA_BASE_URL
+LLM_ENDPOINTS = [
+    url.strip().rstrip("/")
+    for url in ENV_CONFIG.get("OLLAMA_BASE_URLS", llm_client.OLLAMA_BASE_URL).split(",")
+    if url.strip()
+]
+LLM_HEALTH_INTERVAL = float(ENV_CONFIG.get("LLM_HEALTH_INTERVAL", "10"))     # 健康探测间隔（秒）
+LLM_HEALTH_TIMEOUT = float(ENV_CONFIG.get("LLM_HEALTH_TIMEOUT", "2"))        # 单次探测超时（秒）
+LLM_HEALTH_FAILURES = int(ENV_CONFIG.get("LLM_HEALTH_FAILURES", "2"))        # 连续失败多少次后摘除
+LLM_SESSION_AFFINITY = ENV_CONFIG.get("LLM_SESSION_AFFINITY", "true").lower() == "true"
+LLM_AFFINITY_MAX_SKEW = int(ENV_CONFIG.get("LLM_AFFINITY_MAX_SKEW", "2"))    # 粘滞节点比最空闲节点多出的在途数上限
+LLM_AFFINITY_SIZE = int(ENV_CONFIG.get("LLM_AFFINITY_SIZE", "10000"))        # 会话亲和表容量
+
+
+class NoBackendAvailable(Exception):
+    """
+    没有可用（健康且未熔断）的模型节点；retry_after 为建议的重试等待秒数
+    """
+
+    def __init__(self, message: str, retry_after: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BackendError(Exception):
+    """
+    模型节点返回了服务端错误（5xx），计入熔断统计
+    """
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"[{status_code}] {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+class Endpoint:
+    """
+    单个模型节点的运行状态
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.served = 0
+        self.breaker = CircuitBreaker(url)
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and self.breaker.available()
+
+    def to_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+            "served": self.served,
+            "circuit": self.breaker.to_dict(),
+        }
+
+
+class EndpointPool:
+    """
+    最少在途请求（least-outstanding）负载均衡：
+    - 后台定时探测 /api/tags，连续失败的节点被摘除，恢复后自动加回
+    - 可选会话亲和：同一 (user_id, character_id) 尽量落在同一节点，复用已加载的模型与 prompt 缓存
+    - 每个节点带熔断器：失败率或慢调用比例过高时暂停向其派发，全部熔断时立即失败
+    """
+
+    def __init__(
+        self,
+        urls: list[str] = LLM_ENDPOINTS,
+        probe_interval: float = LLM_HEALTH_INTERVAL,
+        fail_threshold: int = LLM_HEALTH_FAILURES,
+        affinity: bool = LLM_SESSION_AFFINITY,
+    ):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.probe_interval = probe_interval
+        self.fail_threshold = fail_threshold
+        self.affinity = affinity
+        self._sticky: "OrderedDict[Hashable, Endpoint]" = OrderedDict()
+        self._probe_task: Optional[asyncio.Task] = None
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    # ---------- 选择节点 ----------
+
+    def pick(self, affinity_key: Optional[Hashable] = None, exclude: tuple[Endpoint, ...] = ()) -> Endpoint:
+        healthy = [ep for ep in self.endpoints if ep.available and ep not in exclude]
+        if not healthy:
+            tripped = [ep.breaker for ep in self.endpoints if ep.healthy and not ep.breaker.available()]
+            if tripped:
+                raise NoBackendAvailable(
+                    "大模型服务繁忙（熔断中）",
+                    retry_after=min(b.retry_after() for b in tripped)
+                )
+            raise NoBackendAvailable("没有可用的大模型节点")
+
+        least = min(healthy, key=lambda ep: ep.outstanding)
+        if not self.affinity or affinity_key is None:
+            return least
+
+        sticky = self._sticky.get(affinity_key)
+        if sticky is not None and sticky.available and sticky not in exclude \
+                and sticky.outstanding <= least.outstanding + LLM_AFFINITY_MAX_SKEW:
+            self._sticky.move_to_end(affinity_key)
+            return sticky
+
+        self._sticky[affinity_key] = least
+        self._sticky.move_to_end(affinity_key)
+        while len(self._sticky) > LLM_AFFINITY_SIZE:
+            self._sticky.popitem(last=False)
+        return least
+
+    def ensure_available(self):
+        """
+        全部节点不可用或已熔断时立即抛出 NoBackendAvailable，避免请求先排队再失败
+        """
+        self.pick()
+
+    @asynccontextmanager
+    async def lease(
+        self,
+        affinity_key: Optional[Hashable] = None,
+        exclude: tuple[Endpoint, ...] = (),
+        measure_latency: bool = True,
+    ):
+        """
+        选出节点并在使用期间计入在途数：
+            async with pool.lease((user_id, character_id)) as ep:
+                await client.post(f"{ep.url}/v1/chat/completions", ...)
+        连接类错误会立即计入失败次数（被动健康检查）；
+        连接错误、超时与 BackendError 计为熔断失败，measure_latency=False 时不统计慢调用（流式输出）；
+        调用方自己的截止时间应套在 lease 外层，到期时以取消的形式穿过这里，只归还名额、不计为节点失败
+        """
+        ep = self.pick(affinity_key, exclude)
+        ep.outstanding += 1
+        ep.breaker.acquire()
+        started = time.monotonic()
+        try:
+            yield ep
+        except httpx.TransportError:
+            self._mark_failure(ep)
+            ep.breaker.record(False)
+            raise
+        except (BackendError, TimeoutError):
+            ep.breaker.record(False)
+            raise
+        except BaseException:
+            # 取消或调用方自身的错误，不代表节点状态
+            ep.breaker.release()
+            raise
+        else:
+            ep.served += 1
+            ep.breaker.record(True, time.monotonic() - started if measure_latency else None)
+        finally:
+            ep.outstanding -= 1
+
+    async def hedged(
+        self,
+        affinity_key: Optional[Hashable],
+        call: Callable[[Endpoint], Awaitable[T]],
+        hedge_after: float = 0,
+    ) -> T:
+        """
+        在选中的节点上执行 call(ep)；若 hedge_after 秒内未完成且还有其他可用节点，
+        则向另一节点补发同一请求，取先成功的结果并取消另一个
+        """
+        primary: list[Endpoint] = []
+
+        async def attempt(exclude: tuple[Endpoint, ...]) -> T:
+            async with self.lease(affinity_key if not exclude else None, exclude) as ep:
+                if not exclude:
+                    primary.append(ep)
+                return await call(ep)
+
+        first = asyncio.create_task(attempt(()))
+        if hedge_after <= 0 or len(self.endpoints) < 2:
+            return await first
+
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done and primary:
+                try:
+                    self.pick(exclude=tuple(primary))
+                except NoBackendAvailable:
+                    pass
+                else:
+                    self.hedges += 1
+                    logger.info(f"🪃 Hedging slow request on {primary[0].url} to another endpoint")
+                    tasks.add(asyncio.create_task(attempt(tuple(primary))))
+
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    # 优先报告主请求的错误
+                    if error is None or task is first:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    # ---------- 健康检查 ----------
+
+    def start(self):
+        """
+        启动后台健康探测（在应用 lifespan 启动时调用）
+        """
+        if self._probe_task is None and len(self.endpoints) > 0:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+            logger.info(f"🩺 LLM endpoint pool started: {[ep.url for ep in self.endpoints]}")
+
+    async def stop(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    async def probe_all(self):
+        await asyncio.gather(*(self._probe(ep) for ep in self.endpoints))
+
+    async def _probe_loop(self):
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self.probe_interval)
+
+    async def _probe(self, ep: Endpoint):
+        try:
+            resp = await llm_client.get_client().get(f"{ep.url}/api/tags", timeout=LLM_HEALTH_TIMEOUT)
+            ok = resp.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+
+        if ok:
+            if not ep.healthy:
+                logger.info(f"🟢 LLM endpoint {ep.url} is back online")
+            ep.healthy = True
+            ep.failures = 0
+        else:
+            self._mark_failure(ep)
+
+    def _mark_failure(self, ep: Endpoint):
+        ep.failures += 1
+        if ep.healthy and ep.failures >= self.fail_threshold:
+            ep.healthy = False
+            logger.error(f"🔴 LLM endpoint {ep.url} ejected after {ep.failures} failures")
+
+    def stats(self) -> dict:
+        return {
+            "endpoints": [ep.to_dict() for ep in self.endpoints],
+            "sticky_sessions": len(self._sticky),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+# 全局节点池实例
+pool = EndpointPool()
@@ -0,0 +1,177 @@
+# backend/services/broadcast.py
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from fastapi import WebSocket
+
+from setting import ENV_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 聊天室广播配置（可在 .env 中覆盖）
+# ======================
+
+WS_SEND_QUEUE_SIZE = int(ENV_CONFIG.get("WS_SEND_QUEUE_SIZE", "256"))           # 每个连接待发送消息的上限
+WS_SEND_TIMEOUT = float(ENV_CONFIG.get("WS_SEND_TIMEOUT", "10"))                 # 单条消息发送超时（秒），超时即断开
+WS_SLOW_CONSUMER_POLICY = ENV_CONFIG.get("WS_SLOW_CONSUMER_POLICY", "drop_oldest")  # 队列满时：drop_oldest / disconnect
+WS_CLOSE_TIMEOUT = 5                                                             # 主动断开时发送关闭帧的超时
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "disconnect")
+
+# 1013 Try Again Later：客户端接收过慢被服务端断开
+CLOSE_SLOW_CONSUMER = 1013
+
+
+class Connection:
+    """
+    单个 WebSocket 连接：有界发送队列 + 独立的写任务
+    """
+
+    __slots__ = ("websocket", "queue", "writer", "dropped")
+
+    def __init__(self, websocket: WebSocket, queue_size: int):
+        self.websocket = websocket
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+
+class RoomBroadcaster:
+    """
+    聊天室广播：
+    - broadcast() 只把序列化好的文本放入各连接的队列，不等待任何客户端，发送方可以立即继续读取
+    - 每条消息只序列化一次，所有接收者共享同一个字符串
+    - 每个连接由自己的写任务发送，慢客户端不会拖慢其他人
+    - 队列满时按策略丢弃最旧的消息，或断开该连接；发送超时的连接同样断开
+    """
+
+    def __init__(
+        self,
+        queue_size: int = WS_SEND_QUEUE_SIZE,
+        send_timeout: float = WS_SEND_TIMEOUT,
+        policy: str = WS_SLOW_CONSUMER_POLICY,
+    ):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"未知的慢客户端策略 WS_SLOW_CONSUMER_POLICY={policy}，可选：{', '.join(SLOW_CONSUMER_POLICIES)}")
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.policy = policy
+        self._connections: dict[WebSocket, Connection] = {}
+        # 正在关闭的连接任务（保留引用，防止被回收）
+        self._closing: set[asyncio.Task] = set()
+        self.broadcasts = 0
+        self.sent = 0
+        self.dropped = 0
+        self.slow_disconnects = 0
+
+    def connect(self, websocket: WebSocket) -> Connection:
+        """
+        登记已 accept 的连接并启动其写任务
+        """
+        conn = Connection(websocket, self.queue_size)
+        conn.writer = asyncio.create_task(self._write(conn))
+        self._connections[websocket] = conn
+        return conn
+
+    async def disconnect(self, websocket: WebSocket):
+        """
+        连接结束时调用：移除连接并停止写任务，未发送的消息直接丢弃
+        """
+        conn = self._connections.pop(websocket, None)
+        if conn is None or conn.writer is None or conn.writer is asyncio.current_task():
+            return
+        conn.writer.cancel()
+        try:
+            await conn.writer
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    def broadcast(self, message: dict) -> int:
+        """
+        广播给所有连接（非阻塞）
+        :return: 成功入队的连接数
+        """
+        # 与 WebSocket.send_json 相同的序列化方式
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        self.broadcasts += 1
+        queued = 0
+        slow = []
+        for conn in self._connections.values():
+            try:
+                conn.queue.put_nowait(text)
+                queued += 1
+                continue
+            except asyncio.QueueFull:
+                pass
+            if self.policy == "drop_oldest":
+                conn.queue.get_nowait()
+                conn.queue.put_nowait(text)
+                conn.dropped += 1
+                self.dropped += 1
+                queued += 1
+            else:
+                slow.append(conn)
+        for conn in slow:
+            self.slow_disconnects += 1
+            logger.warning(f"🐢 Disconnecting slow WebSocket client ({conn.queue.qsize()} messages pending)")
+            self._evict(conn)
+        return queued
+
+    async def _write(self, conn: Connection):
+        try:
+            while True:
+                text = await conn.queue.get()
+                # 用 asyncio.timeout 而不是 wait_for：Python 3.11 的 wait_for 在发送恰好完成时会吞掉取消，
+                # 写任务随后卡在 queue.get() 上，disconnect() 永远等不到它结束
+                async with asyncio.timeout(self.send_timeout):
+                    await conn.websocket.send_text(text)
+                self.sent += 1
+        except TimeoutError:
+            self.slow_disconnects += 1
+            logger.warning(f"🐢 WebSocket send timed out after {self.send_timeout}s, disconnecting")
+            self._evict(conn)
+        except Exception as e:
+            # 客户端已断开：由接收循环结束时清理，这里只停止向其发送
+            logger.info(f"WebSocket writer stopped: {e!r}")
+            self._connections.pop(conn.websocket, None)
+
+    def _evict(self, conn: Connection):
+        """
+        移除连接并在后台关闭，接收循环随后会收到断开事件并自行清理
+        """
+        self._connections.pop(conn.websocket, None)
+        if conn.writer is not None and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        task = asyncio.create_task(self._close(conn))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, conn: Connection):
+        try:
+            await asyncio.wait_for(
+                conn.websocket.close(code=CLOSE_SLOW_CONSUMER, reason="Client too slow"),
+                WS_CLOSE_TIMEOUT
+            )
+        except Exception:
+            pass
+
+    def __len__(self):
+        return len(self._connections)
+
+    def stats(self) -> dict:
+        return {
+            "connections": len(self._connections),
+            "policy": self.policy,
+            "queue_size": self.queue_size,
+            "broadcasts": self.broadcasts,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+
+# 全局聊天室广播实例
+room_broadcaster = RoomBroadcaster()
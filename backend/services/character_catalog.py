@@ -0,0 +1,113 @@
+# backend/services/character_catalog.py
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
+
+from setting import ENV_CONFIG
+from backend.crud import character
+
+logger = logging.getLogger(__name__)
+
+# 角色表几乎不变，默认每 5 分钟刷新一次；修改角色后也可调用 invalidate() 立即生效
+CHARACTER_CACHE_TTL = float(ENV_CONFIG.get("CHARACTER_CACHE_TTL", "300"))
+
+
+def build_system_prompt(char: dict) -> str:
+    """
+    根据角色设定生成系统提示词
+    """
+    return f"""
+    你正在扮演 {char['name']}。
+    人物设定：{char['trait']}
+    请始终以这个角色的身份、语气和思维方式回答问题。
+    不要暴露你是 AI 的事实。
+    """.strip()
+
+
+class CharacterCatalog:
+    """
+    角色目录的进程内缓存：
+    - 启动时加载，TTL 到期或 invalidate() 后在下次访问时重新加载
+    - 每个角色预先生成系统提示词；整个列表预先序列化为 /ai 页面所需的 JSON
+    - 重新加载失败时继续使用旧数据
+    """
+
+    def __init__(self, ttl: float = CHARACTER_CACHE_TTL):
+        self.ttl = ttl
+        self._by_id: dict[int, dict] = {}
+        self._characters: list[dict] = []
+        self._characters_json = "[]"
+        self._expires_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self.version = 0
+
+    async def load(self):
+        """
+        从数据库加载全部角色并重建缓存
+        """
+        chars = await character.get_all_characters()
+        by_id = {}
+        for c in chars:
+            by_id[c["id"]] = {**c, "system_prompt": build_system_prompt(c)}
+        self._by_id = by_id
+        self._characters = chars
+        self._characters_json = json.dumps([
+            {"id": c["id"], "name": c["name"], "trait": c["trait"]}
+            for c in chars
+        ], ensure_ascii=False)
+        self._expires_at = time.monotonic() + self.ttl
+        self.version += 1
+        logger.info(f"🎭 Character catalog loaded: {len(chars)} characters (v{self.version})")
+
+    def invalidate(self):
+        """
+        标记缓存过期，下次访问时重新加载
+        """
+        self._expires_at = 0.0
+
+    async def get(self, character_id: int) -> Optional[dict]:
+        """
+        按 ID 获取角色（含预生成的 system_prompt）；缓存中没有时回源查询，兼容新增角色
+        """
+        await self._ensure_fresh()
+        char = self._by_id.get(character_id)
+        if char is not None:
+            return char
+
+        char = await character.get_character_by_id(character_id)
+        if char is None:
+            return None
+        # 出现了缓存中没有的新角色，下次访问时整体刷新
+        self.invalidate()
+        return {**char, "system_prompt": build_system_prompt(char)}
+
+    async def all(self) -> tuple[list[dict], str]:
+        """
+        :return: (角色列表, 预序列化的 JSON 字符串)
+        """
+        await self._ensure_fresh()
+        return self._characters, self._characters_json
+
+    async def _ensure_fresh(self):
+        if time.monotonic() < self._expires_at:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            # 等锁期间可能已被其他请求刷新
+            if time.monotonic() < self._expires_at:
+                return
+            try:
+                await self.load()
+            except Exception as e:
+                if not self.version:
+                    raise
+                # 数据库暂时不可用：沿用旧数据，稍后再试
+                self._expires_at = time.monotonic() + min(self.ttl, 30)
+                logger.error(f"🎭 Character catalog refresh failed, serving stale data: {e}")
+
+
+# 全局角色目录实例
+character_catalog = CharacterCatalog()
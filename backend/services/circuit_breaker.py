@@ -0,0 +1,143 @@
+# backend/services/circuit_breaker.py
+import logging
+import time
+from collections import deque
+
+from setting import ENV_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 熔断配置（可在 .env 中覆盖）
+# ======================
+
+BREAKER_WINDOW = int(ENV_CONFIG.get("BREAKER_WINDOW", "20"))                      # 统计最近多少次调用
+BREAKER_MIN_CALLS = int(ENV_CONFIG.get("BREAKER_MIN_CALLS", "5"))                 # 样本不足时不判定
+BREAKER_ERROR_RATE = float(ENV_CONFIG.get("BREAKER_ERROR_RATE", "0.5"))           # 失败率阈值
+BREAKER_SLOW_CALL = float(ENV_CONFIG.get("BREAKER_SLOW_CALL", "60"))              # 超过该秒数视为慢调用
+BREAKER_SLOW_RATE = float(ENV_CONFIG.get("BREAKER_SLOW_RATE", "0.8"))             # 慢调用比例阈值
+BREAKER_OPEN_SECONDS = float(ENV_CONFIG.get("BREAKER_OPEN_SECONDS", "30"))        # 熔断后多久进入半开
+BREAKER_HALF_OPEN_CALLS = int(ENV_CONFIG.get("BREAKER_HALF_OPEN_CALLS", "1"))     # 半开状态允许的试探请求数
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    基于滑动窗口的熔断器：
+    - closed：正常放行，统计最近 window 次调用的失败率与慢调用比例，超过阈值即熔断
+    - open：直接拒绝，open_seconds 后转为半开
+    - half_open：只放行少量试探请求，成功则恢复，失败或过慢则重新熔断
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = BREAKER_WINDOW,
+        min_calls: int = BREAKER_MIN_CALLS,
+        error_rate: float = BREAKER_ERROR_RATE,
+        slow_call: float = BREAKER_SLOW_CALL,
+        slow_rate: float = BREAKER_SLOW_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        half_open_calls: int = BREAKER_HALF_OPEN_CALLS,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call = slow_call
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_calls = half_open_calls
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        # (是否失败, 是否慢调用)
+        self._calls: deque[tuple[bool, bool]] = deque(maxlen=window)
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+            logger.info(f"🟡 Circuit {self.name} half-open, allowing probe requests")
+        return self._state
+
+    def available(self) -> bool:
+        """
+        当前是否可以放行一个请求（不占用试探名额）
+        """
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN:
+            return self._probes < self.half_open_calls
+        return False
+
+    def acquire(self):
+        """
+        请求确定发往该节点时调用；半开状态下占用一个试探名额
+        """
+        if self.state == HALF_OPEN:
+            self._probes += 1
+
+    def release(self):
+        """
+        请求被取消、没有得出结论时调用，归还试探名额
+        """
+        if self._state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def record(self, ok: bool, latency: float | None = None):
+        """
+        记录一次调用结果；latency 为 None 表示不参与慢调用统计（如流式输出的总时长）
+        """
+        slow = latency is not None and latency >= self.slow_call
+        if self._state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+            if ok and not slow:
+                self._state = CLOSED
+                self._calls.clear()
+                logger.info(f"🟢 Circuit {self.name} closed after successful probe")
+            else:
+                self._trip("probe failed")
+            return
+        if self._state == OPEN:
+            return
+
+        self._calls.append((not ok, slow))
+        if len(self._calls) < self.min_calls:
+            return
+        failures = sum(1 for failed, _ in self._calls if failed)
+        slows = sum(1 for _, s in self._calls if s)
+        if failures / len(self._calls) >= self.error_rate:
+            self._trip(f"error rate {failures}/{len(self._calls)}")
+        elif slows / len(self._calls) >= self.slow_rate:
+            self._trip(f"slow calls {slows}/{len(self._calls)}")
+
+    def retry_after(self) -> int:
+        """
+        距离进入半开状态的剩余秒数
+        """
+        if self._state != OPEN:
+            return 1
+        return max(1, int(self.open_seconds - (time.monotonic() - self._opened_at)) + 1)
+
+    def _trip(self, reason: str):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._probes = 0
+        self._calls.clear()
+        self.opened += 1
+        logger.error(f"🔴 Circuit {self.name} opened ({reason}), failing fast for {self.open_seconds:.0f}s")
+
+    def to_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "recent_calls": len(self._calls),
+            "recent_failures": sum(1 for failed, _ in self._calls if failed),
+            "times_opened": self.opened,
+        }
@@ -0,0 +1,220 @@
+# backend/services/context.py
+import asyncio
+import logging
+import re
+
+import httpx
+
+from setting import ENV_CONFIG
+from backend.crud import conversation
+from backend.services import llm_client
+from backend.services.balancer import pool, NoBackendAvailable, BackendError
+from backend.services.scheduler import scheduler, SchedulerRejected
+from backend.services.memory import memory_store, format_snippet, MEMORY_TOP_K
+from backend.services.write_behind import conversation_writer
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 上下文拼装配置（可在 .env 中覆盖）
+# ======================
+
+CONTEXT_TOKEN_BUDGET = int(ENV_CONFIG.get("CONTEXT_TOKEN_BUDGET", "1500"))    # 整个 prompt（不含回复）的 token 预算
+CONTEXT_MAX_TURNS = int(ENV_CONFIG.get("CONTEXT_MAX_TURNS", "20"))            # 单次最多读取的未摘要轮数
+CONTEXT_RECENT_TURNS = int(ENV_CONFIG.get("CONTEXT_RECENT_TURNS", "6"))       # 折叠摘要时保留原文的最近轮数
+SUMMARY_TRIGGER_TURNS = int(ENV_CONFIG.get("SUMMARY_TRIGGER_TURNS", "12"))    # 未摘要轮数达到该值时触发折叠
+SUMMARY_BATCH_TURNS = int(ENV_CONFIG.get("SUMMARY_BATCH_TURNS", "20"))        # 单次最多折叠的轮数
+SUMMARY_MAX_TOKENS = int(ENV_CONFIG.get("SUMMARY_MAX_TOKENS", "300"))         # 摘要长度上限
+MEMORY_MAX_TOKENS = int(ENV_CONFIG.get("MEMORY_MAX_TOKENS", "300"))           # 召回的长期记忆片段总长度上限
+
+# 中日韩字符大致一个字一个 token，其余按 4 个字符一个 token 估算
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+# 每轮对话的角色标记等固定开销
+_TURN_OVERHEAD = 8
+
+# 正在后台摘要的 (user_id, character_id)，避免重复触发
+_pending: set[tuple[int, int]] = set()
+_tasks: set[asyncio.Task] = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的 token 数（无需加载分词器）
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    从尾部截断文本，使其估算 token 数不超过上限
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def _overlap(turns: list[dict], pending: list[dict]) -> int:
+    """
+    正在落库的批次可能刚好提交并已被数据库查询读到：
+    :return: pending 开头与 turns 末尾重复的轮次数
+    """
+    def key(t):
+        return t["user_message"], t["ai_message"]
+
+    for k in range(min(len(turns), len(pending)), 0, -1):
+        if [key(t) for t in turns[-k:]] == [key(t) for t in pending[:k]]:
+            return k
+    return 0
+
+
+async def build_messages(user_id: int, character_id: int, system_prompt: str, user_message: str) -> tuple[list[dict], bool]:
+    """
+    在 token 预算内拼装对话上下文：
+    系统设定 + 滚动摘要 + 召回的长期记忆 + 尽可能多的最近原文轮次 + 本轮用户消息。
+    超出预算或积累过多的旧轮次会在后台折叠进摘要，因此 prompt 长度始终有上限。
+    :return: (messages, 是否包含历史)
+    """
+    # 长期记忆的查询向量化与数据库读取并行进行
+    recall_task = asyncio.create_task(
+        memory_store.recall(user_id, character_id, user_message, k=MEMORY_TOP_K + CONTEXT_MAX_TURNS)
+    )
+    try:
+        summary = await conversation.get_summary(user_id, character_id)
+        last_id = summary["last_conversation_id"] if summary else 0
+        turns = await conversation.get_recent_conversations(
+            user_id, character_id, after_id=last_id, limit=CONTEXT_MAX_TURNS
+        )
+    except Exception as e:
+        # 历史读取失败不影响本轮对话，退化为无上下文
+        logger.error(f"📚 Failed to load context for user {user_id}, character {character_id}: {e}")
+        summary, turns = None, []
+    # 合并尚在 write-behind 缓冲区、未落库的最近轮次
+    pending = conversation_writer.pending(user_id, character_id)
+    turns = (turns + pending[_overlap(turns, pending):])[-CONTEXT_MAX_TURNS:]
+    recalled = await recall_task
+
+    system = system_prompt
+    if summary and summary["summary"]:
+        system += f"\n以下是你们此前对话的摘要：\n{truncate_to_tokens(summary['summary'], SUMMARY_MAX_TOKENS)}"
+
+    # 已作为原文出现在上下文中的轮次无需再作为记忆召回
+    in_window = {format_snippet(t["user_message"], t["ai_message"]) for t in turns}
+    memories, memory_budget = [], MEMORY_MAX_TOKENS
+    for snippet in recalled:
+        if len(memories) >= MEMORY_TOP_K:
+            break
+        cost = estimate_tokens(snippet)
+        if snippet in in_window or cost > memory_budget:
+            continue
+        memory_budget -= cost
+        memories.append(snippet)
+    if memories:
+        system += "\n你还记得这些相关的往事：\n" + "\n---\n".join(memories)
+
+    budget = CONTEXT_TOKEN_BUDGET - estimate_tokens(system) - estimate_tokens(user_message)
+    chosen = []
+    for turn in reversed(turns):
+        cost = estimate_tokens(turn["user_message"]) + estimate_tokens(turn["ai_message"]) + _TURN_OVERHEAD
+        if cost > budget:
+            break
+        budget -= cost
+        chosen.append(turn)
+    chosen.reverse()
+
+    if len(chosen) < len(turns) or len(turns) >= SUMMARY_TRIGGER_TURNS:
+        schedule_summary(user_id, character_id)
+
+    messages = [{"role": "system", "content": system}]
+    for turn in chosen:
+        messages.append({"role": "user", "content": turn["user_message"] or ""})
+        messages.append({"role": "assistant", "content": turn["ai_message"] or ""})
+    messages.append({"role": "user", "content": user_message})
+
+    has_history = bool(chosen) or bool(memories) or bool(summary and summary["summary"])
+    return messages, has_history
+
+
+def schedule_summary(user_id: int, character_id: int):
+    """
+    在后台把较早的对话折叠进摘要（同一会话同时只跑一个任务）
+    """
+    key = (user_id, character_id)
+    if key in _pending:
+        return
+    _pending.add(key)
+    task = asyncio.create_task(_summarize(user_id, character_id))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _summarize(user_id: int, character_id: int):
+    try:
+        summary = await conversation.get_summary(user_id, character_id)
+        old_summary = summary["summary"] if summary else ""
+        last_id = summary["last_conversation_id"] if summary else 0
+
+        rows = await conversation.get_oldest_conversations(
+            user_id, character_id, after_id=last_id, limit=SUMMARY_BATCH_TURNS + CONTEXT_RECENT_TURNS
+        )
+        # 最近的若干轮保留原文，只折叠更早的部分
+        fold = rows[:max(0, len(rows) - CONTEXT_RECENT_TURNS)]
+        if not fold:
+            return
+
+        dialogue = "\n".join(
+            f"用户：{r['user_message'] or ''}\n角色：{r['ai_message'] or ''}" for r in fold
+        )
+        prompt = (
+            f"已有摘要：\n{old_summary or '（无）'}\n\n"
+            f"新增对话：\n{dialogue}\n\n"
+            f"请将新增对话中的关键信息（人物、事实、约定、情绪变化）合并进已有摘要，"
+            f"输出更新后的完整摘要，不超过 {SUMMARY_MAX_TOKENS} 字，只输出摘要本身。"
+        )
+        payload = {
+            "model": llm_client.MODEL_NAME,
+            "messages": [
+                {"role": "system", "content": "你是一个对话摘要助手，负责为角色扮演对话维护简洁的长期记忆。"},
+                {"role": "user", "content": prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": SUMMARY_MAX_TOKENS * 2,
+            "stream": False
+        }
+
+        client = llm_client.get_client()
+        async with scheduler.slot(("summary", user_id)), pool.lease((user_id, character_id)) as endpoint:
+            async with asyncio.timeout(llm_client.LLM_CHAT_DEADLINE):
+                resp = await client.post(f"{endpoint.url}/v1/chat/completions", json=payload)
+            if resp.status_code >= 500:
+                raise BackendError(resp.status_code, resp.text)
+        if resp.status_code != 200:
+            logger.error(f"📚 Summary request failed [{resp.status_code}]: {resp.text}")
+            return
+
+        choices = resp.json().get("choices") or []
+        new_summary = (choices[0].get("message", {}).get("content", "") if choices else "").strip()
+        if not new_summary:
+            return
+
+        new_summary = truncate_to_tokens(new_summary, SUMMARY_MAX_TOKENS)
+        await conversation.save_summary(user_id, character_id, new_summary, fold[-1]["id"])
+        logger.info(f"📚 Folded {len(fold)} turns into summary for user {user_id}, character {character_id}")
+
+    except (SchedulerRejected, NoBackendAvailable, BackendError, TimeoutError, httpx.HTTPError) as e:
+        # 模型繁忙或不可用：下次对话时会再次触发
+        logger.warning(f"📚 Summary skipped for user {user_id}, character {character_id}: {e}")
+    except Exception as e:
+        logger.error(f"📚 Summary failed for user {user_id}, character {character_id}: {e}", exc_info=True)
+    finally:
+        _pending.discard((user_id, character_id))
@@ -0,0 +1,101 @@
+# backend/services/llm_client.py
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+from setting import ENV_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# Ollama 连接配置（可在 .env 中覆盖）
+# ======================
+
+OLLAMA_BASE_URL = ENV_CONFIG.get("OLLAMA_BASE_URL", "http://localhost:11434")
+MODEL_NAME = ENV_CONFIG.get("LLM_MODEL", "qwen3:8b")
+
+# 连接池上限与 keep-alive
+LLM_MAX_CONNECTIONS = int(ENV_CONFIG.get("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(ENV_CONFIG.get("LLM_MAX_KEEPALIVE", "10"))
+LLM_KEEPALIVE_EXPIRY = float(ENV_CONFIG.get("LLM_KEEPALIVE_EXPIRY", "30"))
+
+# 拆分的超时：建连要快速失败，读取则需容纳整段生成
+LLM_CONNECT_TIMEOUT = float(ENV_CONFIG.get("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(ENV_CONFIG.get("LLM_READ_TIMEOUT", "180"))
+LLM_WRITE_TIMEOUT = float(ENV_CONFIG.get("LLM_WRITE_TIMEOUT", "10"))
+LLM_POOL_TIMEOUT = float(ENV_CONFIG.get("LLM_POOL_TIMEOUT", "10"))
+
+# 单次请求的截止时间：非流式为整段生成，流式为首个响应；请求体可传 deadline 缩短，但不超过上限
+LLM_CHAT_DEADLINE = float(ENV_CONFIG.get("LLM_CHAT_DEADLINE", "90"))
+LLM_FIRST_TOKEN_DEADLINE = float(ENV_CONFIG.get("LLM_FIRST_TOKEN_DEADLINE", "30"))
+LLM_MAX_DEADLINE = float(ENV_CONFIG.get("LLM_MAX_DEADLINE", "180"))
+
+# 对冲请求：非流式请求超过该秒数仍未完成时向另一节点补发（0 表示关闭，需要多节点）
+LLM_HEDGE_AFTER = float(ENV_CONFIG.get("LLM_HEDGE_AFTER", "0"))
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def init_client() -> httpx.AsyncClient:
+    """
+    创建全局共享的连接池客户端（在应用 lifespan 启动时调用）
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+                keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                connect=LLM_CONNECT_TIMEOUT,
+                read=LLM_READ_TIMEOUT,
+                write=LLM_WRITE_TIMEOUT,
+                pool=LLM_POOL_TIMEOUT,
+            ),
+            headers={"Content-Type": "application/json"},
+        )
+        logger.info(
+            f"🔌 LLM client pool ready (max={LLM_MAX_CONNECTIONS}, keepalive={LLM_MAX_KEEPALIVE})"
+        )
+    return _client
+
+
+def resolve_deadline(requested: Optional[float], default: float) -> float:
+    """
+    请求自带的截止时间（秒）只能在 (0, LLM_MAX_DEADLINE] 范围内生效
+    """
+    if requested is None or requested <= 0:
+        return min(default, LLM_MAX_DEADLINE)
+    return min(requested, LLM_MAX_DEADLINE)
+
+
+def deadline_at(seconds: float) -> float:
+    """
+    把截止秒数换算为事件循环时钟上的绝对时刻，配合 asyncio.timeout_at 使用；
+    在请求到达时计算一次，排队等待、对冲补发与各次尝试共用同一份预算
+    """
+    return asyncio.get_running_loop().time() + seconds
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    获取共享客户端；脚本等未经过 lifespan 的场景会按需懒加载
+    """
+    if _client is None or _client.is_closed:
+        return init_client()
+    return _client
+
+
+async def close_client():
+    """
+    关闭连接池（在应用 lifespan 结束时调用）
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("🔌 LLM client pool closed")
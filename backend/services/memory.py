@@ -0,0 +1,337 @@
+# backend/services/memory.py
+import asyncio
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+import numpy as np
+
+from setting import ENV_CONFIG, BASE_DIR
+from backend.services import llm_client
+from backend.services.balancer import pool, NoBackendAvailable
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 长期记忆配置（默认关闭，需要 Ollama 中有可用的向量模型）
+# ======================
+
+MEMORY_ENABLED = ENV_CONFIG.get("MEMORY_ENABLED", "false").lower() == "true"
+MEMORY_EMBED_MODEL = ENV_CONFIG.get("MEMORY_EMBED_MODEL", "nomic-embed-text")
+MEMORY_DIR = BASE_DIR / ENV_CONFIG.get("MEMORY_DIR", "data/memory")
+MEMORY_TOP_K = int(ENV_CONFIG.get("MEMORY_TOP_K", "3"))
+MEMORY_MIN_SCORE = float(ENV_CONFIG.get("MEMORY_MIN_SCORE", "0.35"))       # 余弦相似度下限
+MEMORY_BATCH_SIZE = int(ENV_CONFIG.get("MEMORY_BATCH_SIZE", "16"))         # 单次批量向量化条数
+MEMORY_FLUSH_INTERVAL = float(ENV_CONFIG.get("MEMORY_FLUSH_INTERVAL", "2"))  # 攒批最长等待秒数
+MEMORY_QUEUE_SIZE = int(ENV_CONFIG.get("MEMORY_QUEUE_SIZE", "1000"))
+MEMORY_QUERY_TIMEOUT = float(ENV_CONFIG.get("MEMORY_QUERY_TIMEOUT", "2"))  # 对话时查询向量化的超时
+MEMORY_MAX_USERS = int(ENV_CONFIG.get("MEMORY_MAX_USERS", "256"))          # 内存中常驻的用户索引数
+
+
+def format_snippet(user_message: str, ai_message: str) -> str:
+    """
+    一轮对话对应的记忆片段文本（也是向量化的输入）
+    """
+    return f"用户：{user_message or ''}\n角色：{ai_message or ''}"
+
+
+def _file_size(path) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+def _write_at(path, offset: int, data: bytes):
+    """
+    从 offset 处写入并截断，覆盖上次中断留下的残缺数据，保证三份文件按行对齐
+    """
+    with open(path, "r+b" if path.exists() else "wb") as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate()
+
+
+class UserMemory:
+    """
+    单个用户的向量索引，三份文件按行对齐、只在末尾追加：
+    - vectors: (n, d) float16，已归一化，落盘为 .f16 原始字节并以 memmap 方式加载
+    - character_ids: (n,) int32，落盘为 .chars，用于按角色过滤
+    - texts: 与向量一一对应的片段文本，落盘为 .jsonl
+    向量维度 d 记录在 .meta.json 中
+    """
+
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.dim = 0
+        self.vectors = np.zeros((0, 0), dtype=np.float16)
+        self.character_ids = np.zeros(0, dtype=np.int32)
+        self.texts: list[str] = []
+        # 已加入但尚未落盘的行（search 只查已落盘的部分）
+        self._pending_vectors: list[np.ndarray] = []
+        self._pending_chars: list[np.ndarray] = []
+        self._saved = 0
+        # .jsonl 中已落盘行的字节数，即下一行的写入位置
+        self._text_end = 0
+        self._lock = threading.Lock()
+
+    @property
+    def _base(self):
+        return MEMORY_DIR / str(self.user_id)
+
+    def load(self):
+        meta_path = self._base.with_suffix(".meta.json")
+        if not meta_path.exists():
+            return
+        self.dim = json.loads(meta_path.read_text(encoding="utf-8"))["dim"]
+        text_path = self._base.with_suffix(".jsonl")
+        lines = text_path.read_bytes().split(b"\n")[:-1] if text_path.exists() else []
+        # 以最短的一份为准：异常中断留下的半行在下次写入时被覆盖
+        n = min(
+            _file_size(self._base.with_suffix(".f16")) // (2 * self.dim),
+            _file_size(self._base.with_suffix(".chars")) // 4,
+            len(lines),
+        )
+        self.texts = [json.loads(line) for line in lines[:n]]
+        self._text_end = sum(len(line) + 1 for line in lines[:n])
+        self._saved = n
+        self._map()
+
+    def _map(self):
+        if not self._saved:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float16)
+            self.character_ids = np.zeros(0, dtype=np.int32)
+            return
+        self.vectors = np.memmap(self._base.with_suffix(".f16"), dtype=np.float16, mode="r", shape=(self._saved, self.dim))
+        self.character_ids = np.memmap(self._base.with_suffix(".chars"), dtype=np.int32, mode="r", shape=(self._saved,))
+
+    def save(self):
+        """
+        只追加新增的行（不重写已有数据），写完后重新映射文件
+        """
+        with self._lock:
+            batches = len(self._pending_vectors)
+            if not batches:
+                return
+            vectors = np.concatenate(self._pending_vectors[:batches])
+            character_ids = np.concatenate(self._pending_chars[:batches])
+            texts = self.texts[self._saved:self._saved + len(vectors)]
+            body = "".join(json.dumps(text, ensure_ascii=False) + "\n" for text in texts).encode("utf-8")
+
+            MEMORY_DIR.mkdir(parents=True, exist_ok=True)
+            meta_path = self._base.with_suffix(".meta.json")
+            if not meta_path.exists():
+                meta_path.write_text(json.dumps({"dim": self.dim}), encoding="utf-8")
+            _write_at(self._base.with_suffix(".f16"), self._saved * 2 * self.dim, vectors.tobytes())
+            _write_at(self._base.with_suffix(".chars"), self._saved * 4, character_ids.tobytes())
+            _write_at(self._base.with_suffix(".jsonl"), self._text_end, body)
+
+            del self._pending_vectors[:batches], self._pending_chars[:batches]
+            self._saved += len(vectors)
+            self._text_end += len(body)
+            self._map()
+
+    def add(self, vectors: np.ndarray, character_ids: list[int], texts: list[str]):
+        vectors = vectors.astype(np.float16)
+        if len(self.texts) and self.dim != vectors.shape[1]:
+            logger.warning(f"🧠 Embedding dimension changed for user {self.user_id}, rebuilding index")
+            with self._lock:
+                self.texts = []
+                self._pending_vectors, self._pending_chars = [], []
+                self._saved = self._text_end = 0
+                self.dim = vectors.shape[1]
+                self._map()
+                for path in MEMORY_DIR.glob(f"{self.user_id}.*"):
+                    path.unlink()
+        if not len(self.texts):
+            self.dim = vectors.shape[1]
+            self._map()
+        self._pending_vectors.append(vectors)
+        self._pending_chars.append(np.asarray(character_ids, dtype=np.int32))
+        self.texts.extend(texts)
+
+    def search(self, query: np.ndarray, character_id: int, k: int) -> list[str]:
+        if not len(self.texts) or self.vectors.shape[1] != query.shape[0]:
+            return []
+        idx = np.flatnonzero(self.character_ids == character_id)
+        if not idx.size:
+            return []
+        scores = self.vectors[idx].astype(np.float32) @ query
+        results = []
+        for i in np.argsort(-scores):
+            if scores[i] < MEMORY_MIN_SCORE or len(results) >= k:
+                break
+            results.append(self.texts[idx[i]])
+        return results
+
+
+class MemoryStore:
+    """
+    长期记忆子系统：
+    - remember() 只把对话放入队列，后台任务攒批调用 /api/embed 并写入用户索引，不占用回复的关键路径
+    - recall() 在对话时向量化当前消息，取出同一角色下最相关的 top-k 历史片段
+    """
+
+    def __init__(self, enabled: bool = MEMORY_ENABLED):
+        self.enabled = enabled
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._users: "OrderedDict[int, UserMemory]" = OrderedDict()
+        self._loading: dict[int, asyncio.Future] = {}
+        self.embedded = 0
+        self.dropped = 0
+        self.recalls = 0
+        self.recall_failures = 0
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        if not self.enabled or self._worker is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=MEMORY_QUEUE_SIZE)
+        self._worker = asyncio.create_task(self._run())
+        logger.info(f"🧠 Memory indexer started (model={MEMORY_EMBED_MODEL})")
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        # 尽力处理队列中剩余的条目
+        while not self._queue.empty():
+            batch = [self._queue.get_nowait() for _ in range(min(MEMORY_BATCH_SIZE, self._queue.qsize()))]
+            try:
+                await asyncio.wait_for(self._index(batch), timeout=10)
+            except Exception as e:
+                logger.error(f"🧠 Dropped {len(batch)} memory items on shutdown: {e}")
+                break
+
+    # ---------- 写入 ----------
+
+    def remember(self, user_id: int, character_id: int, user_message: str, ai_message: str):
+        """
+        将一轮对话加入向量化队列（非阻塞，队列满时丢弃）
+        """
+        if not self.enabled or self._queue is None:
+            return
+        try:
+            self._queue.put_nowait((user_id, character_id, format_snippet(user_message, ai_message)))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + MEMORY_FLUSH_INTERVAL
+            while len(batch) < MEMORY_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._index(batch)
+            except (NoBackendAvailable, httpx.HTTPError, KeyError, ValueError) as e:
+                self.dropped += len(batch)
+                logger.error(f"🧠 Failed to embed {len(batch)} memory items: {e}")
+            except Exception as e:
+                self.dropped += len(batch)
+                logger.error(f"🧠 Memory indexing error: {e}", exc_info=True)
+
+    async def _index(self, batch: list[tuple[int, int, str]]):
+        vectors = await self._embed([text for _, _, text in batch])
+        # 按用户分组后一次性追加，减少数组拷贝
+        groups: dict[int, list[int]] = {}
+        for i, (user_id, _, _) in enumerate(batch):
+            groups.setdefault(user_id, []).append(i)
+        touched = []
+        for user_id, rows in groups.items():
+            mem = await self._get_user(user_id)
+            mem.add(vectors[rows], [batch[i][1] for i in rows], [batch[i][2] for i in rows])
+            touched.append(mem)
+        # 落盘放到线程中执行，避免阻塞事件循环
+        await asyncio.to_thread(lambda: [mem.save() for mem in touched])
+        self.embedded += len(batch)
+
+    # ---------- 查询 ----------
+
+    async def recall(self, user_id: int, character_id: int, query: str, k: int = MEMORY_TOP_K) -> list[str]:
+        """
+        取出与当前消息最相关的历史片段（按相似度降序）；任何失败都返回空列表，不影响对话
+        """
+        if not self.enabled:
+            return []
+        self.recalls += 1
+        try:
+            mem = await self._get_user(user_id)
+            if not mem.texts:
+                return []
+            query_vec = (await self._embed([query], timeout=MEMORY_QUERY_TIMEOUT))[0]
+            return mem.search(query_vec, character_id, k)
+        except Exception as e:
+            self.recall_failures += 1
+            logger.warning(f"🧠 Memory recall skipped for user {user_id}: {e}")
+            return []
+
+    # ---------- 内部实现 ----------
+
+    async def _get_user(self, user_id: int) -> UserMemory:
+        mem = self._users.get(user_id)
+        if mem is not None:
+            self._users.move_to_end(user_id)
+            return mem
+        # 同一用户并发加载时共享同一次加载，保证内存中只有一个实例写该用户的文件
+        loading = self._loading.get(user_id)
+        if loading is None:
+            loading = self._loading[user_id] = asyncio.ensure_future(self._load_user(user_id))
+            loading.add_done_callback(lambda _: self._loading.pop(user_id, None))
+        return await asyncio.shield(loading)
+
+    async def _load_user(self, user_id: int) -> UserMemory:
+        mem = UserMemory(user_id)
+        await asyncio.to_thread(mem.load)
+        self._users[user_id] = mem
+        while len(self._users) > MEMORY_MAX_USERS:
+            self._users.popitem(last=False)
+        return mem
+
+    async def _embed(self, texts: list[str], timeout: Optional[float] = None) -> np.ndarray:
+        client = llm_client.get_client()
+        # 只借用节点池选出可用节点，不计入在途数、健康与熔断统计：
+        # 查询向量化带短超时，超时是调用方的预算用尽，不代表节点故障，不应摘除对话节点或使其熔断
+        endpoint = pool.pick()
+        resp = await client.post(
+            f"{endpoint.url}/api/embed",
+            json={"model": MEMORY_EMBED_MODEL, "input": texts},
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+        )
+        resp.raise_for_status()
+        vectors = np.asarray(resp.json()["embeddings"], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        return vectors
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "embedded": self.embedded,
+            "dropped": self.dropped,
+            "recalls": self.recalls,
+            "recall_failures": self.recall_failures,
+            "loaded_users": len(self._users),
+        }
+
+
+# 全局记忆实例
+memory_store = MemoryStore()
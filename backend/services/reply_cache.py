@@ -0,0 +1,186 @@
+# backend/services/reply_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from setting import ENV_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 回复缓存配置（默认关闭，需在 .env 中显式开启）
+# ======================
+
+REPLY_CACHE_ENABLED = ENV_CONFIG.get("REPLY_CACHE_ENABLED", "false").lower() == "true"
+REPLY_CACHE_MAX_ENTRIES = int(ENV_CONFIG.get("REPLY_CACHE_MAX_ENTRIES", "5000"))
+REPLY_CACHE_MAX_BYTES = int(ENV_CONFIG.get("REPLY_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+REPLY_CACHE_TTL = float(ENV_CONFIG.get("REPLY_CACHE_TTL", "3600"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message: str) -> str:
+    """
+    归一化用户消息：全半角统一（NFKC）、去首尾空白、合并连续空白、英文转小写
+    """
+    text = unicodedata.normalize("NFKC", message)
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+def make_key(character_id: int, message: str, model: str, params: dict) -> str:
+    """
+    缓存键：(角色, 归一化消息, 模型, 采样参数) 的摘要
+    """
+    raw = json.dumps(
+        [character_id, normalize_message(message), model, params],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ReplyCache:
+    """
+    精确匹配的回复缓存：
+    - LRU + TTL 淘汰，并按回复字节数限制总内存
+    - single-flight：同一个键同时只有一次上游调用，其余请求等待共享结果
+    """
+
+    def __init__(
+        self,
+        enabled: bool = REPLY_CACHE_ENABLED,
+        max_entries: int = REPLY_CACHE_MAX_ENTRIES,
+        max_bytes: int = REPLY_CACHE_MAX_BYTES,
+        ttl: float = REPLY_CACHE_TTL,
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+        # key -> (过期时间, 回复, 占用字节)
+        self._entries: "OrderedDict[str, tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, reply, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return reply
+
+    def put(self, key: str, reply: str):
+        if not reply:
+            return
+        size = len(key) + len(reply.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, reply, size)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def lookup(self, key: str) -> Optional[str]:
+        """
+        仅查询（流式接口使用），同时计入命中/未命中统计
+        """
+        if not self.enabled:
+            return None
+        reply = self.get(key)
+        if reply is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return reply
+
+    def store(self, key: str, reply: str):
+        if self.enabled:
+            self.put(key, reply)
+
+    async def get_or_generate(self, key: str, producer: Callable[[], Awaitable[str]]) -> tuple[str, bool]:
+        """
+        命中缓存直接返回；否则合并并发的相同请求，只调用一次 producer
+        :return: (回复, 是否来自缓存/合并)
+        """
+        if not self.enabled:
+            return await producer(), False
+
+        while True:
+            reply = self.get(key)
+            if reply is not None:
+                self.hits += 1
+                return reply, True
+
+            leader = self._inflight.get(key)
+            if leader is None:
+                break
+            try:
+                reply = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if leader.cancelled():
+                    # 领头请求被取消（如客户端断开），由当前请求重新发起
+                    continue
+                raise
+            self.coalesced += 1
+            return reply, True
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            reply = await producer()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            # 避免无人等待时出现 "exception was never retrieved" 警告
+            fut.exception()
+            raise
+        else:
+            self.put(key, reply)
+            fut.set_result(reply)
+            return reply, False
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+
+# 全局回复缓存实例
+reply_cache = ReplyCache()
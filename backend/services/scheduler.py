@@ -0,0 +1,217 @@
+# backend/services/scheduler.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Hashable
+
+from setting import ENV_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 调度配置（可在 .env 中覆盖）
+# ======================
+
+LLM_MAX_CONCURRENCY = int(ENV_CONFIG.get("LLM_MAX_CONCURRENCY", "4"))     # 同时发往模型的请求上限
+LLM_MAX_QUEUE = int(ENV_CONFIG.get("LLM_MAX_QUEUE", "64"))                # 全局排队上限
+LLM_MAX_PER_USER = int(ENV_CONFIG.get("LLM_MAX_PER_USER", "2"))           # 单用户在途（执行中+排队）上限
+LLM_QUEUE_TIMEOUT = float(ENV_CONFIG.get("LLM_QUEUE_TIMEOUT", "60"))      # 排队最长等待秒数
+
+
+class SchedulerRejected(Exception):
+    """
+    请求未被接纳：status_code 为 429（单用户超限）或 503（队列已满/排队超时）
+    """
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class InferenceScheduler:
+    """
+    LLM 推理准入调度器：
+    - 全局并发上限，超出部分进入有界等待队列
+    - 等待队列按用户分组，轮询（round-robin）出队，避免单个用户占满队列
+    - 队列满或单用户超限时立即拒绝，并给出 Retry-After 估计
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        max_queue: int = LLM_MAX_QUEUE,
+        max_per_user: int = LLM_MAX_PER_USER,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.queue_timeout = queue_timeout
+
+        self._active = 0
+        self._waiting = 0
+        # 用户 -> 等待中的 Future 队列；OrderedDict 的顺序即轮询顺序
+        self._queues: "OrderedDict[Hashable, deque[asyncio.Future]]" = OrderedDict()
+        self._inflight: dict[Hashable, int] = {}
+
+        # 统计信息
+        self._admitted = 0
+        self._rejected_user = 0
+        self._rejected_full = 0
+        self._timeouts = 0
+        self._cancelled_queued = 0
+        self._cancelled_running = 0
+        self._wait_samples: deque[float] = deque(maxlen=1024)
+        self._max_wait = 0.0
+        self._avg_service = 0.0  # 单次占用时长的指数滑动平均，用于估算 Retry-After
+
+    # ---------- 对外接口 ----------
+
+    def check_admission(self, key: Hashable):
+        """
+        仅做准入检查（不占用名额），用于在响应开始前快速返回 429/503
+        """
+        if self._inflight.get(key, 0) >= self.max_per_user:
+            self._rejected_user += 1
+            raise SchedulerRejected(429, "请求过于频繁，请等待上一条回复完成", self._retry_after())
+        if self._active >= self.max_concurrency and self._waiting >= self.max_queue:
+            self._rejected_full += 1
+            raise SchedulerRejected(503, "服务繁忙，请稍后再试", self._retry_after())
+
+    @asynccontextmanager
+    async def slot(self, key: Hashable):
+        """
+        占用一个推理名额：
+            async with scheduler.slot(user_id):
+                ...调用模型...
+        """
+        await self._acquire(key)
+        started = time.monotonic()
+        try:
+            yield
+        except asyncio.CancelledError:
+            # 生成过程中被取消（如客户端断开），名额在 finally 中立即归还
+            self._cancelled_running += 1
+            raise
+        finally:
+            self._release(key, time.monotonic() - started)
+
+    def stats(self) -> dict:
+        """
+        当前队列深度与等待时间统计，用于容量评估
+        """
+        samples = sorted(self._wait_samples)
+
+        def pct(p: float) -> float:
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(len(samples) * p))], 3)
+
+        return {
+            "active": self._active,
+            "waiting": self._waiting,
+            "waiting_users": len(self._queues),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self._admitted,
+            "rejected_per_user": self._rejected_user,
+            "rejected_queue_full": self._rejected_full,
+            "queue_timeouts": self._timeouts,
+            "cancelled_queued": self._cancelled_queued,
+            "cancelled_running": self._cancelled_running,
+            "wait_p50_s": pct(0.50),
+            "wait_p95_s": pct(0.95),
+            "wait_max_s": round(self._max_wait, 3),
+            "avg_service_s": round(self._avg_service, 3),
+        }
+
+    # ---------- 内部实现 ----------
+
+    async def _acquire(self, key: Hashable):
+        self.check_admission(key)
+        self._inflight[key] = self._inflight.get(key, 0) + 1
+        enqueued = time.monotonic()
+
+        # 有空闲名额且无人排队：直接放行
+        if self._active < self.max_concurrency and self._waiting == 0:
+            self._active += 1
+            self._record_admit(0.0)
+            return
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(key, deque()).append(fut)
+        self._waiting += 1
+
+        try:
+            await asyncio.wait_for(fut, timeout=self.queue_timeout)
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                # 名额已分配但调用方被取消/超时，归还名额
+                self._active -= 1
+                self._dispatch()
+            else:
+                self._discard(key, fut)
+            self._dec_inflight(key)
+            if isinstance(e, asyncio.TimeoutError):
+                self._timeouts += 1
+                raise SchedulerRejected(503, "排队超时，请稍后再试", self._retry_after()) from None
+            if isinstance(e, asyncio.CancelledError):
+                self._cancelled_queued += 1
+            raise
+
+        self._record_admit(time.monotonic() - enqueued)
+
+    def _release(self, key: Hashable, held: float):
+        self._active -= 1
+        self._dec_inflight(key)
+        self._avg_service = held if not self._avg_service else 0.8 * self._avg_service + 0.2 * held
+        self._dispatch()
+
+    def _dispatch(self):
+        """
+        按用户轮询唤醒等待者，直到名额用满
+        """
+        while self._active < self.max_concurrency and self._queues:
+            key, queue = self._queues.popitem(last=False)
+            fut = queue.popleft()
+            self._waiting -= 1
+            if queue:
+                # 该用户还有请求，排到轮询队尾
+                self._queues[key] = queue
+            if fut.done():
+                continue
+            self._active += 1
+            fut.set_result(None)
+
+    def _discard(self, key: Hashable, fut: asyncio.Future):
+        queue = self._queues.get(key)
+        if queue and fut in queue:
+            queue.remove(fut)
+            self._waiting -= 1
+            if not queue:
+                del self._queues[key]
+
+    def _dec_inflight(self, key: Hashable):
+        count = self._inflight.get(key, 0) - 1
+        if count > 0:
+            self._inflight[key] = count
+        else:
+            self._inflight.pop(key, None)
+
+    def _record_admit(self, waited: float):
+        self._admitted += 1
+        self._wait_samples.append(waited)
+        self._max_wait = max(self._max_wait, waited)
+
+    def _retry_after(self) -> int:
+        # 粗略估计：前方排队数 / 并发数 × 平均占用时长
+        rounds = self._waiting / max(1, self.max_concurrency) + 1
+        return max(1, int(rounds * (self._avg_service or 5.0)))
+
+
+# 全局调度器实例
+scheduler = InferenceScheduler()
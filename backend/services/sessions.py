@@ -0,0 +1,236 @@
+# backend/services/sessions.py
+import hashlib
+import hmac
+import logging
+import secrets
+import time
+from typing import Optional
+
+from setting import ENV_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 会话配置（可在 .env 中覆盖）
+# ======================
+
+REFRESH_TOKEN_EXPIRE_DAYS = float(ENV_CONFIG.get("REFRESH_TOKEN_EXPIRE_DAYS", "7"))   # 会话空闲多久后失效（每次刷新重新计时）
+SESSION_BACKEND = ENV_CONFIG.get("SESSION_BACKEND", "memory")                        # memory / redis
+SESSION_REDIS_URL = ENV_CONFIG.get("SESSION_REDIS_URL", "redis://localhost:6379/0")
+SESSION_KEY_PREFIX = ENV_CONFIG.get("SESSION_KEY_PREFIX", "session:")
+
+
+def _digest(secret: str) -> str:
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()
+
+
+class MemorySessionBackend:
+    """
+    进程内会话存储：sid -> [user_id, 刷新令牌摘要, 过期时间]
+    单进程部署或本地调试使用，重启后所有会话失效
+    """
+
+    # 每创建这么多会话清理一次已过期的记录
+    PRUNE_EVERY = 1024
+
+    def __init__(self):
+        self._sessions: dict[str, list] = {}
+        self._created = 0
+
+    async def put(self, sid: str, user_id: int, digest: str, ttl: float):
+        self._created += 1
+        if self._created % self.PRUNE_EVERY == 0:
+            now = time.time()
+            for k in [k for k, s in self._sessions.items() if s[2] <= now]:
+                del self._sessions[k]
+        self._sessions[sid] = [user_id, digest, time.time() + ttl]
+
+    async def swap(self, sid: str, old_digest: str, new_digest: str, ttl: float) -> Optional[int]:
+        """
+        摘要匹配时换成新摘要并顺延过期时间
+        :return: 会话所属用户 ID；会话不存在、已过期或摘要不匹配时返回 None
+        """
+        session = self._sessions.get(sid)
+        if session is None:
+            return None
+        if session[2] <= time.time():
+            del self._sessions[sid]
+            return None
+        if not hmac.compare_digest(session[1], old_digest):
+            return None
+        session[1] = new_digest
+        session[2] = time.time() + ttl
+        return session[0]
+
+    async def delete(self, sid: str):
+        self._sessions.pop(sid, None)
+
+    async def delete_if(self, sid: str, digest: str) -> bool:
+        """
+        摘要匹配时删除会话
+        :return: 是否删除
+        """
+        session = self._sessions.get(sid)
+        if session is None or not hmac.compare_digest(session[1], digest):
+            return False
+        del self._sessions[sid]
+        return session[2] > time.time()
+
+    async def close(self):
+        pass
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class RedisSessionBackend:
+    """
+    Redis 会话存储：每个会话一个带 TTL 的 hash，多进程 / 多机部署共享
+    """
+
+    # 比较并替换刷新令牌摘要，保证并发刷新时只有一个请求成功
+    SWAP_SCRIPT = """
+    if redis.call('HGET', KEYS[1], 'digest') == ARGV[1] then
+        redis.call('HSET', KEYS[1], 'digest', ARGV[2])
+        redis.call('EXPIRE', KEYS[1], ARGV[3])
+        return redis.call('HGET', KEYS[1], 'user_id')
+    end
+    return false
+    """
+    # 比较摘要后删除，持有刷新令牌才能结束会话
+    DELETE_SCRIPT = """
+    if redis.call('HGET', KEYS[1], 'digest') == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str = SESSION_REDIS_URL, prefix: str = SESSION_KEY_PREFIX):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("❌ SESSION_BACKEND=redis 需要安装 redis：pip install redis")
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._swap = self._redis.register_script(self.SWAP_SCRIPT)
+        self._delete_if = self._redis.register_script(self.DELETE_SCRIPT)
+        self.prefix = prefix
+
+    async def put(self, sid: str, user_id: int, digest: str, ttl: float):
+        key = self.prefix + sid
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"user_id": user_id, "digest": digest})
+            pipe.expire(key, int(ttl))
+            await pipe.execute()
+
+    async def swap(self, sid: str, old_digest: str, new_digest: str, ttl: float) -> Optional[int]:
+        user_id = await self._swap(keys=[self.prefix + sid], args=[old_digest, new_digest, int(ttl)])
+        return int(user_id) if user_id is not None else None
+
+    async def delete(self, sid: str):
+        await self._redis.delete(self.prefix + sid)
+
+    async def delete_if(self, sid: str, digest: str) -> bool:
+        return bool(await self._delete_if(keys=[self.prefix + sid], args=[digest]))
+
+    async def close(self):
+        await self._redis.aclose()
+
+    def __len__(self):
+        # 会话总数保存在 Redis 中，这里不做统计
+        return -1
+
+
+class SessionManager:
+    """
+    登录会话：
+    - 登录时创建会话，签发刷新令牌（"sid.secret"，库中只保存 secret 的摘要）
+    - 刷新时轮换刷新令牌并顺延会话有效期（滑动过期），旧刷新令牌立即作废
+    - 登出时删除会话，之后该会话无法再换取访问令牌；
+      会话 ID 必须来自已校验的访问令牌（revoke），或用刷新令牌的 secret 证明持有会话（end）
+    请求鉴权只校验访问令牌（见 jwt_handler），不访问会话存储；
+    访问令牌有效期很短，其他进程最迟在访问令牌过期时感知登出
+    """
+
+    def __init__(self, backend=None, ttl: float = REFRESH_TOKEN_EXPIRE_DAYS * 86400):
+        self._backend = backend
+        self.ttl = ttl
+        self.created = 0
+        self.refreshed = 0
+        self.rejected = 0
+        self.revoked = 0
+
+    @property
+    def backend(self):
+        # 首次使用时按配置创建，避免导入本模块时就连接 Redis
+        if self._backend is None:
+            self._backend = RedisSessionBackend() if SESSION_BACKEND == "redis" else MemorySessionBackend()
+            logger.info(f"🔑 Session store: {SESSION_BACKEND}")
+        return self._backend
+
+    @staticmethod
+    def split(refresh_token: str) -> tuple[str, str] | None:
+        sid, sep, secret = (refresh_token or "").partition(".")
+        return (sid, secret) if sep and sid and secret else None
+
+    async def create(self, user_id: int) -> tuple[str, str]:
+        """
+        :return: (会话 ID, 刷新令牌)
+        """
+        sid, secret = secrets.token_urlsafe(16), secrets.token_urlsafe(32)
+        await self.backend.put(sid, user_id, _digest(secret), self.ttl)
+        self.created += 1
+        return sid, f"{sid}.{secret}"
+
+    async def refresh(self, refresh_token: str) -> tuple[str, int, str] | None:
+        """
+        :return: (会话 ID, 用户 ID, 新的刷新令牌)；令牌无效、已使用或会话已结束时返回 None
+        """
+        parts = self.split(refresh_token)
+        if parts is None:
+            self.rejected += 1
+            return None
+        sid, secret = parts
+        new_secret = secrets.token_urlsafe(32)
+        user_id = await self.backend.swap(sid, _digest(secret), _digest(new_secret), self.ttl)
+        if user_id is None:
+            self.rejected += 1
+            return None
+        self.refreshed += 1
+        return sid, user_id, f"{sid}.{new_secret}"
+
+    async def revoke(self, sid: str):
+        """
+        :param sid: 来自签名已校验的访问令牌
+        """
+        await self.backend.delete(sid)
+        self.revoked += 1
+
+    async def end(self, refresh_token: str) -> Optional[str]:
+        """
+        凭刷新令牌结束会话（访问令牌已过期时登出）
+        :return: 被结束的会话 ID；令牌无效或已轮换时返回 None，不影响任何会话
+        """
+        parts = self.split(refresh_token)
+        if parts is None or not await self.backend.delete_if(parts[0], _digest(parts[1])):
+            self.rejected += 1
+            return None
+        self.revoked += 1
+        return parts[0]
+
+    async def close(self):
+        if self._backend is not None:
+            await self._backend.close()
+
+    def stats(self) -> dict:
+        return {
+            "backend": SESSION_BACKEND,
+            "active": len(self._backend) if self._backend is not None else 0,
+            "created": self.created,
+            "refreshed": self.refreshed,
+            "rejected": self.rejected,
+            "revoked": self.revoked,
+        }
+
+
+# 全局会话管理实例
+session_manager = SessionManager()
@@ -0,0 +1,105 @@
+# backend/services/templates.py
+import gzip
+import hashlib
+import logging
+from email.utils import formatdate
+from typing import NamedTuple
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template
+
+from setting import ENV_CONFIG, BASE_DIR, FRONTEND_DIR
+from backend.services.assets import asset_manifest, asset_url
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 模板配置（可在 .env 中覆盖）
+# ======================
+
+# 线上关闭：模板编译一次后不再检查文件修改时间；本地调试改模板时设为 true
+TEMPLATE_AUTO_RELOAD = ENV_CONFIG.get("TEMPLATE_AUTO_RELOAD", "false").lower() == "true"
+# 模板字节码缓存目录：进程重启后免去重新编译
+TEMPLATE_CACHE_DIR = BASE_DIR / ENV_CONFIG.get("TEMPLATE_CACHE_DIR", "data/template_cache")
+
+# 全局共享的模板环境（页面路由与 WebSocket 路由共用）
+template_env = Environment(
+    loader=FileSystemLoader(str(FRONTEND_DIR)),
+    auto_reload=TEMPLATE_AUTO_RELOAD,
+    bytecode_cache=FileSystemBytecodeCache(str(TEMPLATE_CACHE_DIR)),
+)
+# 静态资源地址：有构建清单时指向带哈希的 /assets/ 文件
+template_env.globals["asset_url"] = asset_url
+
+
+def init_template_cache():
+    """
+    应用启动时调用：创建模板字节码缓存目录
+    """
+    TEMPLATE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def render(name: str, **context) -> str:
+    return template_env.get_template(name).render(**context)
+
+
+class StaticPage(NamedTuple):
+    """
+    预渲染的页面：原文与 gzip 压缩后的字节、ETag、Last-Modified
+    """
+    template: Template
+    body: bytes
+    gzip_body: bytes
+    etag: str
+    last_modified: str
+    mtime: int
+
+
+class StaticPageCache:
+    """
+    与请求无关的页面（首页、登录页、资料填写页）只渲染并压缩一次：
+    - 同时保存原文与 gzip 字节，以及 ETag / Last-Modified（条件请求与编码协商见 routes/pages.py）
+    - 开启 TEMPLATE_AUTO_RELOAD 时模板文件变化后自动重新渲染
+    """
+
+    def __init__(self):
+        self._pages: dict[str, StaticPage] = {}
+        self.rendered = 0
+        self.not_modified = 0
+
+    def _build(self, name: str, context: dict) -> StaticPage:
+        template = template_env.get_template(name)
+        body = template.render(**context).encode("utf-8")
+        etag = hashlib.sha256(body).hexdigest()[:16]
+        # 页面中引用了带哈希的资源地址，重新构建资源后页面内容也随之变化
+        mtime = max(int((FRONTEND_DIR / name).stat().st_mtime), int(asset_manifest.built_at))
+        self.rendered += 1
+        logger.info(f"📄 Pre-rendered static page {name} ({len(body)} bytes)")
+        return StaticPage(
+            template=template,
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=9, mtime=0),
+            etag=etag,
+            last_modified=formatdate(mtime, usegmt=True),
+            mtime=mtime,
+        )
+
+    def get(self, name: str, **context) -> StaticPage:
+        """
+        :param context: 渲染参数，同一页面必须始终相同（页面只渲染一次）
+        """
+        page = self._pages.get(name)
+        # 关闭自动重载时 get_template 直接返回已编译的模板；开启时返回新对象即说明文件已变化
+        if page is None or (TEMPLATE_AUTO_RELOAD and template_env.get_template(name) is not page.template):
+            page = self._pages[name] = self._build(name, context)
+        return page
+
+    def stats(self) -> dict:
+        return {
+            "pages": len(self._pages),
+            "rendered": self.rendered,
+            "not_modified": self.not_modified,
+        }
+
+
+# 全局静态页面缓存实例
+static_pages = StaticPageCache()
@@ -0,0 +1,147 @@
+# backend/services/user_profile.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from setting import ENV_CONFIG
+from backend.crud import user
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 用户资料缓存配置（可在 .env 中覆盖）
+# ======================
+
+USER_CACHE_TTL = float(ENV_CONFIG.get("USER_CACHE_TTL", "60"))              # 资料缓存有效期（秒）
+USER_CACHE_MISS_TTL = float(ENV_CONFIG.get("USER_CACHE_MISS_TTL", "10"))    # “尚未填写资料”的缓存有效期
+USER_CACHE_SIZE = int(ENV_CONFIG.get("USER_CACHE_SIZE", "10000"))           # 最多缓存的用户数
+
+# 与 User_Info.is_complete() 默认检查的字段一致
+REQUIRED_FIELDS = ("stu_id", "name", "college")
+
+
+class UserProfile(NamedTuple):
+    """
+    用户资料的紧凑快照（不持有 ORM 对象与数据库会话）
+    """
+    user_id: int
+    stu_id: str
+    name: str
+    college: str
+    is_complete: bool
+
+    @classmethod
+    def from_row(cls, row: dict) -> "UserProfile":
+        complete = all(isinstance(row.get(f), str) and row[f].strip() for f in REQUIRED_FIELDS)
+        return cls(row["user_id"], row["stu_id"], row["name"], row["college"], complete)
+
+
+class UserProfileCache:
+    """
+    进程内用户资料缓存：
+    - LRU + TTL，容量有上限；“没有资料”的结果也会短暂缓存，防止重连风暴击穿到数据库
+    - 同一用户的并发未命中只查一次库
+    - 资料保存后写穿（直接放入最新快照），多进程部署时其他进程在 TTL 内可能读到旧值
+    """
+
+    def __init__(self, ttl: float = USER_CACHE_TTL, miss_ttl: float = USER_CACHE_MISS_TTL, max_size: int = USER_CACHE_SIZE):
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self.max_size = max_size
+        # user_id -> (过期时间, 资料或 None)
+        self._entries: "OrderedDict[int, tuple[float, Optional[UserProfile]]]" = OrderedDict()
+        self._inflight: dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id: int) -> Optional[UserProfile]:
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            expires_at, profile = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return profile
+            del self._entries[user_id]
+
+        self.misses += 1
+        fut = self._inflight.get(user_id)
+        if fut is not None:
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                # 只有发起查询的请求被取消时才自行查询；自身被取消则照常向上抛出
+                if not fut.cancelled():
+                    raise
+
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = fut
+        try:
+            row = await user.get_user_profile(user_id)
+            profile = UserProfile.from_row(row) if row else None
+            # 查询期间资料被保存过（写穿已放入新值）时，不用这次读到的旧值覆盖
+            if self._inflight.get(user_id) is fut:
+                self._store(user_id, profile)
+            fut.set_result(profile)
+            return profile
+        except Exception as e:
+            fut.set_exception(e)
+            # 避免无人等待时出现“异常未被获取”的告警
+            fut.exception()
+            raise
+        finally:
+            if not fut.done():
+                fut.cancel()
+            if self._inflight.get(user_id) is fut:
+                del self._inflight[user_id]
+
+    def put(self, user_id: int, profile: Optional[UserProfile]):
+        """
+        写穿：资料变更后直接放入最新快照
+        """
+        self._inflight.pop(user_id, None)
+        self._store(user_id, profile)
+
+    def invalidate(self, user_id: int):
+        self._inflight.pop(user_id, None)
+        self._entries.pop(user_id, None)
+
+    def _store(self, user_id: int, profile: Optional[UserProfile]):
+        ttl = self.ttl if profile is not None else self.miss_ttl
+        self._entries[user_id] = (time.monotonic() + ttl, profile)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+async def save_profile(user_id: int, user_info_data: dict):
+    """
+    创建或更新用户资料，并把最新快照写入缓存
+    :return: 写入后的 User_Info 对象
+    """
+    try:
+        info = await user.create_or_update_user_info(user_id, user_info_data)
+    except BaseException:
+        # 写入结果未知，丢弃缓存，下次从数据库读取
+        user_profile_cache.invalidate(user_id)
+        raise
+    user_profile_cache.put(user_id, UserProfile.from_row({
+        "user_id": user_id,
+        "stu_id": info.stu_id,
+        "name": info.name,
+        "college": info.college
+    }))
+    return info
+
+
+# 全局资料缓存实例
+user_profile_cache = UserProfileCache()
@@ -0,0 +1,215 @@
+# backend/services/write_behind.py
+import asyncio
+import json
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from setting import ENV_CONFIG, BASE_DIR
+from backend.crud import conversation
+
+logger = logging.getLogger(__name__)
+
+# ======================
+# 异步批量落库配置（默认关闭，关闭时每轮对话同步写库）
+# ======================
+
+WRITE_BEHIND_ENABLED = ENV_CONFIG.get("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+WRITE_BEHIND_BATCH_SIZE = int(ENV_CONFIG.get("WRITE_BEHIND_BATCH_SIZE", "100"))          # 攒够多少条立即落库
+WRITE_BEHIND_FLUSH_INTERVAL = float(ENV_CONFIG.get("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))  # 最长攒批秒数
+WRITE_BEHIND_MAX_BUFFER = int(ENV_CONFIG.get("WRITE_BEHIND_MAX_BUFFER", "10000"))        # 数据库不可用时的缓冲上限
+WRITE_BEHIND_MAX_BACKOFF = float(ENV_CONFIG.get("WRITE_BEHIND_MAX_BACKOFF", "30"))       # 重试退避上限（秒）
+
+# 停机时数据库仍不可用，则把未落库的记录溢写到文件，下次启动时重放（放在 data/ 下，不随日志清理）
+SPILL_FILE = BASE_DIR / ENV_CONFIG.get("WRITE_BEHIND_SPILL_FILE", "data/conversation_spill.jsonl")
+
+
+class ConversationWriter:
+    """
+    对话记录的 write-behind 写入器：
+    - save() 只把记录放进内存缓冲区，立即返回
+    - 后台任务按条数或时间阈值用多行 INSERT 批量落库
+    - 数据库故障时指数退避重试；缓冲区超过上限时丢弃最旧的记录（有界损失）
+    - 停机时排空缓冲区，仍失败则溢写到 SPILL_FILE
+    """
+
+    def __init__(self, enabled: bool = WRITE_BEHIND_ENABLED):
+        self.enabled = enabled
+        self._buffer: deque[dict] = deque()
+        self._flushing: list[dict] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._backoff = 0.0
+        # 正在重放的溢写文件及其中尚未落库的条数（重放记录位于缓冲区头部）
+        self._replay_file = None
+        self._replay_pending = 0
+
+        self.written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.dropped = 0
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._replay_spill()
+        self._stopping = False
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"📝 Conversation write-behind started (batch={WRITE_BEHIND_BATCH_SIZE})")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # 通知后台任务退出：正在提交的批次写完再停，不在提交中途取消（否则重新入队会造成重复写入）
+        self._stopping = True
+        self._wake.set()
+        await self._task
+        self._task = None
+
+        # 排空缓冲区：数据库仍不可用时溢写到文件
+        for _ in range(3):
+            if not self._buffer and not self._flushing:
+                break
+            await self._flush()
+        if self._buffer or self._flushing:
+            self._spill()
+
+    # ---------- 写入 ----------
+
+    async def save(self, user_id: int, character_id: int, user_msg: str, ai_msg: str):
+        """
+        保存一轮对话：开启 write-behind 时仅入缓冲区，否则同步写库
+        """
+        if self._task is None:
+            await conversation.save_conversation(user_id, character_id, user_msg, ai_msg)
+            return
+
+        self._buffer.append({
+            "user_id": user_id,
+            "character_id": character_id,
+            "user_message": user_msg,
+            "ai_message": ai_msg,
+            "timestamp": datetime.now(timezone.utc)
+        })
+        if len(self._buffer) > WRITE_BEHIND_MAX_BUFFER:
+            self._buffer.popleft()
+            self._replayed(1)
+            self.dropped += 1
+            logger.error(f"📝 Write-behind buffer full, dropped oldest conversation ({self.dropped} dropped so far)")
+        if len(self._buffer) >= WRITE_BEHIND_BATCH_SIZE:
+            self._wake.set()
+
+    def pending(self, user_id: int, character_id: int) -> list[dict]:
+        """
+        尚未落库的对话（按时间正序），供上下文拼装读取，保证刚说过的话不会“丢失”
+        正在提交的批次提交完成后才移出；提交刚完成时可能与数据库查询结果重复，由调用方去重
+        """
+        return [
+            r for r in (*self._flushing, *self._buffer)
+            if r["user_id"] == user_id and r["character_id"] == character_id
+        ]
+
+    # ---------- 内部实现 ----------
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=WRITE_BEHIND_FLUSH_INTERVAL + self._backoff)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self._flush()
+
+    async def _flush(self):
+        while self._buffer:
+            count = min(WRITE_BEHIND_BATCH_SIZE, len(self._buffer))
+            self._flushing = [self._buffer.popleft() for _ in range(count)]
+            try:
+                await conversation.save_conversations_bulk(self._flushing)
+            except asyncio.CancelledError:
+                self._buffer.extendleft(reversed(self._flushing))
+                self._flushing = []
+                raise
+            except Exception as e:
+                # 放回缓冲区头部，等待退避后重试
+                self._buffer.extendleft(reversed(self._flushing))
+                self._flushing = []
+                self.failures += 1
+                self._backoff = min(WRITE_BEHIND_MAX_BACKOFF, (self._backoff * 2) or 1.0)
+                logger.error(f"📝 Write-behind flush failed, retrying in {self._backoff:.0f}s: {e}")
+                return
+            self.written += count
+            self.flushes += 1
+            self._flushing = []
+            self._backoff = 0.0
+            self._replayed(count)
+
+    def _spill(self):
+        records = [*self._flushing, *self._buffer]
+        SPILL_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(SPILL_FILE, "a", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps({**r, "timestamp": r["timestamp"].isoformat()}, ensure_ascii=False) + "\n")
+        self._buffer.clear()
+        self._flushing = []
+        # 未落库的重放记录已随本次溢写写回 SPILL_FILE
+        self._replayed(self._replay_pending)
+        logger.critical(f"📝 Database unavailable on shutdown, spilled {len(records)} conversations to {SPILL_FILE}")
+
+    def _replay_spill(self):
+        """
+        把溢写文件读回缓冲区；文件保留为 .replaying，直到其中的记录全部落库才删除，
+        重放期间进程退出时下次启动会再次重放（至少一次，可能重复写入已落库的部分）
+        """
+        replay = SPILL_FILE.with_suffix(".replaying")
+        if SPILL_FILE.exists():
+            if replay.exists():
+                # 上次重放未完成就退出，之后又产生了新的溢写：合并后一起重放
+                with open(replay, "a", encoding="utf-8") as dst, open(SPILL_FILE, encoding="utf-8") as src:
+                    dst.write(src.read())
+                SPILL_FILE.unlink()
+            else:
+                SPILL_FILE.replace(replay)
+        if not replay.exists():
+            return
+        with open(replay, encoding="utf-8") as f:
+            for line in f:
+                r = json.loads(line)
+                r["timestamp"] = datetime.fromisoformat(r["timestamp"])
+                self._buffer.append(r)
+        self._replay_file = replay
+        self._replay_pending = len(self._buffer)
+        if not self._replay_pending:
+            self._replayed(0)
+        logger.info(f"📝 Replaying {len(self._buffer)} spilled conversations")
+
+    def _replayed(self, count: int):
+        """
+        缓冲区头部的 count 条记录已落库（或被丢弃、重新溢写）；重放记录全部处理完后删除重放文件
+        """
+        if self._replay_file is None:
+            return
+        self._replay_pending -= min(count, self._replay_pending)
+        if not self._replay_pending:
+            self._replay_file.unlink(missing_ok=True)
+            self._replay_file = None
+            logger.info("📝 Spilled conversations replayed")
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "buffered": len(self._buffer) + len(self._flushing),
+            "written": self.written,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "dropped": self.dropped,
+        }
+
+
+# 全局写入器实例
+conversation_writer = ConversationWriter()
@@ -115,7 +115,12 @@ class AuthManager {
     };
 
     try {
-      const res = await fetch(url, config);
+      let res = await fetch(url, config);
+
+      // 访问令牌过期：用刷新令牌换发一次后重试
+      if (res.status === 401 && await this.refresh()) {
+        res = await fetch(url, config);
+      }
 
       if (res.status === 401) {
         this.handleUnauthorized();
@@ -131,6 +136,20 @@ class AuthManager {
     }
   }
 
+  /**
+   * 用 HttpOnly 刷新令牌换发访问令牌（并发调用共用同一次请求）
+   * @returns {Promise<boolean>} 是否换发成功
+   */
+  static refresh() {
+    if (!this._refreshing) {
+      this._refreshing = fetch("/refresh", { method: "POST", credentials: "same-origin" })
+        .then(res => res.ok)
+        .catch(() => false)
+        .finally(() => { this._refreshing = null; });
+    }
+    return this._refreshing;
+  }
+
   /**
    * 处理未授权错误（登出 + 跳转）
    */
@@ -145,9 +164,14 @@ class AuthManager {
    */
   static logout() {
     if (confirm("确定要退出登录吗？")) {
-      this.clearToken();
-      alert("已退出登录");
-      window.location.href = "/login";
+      // 通知服务端注销 Token 并清除 HttpOnly Cookie，失败也继续本地登出
+      fetch("/logout", { method: "POST", credentials: "same-origin" })
+        .catch(() => {})
+        .finally(() => {
+          this.clearToken();
+          alert("已退出登录");
+          window.location.href = "/login";
+        });
     }
   }
 }
@@ -1,4 +1,10 @@
 # backend/jwt_handler.py
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 from typing import Any, Optional
 from fastapi import Cookie
@@ -13,7 +19,15 @@ if not SECRET_KEY:
     raise ValueError("环境变量 SECRET_KEY 未设置")
 
 ALGORITHM = ENV_CONFIG.get("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(ENV_CONFIG.get("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# 访问令牌有效期：过期后用刷新令牌换新（见 backend/services/sessions.py），不必重新登录
+ACCESS_TOKEN_EXPIRE_MINUTES = int(ENV_CONFIG.get("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+
+# 密码哈希线程池大小：PBKDF2 在 hashlib 中计算时会释放 GIL，线程即可并行利用多核
+PASSWORD_HASH_WORKERS = int(ENV_CONFIG.get("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+
+# 已校验 Token 缓存的最大条数
+TOKEN_CACHE_SIZE = int(ENV_CONFIG.get("TOKEN_CACHE_SIZE", "10000"))
 
 
 class TokenData(BaseModel):
@@ -36,6 +50,22 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pbkdf2_sha256.verify(plain_password, hashed_password)
 
 
+async def hash_password_async(password: str) -> str:
+    """
+    【异步】在密码哈希线程池中计算哈希，不阻塞事件循环
+    """
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, get_password_hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    【异步】在密码哈希线程池中校验密码，不阻塞事件循环
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _hash_executor, verify_password, plain_password, hashed_password
+    )
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
     创建 JWT Token
@@ -52,6 +82,148 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+class VerifiedTokenCache:
+    """
+    已校验 Token 缓存：
+    - 以 Token 的 SHA-256 摘要为键，缓存到 Token 自身的 exp 为止，命中时跳过签名校验与解析
+    - LRU 淘汰，容量有上限
+    - 登出时调用 revoke()，该 Token 在过期前都会被拒绝；revoke_session() 拒绝同一会话签发的所有访问令牌
+      （两者都只对当前进程生效，其他进程依赖访问令牌的短有效期）
+    - 注销记录只接受签名有效的 Token，同样有容量上限，过期后在查询或写入时清理
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        # 摘要 -> (exp 时间戳, sub, sid)
+        self._entries: "OrderedDict[bytes, tuple[float, str, Optional[str]]]" = OrderedDict()
+        # 已注销的摘要 -> exp 时间戳（按注销先后排列，访问令牌有效期相同，也即大致按过期先后）
+        self._revoked: "OrderedDict[bytes, float]" = OrderedDict()
+        # 已结束的会话 ID -> 该会话最后一个访问令牌的最晚过期时间
+        self._revoked_sessions: "OrderedDict[str, float]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.revocations_evicted = 0
+
+    @staticmethod
+    def _digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    @staticmethod
+    def _still_revoked(revoked: OrderedDict, key, now: float) -> bool:
+        until = revoked.get(key)
+        if until is None:
+            return False
+        if until <= now:
+            del revoked[key]
+            return False
+        return True
+
+    def _record(self, revoked: OrderedDict, key, until: float, now: float):
+        """
+        记录注销：先从头部清理已过期的记录，超出容量时淘汰最早（最先过期）的记录
+        """
+        while revoked and next(iter(revoked.values())) <= now:
+            revoked.popitem(last=False)
+        revoked[key] = until
+        revoked.move_to_end(key)
+        while len(revoked) > self.max_size:
+            revoked.popitem(last=False)
+            self.revocations_evicted += 1
+
+    def claims(self, token: str) -> Optional[tuple[str, Optional[str]]]:
+        """
+        返回 Token 中的 (sub, sid)；签名无效、已过期、已注销或缺少 sub 时返回 None
+        """
+        key = self._digest(token)
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if now < entry[0]:
+                if entry[2] is not None and self._still_revoked(self._revoked_sessions, entry[2], now):
+                    return None
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1], entry[2]
+            del self._entries[key]
+
+        self.misses += 1
+        if self._still_revoked(self._revoked, key, now):
+            return None
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id = payload.get("sub")
+        session_id = payload.get("sid")
+        exp = payload.get("exp")
+        if user_id is None or (session_id is not None and self._still_revoked(self._revoked_sessions, session_id, now)):
+            return None
+        # 没有 exp 的 Token 不缓存，每次都完整校验
+        if exp is not None:
+            self._entries[key] = (float(exp), user_id, session_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return user_id, session_id
+
+    def subject(self, token: str) -> Optional[str]:
+        claims = self.claims(token)
+        return claims[0] if claims else None
+
+    def revoke(self, token: str):
+        key = self._digest(token)
+        self._entries.pop(key, None)
+        try:
+            # 只记录本服务签发且未过期的 Token；伪造或过期的 Token 本来就会被拒绝
+            exp = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("exp")
+        except JWTError:
+            return
+        now = time.time()
+        if exp is not None and float(exp) > now:
+            self._record(self._revoked, key, float(exp), now)
+
+    def revoke_session(self, session_id: str):
+        now = time.time()
+        self._record(self._revoked_sessions, session_id, now + ACCESS_TOKEN_EXPIRE_MINUTES * 60, now)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "revoked": len(self._revoked),
+            "revoked_sessions": len(self._revoked_sessions),
+            "revocations_evicted": self.revocations_evicted,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# 全局 Token 缓存实例（HTTP 与 WebSocket 两个入口共用）
+token_cache = VerifiedTokenCache()
+
+
+def revoke_token(token: str):
+    """
+    注销 Token（登出时调用），从缓存中移除并在其过期前拒绝
+    """
+    token_cache.revoke(token)
+
+
+def revoke_session(session_id: str):
+    """
+    结束会话后调用：本进程内立即拒绝该会话签发的所有访问令牌
+    """
+    token_cache.revoke_session(session_id)
+
+
+def get_session_id(token: Optional[str]) -> Optional[str]:
+    """
+    返回有效访问令牌所属的会话 ID（无效或旧版无会话的令牌返回 None）
+    """
+    if not token:
+        return None
+    try:
+        claims = token_cache.claims(token)
+    except Exception:
+        return None
+    return claims[1] if claims else None
+
+
 async def get_current_user_id(access_token: str = Cookie(None)) -> Optional[Any]:
     """
     【异步依赖】从 HttpOnly Cookie 中提取 JWT 并解析出用户 ID（即 'sub' 字段）
@@ -62,8 +234,7 @@ async def get_current_user_id(access_token: str = Cookie(None)) -> Optional[Any]
         return None
 
     try:
-        payload = jwt.decode(access_token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
+        user_id = token_cache.subject(access_token)
         if user_id is None:
             return None
         return int(user_id)
@@ -83,11 +254,7 @@ def decode_access_token(token: str) -> Optional[str]:
     :return: 用户 ID (str) 或 None（无效/过期/无 sub）
     """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            return None
-        return user_id
+        return token_cache.subject(token)
     except JWTError:
         return None
     except Exception:
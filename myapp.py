@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from setting import FRONTEND_DIR
@@ -9,13 +10,44 @@ from backend.routes.pages import router as pages_router
 from backend.routes.ai import router as ai_router
 from backend.routes.web_socket import router as chat_router
 from backend.routes.user import router as user_router
+from backend.services import llm_client
+from backend.services.balancer import pool as llm_pool
+from backend.services.memory import memory_store
+from backend.services.write_behind import conversation_writer
+from backend.services.character_catalog import character_catalog
+from backend.services.sessions import session_manager
+from backend.services.assets import AssetFiles, asset_manifest, ASSET_FILES_DIR
+from backend.services.templates import init_template_cache
+from backend.database import dispose_engines
 
 # 设置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动：创建应用级共享的 LLM 连接池，并开始探测各模型节点
+    init_template_cache()
+    llm_client.init_client()
+    llm_pool.start()
+    memory_store.start()
+    conversation_writer.start()
+    # 预加载角色目录；数据库暂不可用时不阻塞启动，首次访问时再加载
+    try:
+        await character_catalog.load()
+    except Exception as e:
+        logger.error(f"🎭 Failed to preload character catalog: {e}")
+    yield
+    # 关闭：排空对话写入缓冲区与记忆队列，停止探测并释放 LLM 与数据库连接池
+    await conversation_writer.stop()
+    await memory_store.stop()
+    await llm_pool.stop()
+    await llm_client.close_client()
+    await session_manager.close()
+    await dispose_engines()
+
 def create_app():
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
 
     # === 中间件：自动记录访问者 IP ===
     @app.middleware("http")
@@ -37,8 +69,10 @@ def create_app():
         response = await call_next(request)
         return response
 
-    # 挂载静态文件
+    # 挂载静态文件（未构建资源时的回退地址）
     app.mount("/static", StaticFiles(directory=str(FRONTEND_DIR / "static")), name="static")
+    # 带内容哈希的构建产物（python -m backend.jobs.build_assets），长期缓存
+    app.mount("/assets", AssetFiles(manifest=asset_manifest, directory=str(ASSET_FILES_DIR), check_dir=False), name="assets")
 
     # 注册路由
     app.include_router(pages_router)
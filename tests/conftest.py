@@ -0,0 +1,69 @@
+# tests/conftest.py
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from jwt_handler import get_current_user_id
+from backend.routes import ai
+from backend.services import llm_client
+from backend.services.balancer import Endpoint
+
+USER_ID = 1
+CHARACTER = {"id": 1, "name": "测试角色", "system_prompt": "你是测试角色"}
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    """
+    用 httpx.MockTransport 代替 Ollama：测试中给 llm.handler 赋值即可决定模型返回
+    """
+    class FakeLLM:
+        handler = staticmethod(lambda request: httpx.Response(500, text="no handler"))
+
+    fake = FakeLLM()
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: fake.handler(request)))
+    monkeypatch.setattr(llm_client, "_client", client)
+    # 单个节点、全新的熔断器
+    monkeypatch.setattr(ai.pool, "endpoints", [Endpoint("http://llm")])
+    monkeypatch.setattr(ai.pool, "_sticky", type(ai.pool._sticky)())
+    return fake
+
+
+@pytest.fixture
+def ai_client(monkeypatch, llm):
+    """
+    只挂载 /ai 路由的应用：登录用户固定为 USER_ID，角色与上下文不查库，保存的对话记录在 saved 中
+    """
+    saved = []
+
+    async def get_character(character_id):
+        return CHARACTER if character_id == CHARACTER["id"] else None
+
+    async def build_messages(user_id, character_id, system_prompt, user_message):
+        # 带历史：不走回复缓存，每次都调用模型
+        return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}], True
+
+    async def persist_turn(user_id, character_id, user_message, reply):
+        saved.append((user_id, character_id, user_message, reply))
+
+    monkeypatch.setattr(ai.character_catalog, "get", get_character)
+    monkeypatch.setattr(ai.context, "build_messages", build_messages)
+    monkeypatch.setattr(ai, "_persist_turn", persist_turn)
+
+    app = FastAPI()
+    app.include_router(ai.router)
+    app.dependency_overrides[get_current_user_id] = lambda: USER_ID
+    with TestClient(app) as client:
+        client.saved = saved
+        yield client
@@ -0,0 +1,67 @@
+# tests/test_assets.py
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.services.assets import AssetFiles, AssetManifest, IMMUTABLE_CACHE_CONTROL
+
+
+def write_manifest(path, files):
+    path.write_text(json.dumps({"built_at": "2026-01-01T00:00:00", "files": files}), encoding="utf-8")
+
+
+@pytest.mark.parametrize("content", ["{not json", '{"built_at": "2026-01-01T00:00:00"}', '{"files": {"a.css": {}}}', "[]"])
+def test_corrupt_manifest_falls_back_to_static(tmp_path, content):
+    path = tmp_path / "manifest.json"
+    path.write_text(content, encoding="utf-8")
+    manifest = AssetManifest(path)
+
+    manifest.load()
+
+    assert manifest.files == {} and manifest.built_at == 0.0
+    assert manifest.url("a.css") == "/static/a.css"
+
+
+def test_manifest_maps_to_hashed_url(tmp_path):
+    path = tmp_path / "manifest.json"
+    write_manifest(path, {"a.css": {"path": "a.0123456789.css", "size": 1}})
+    manifest = AssetManifest(path)
+
+    manifest.load()
+
+    assert manifest.url("a.css") == "/assets/a.0123456789.css"
+    assert manifest.built_at > 0
+
+
+@pytest.fixture
+def symlinked_assets(tmp_path):
+    """
+    真实目录 real/，通过符号链接 link/ 挂载（部署时常见的 current -> releases/xxx）
+    """
+    real = tmp_path / "real"
+    real.mkdir()
+    (real / "a.0123456789.css").write_text("body{}", encoding="utf-8")
+    (real / "a.0123456789.css.gz").write_bytes(gzip.compress(b"body{/*gz*/}"))
+    link = tmp_path / "link"
+    link.symlink_to(real, target_is_directory=True)
+    manifest_path = tmp_path / "manifest.json"
+    write_manifest(manifest_path, {"a.css": {"path": "a.0123456789.css", "size": 6, "encodings": ["gzip"]}})
+    manifest = AssetManifest(manifest_path)
+    manifest.load()
+
+    app = FastAPI()
+    app.mount("/assets", AssetFiles(manifest=manifest, directory=str(link)), name="assets")
+    return TestClient(app)
+
+
+def test_assets_behind_symlink_are_served_with_variants(symlinked_assets):
+    resp = symlinked_assets.get("/assets/a.0123456789.css", headers={"Accept-Encoding": "gzip"})
+
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == IMMUTABLE_CACHE_CONTROL
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["content-type"].startswith("text/css")
+    assert resp.text == "body{/*gz*/}"
@@ -0,0 +1,148 @@
+# tests/test_balancer.py
+import asyncio
+
+import httpx
+import pytest
+
+from backend.services import llm_client
+from backend.services.balancer import BackendError, EndpointPool, NoBackendAvailable
+
+URLS = ["http://a", "http://b", "http://c"]
+
+
+@pytest.fixture
+def stub_servers(monkeypatch):
+    """
+    各节点的 /api/tags 桩：down 中的节点返回 503
+    """
+    down: set[str] = set()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        base = f"{request.url.scheme}://{request.url.host}"
+        if base in down:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"models": []})
+
+    monkeypatch.setattr(llm_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return down
+
+
+def make_pool(**kwargs) -> EndpointPool:
+    return EndpointPool(urls=URLS, probe_interval=3600, fail_threshold=2, **kwargs)
+
+
+@pytest.mark.anyio
+async def test_least_outstanding_spreads_concurrent_leases():
+    pool = make_pool(affinity=False)
+    release = asyncio.Event()
+    used = []
+
+    async def hold():
+        async with pool.lease() as ep:
+            used.append(ep.url)
+            await release.wait()
+
+    tasks = [asyncio.create_task(hold()) for _ in range(6)]
+    await asyncio.sleep(0)
+    assert sorted(ep.outstanding for ep in pool.endpoints) == [2, 2, 2]
+    release.set()
+    await asyncio.gather(*tasks)
+
+    assert sorted(used) == sorted(URLS * 2)
+    assert all(ep.outstanding == 0 and ep.served == 2 for ep in pool.endpoints)
+
+
+@pytest.mark.anyio
+async def test_probe_ejects_and_readmits_endpoint(stub_servers):
+    pool = make_pool(affinity=False)
+    stub_servers.add("http://b")
+
+    await pool.probe_all()
+    assert pool.endpoints[1].healthy  # 一次失败不足以摘除
+    await pool.probe_all()
+    assert not pool.endpoints[1].healthy
+    assert {pool.pick().url for _ in range(10)} <= {"http://a", "http://c"}
+
+    stub_servers.clear()
+    await pool.probe_all()
+    assert pool.endpoints[1].healthy and pool.endpoints[1].failures == 0
+
+
+@pytest.mark.anyio
+async def test_all_endpoints_down_raises(stub_servers):
+    pool = make_pool()
+    stub_servers.update(URLS)
+    for _ in range(2):
+        await pool.probe_all()
+
+    with pytest.raises(NoBackendAvailable):
+        pool.ensure_available()
+
+
+@pytest.mark.anyio
+async def test_connection_errors_eject_passively():
+    pool = make_pool(affinity=False)
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            async with pool.lease(exclude=(pool.endpoints[1], pool.endpoints[2])):
+                raise httpx.ConnectError("refused")
+
+    assert not pool.endpoints[0].healthy
+
+
+@pytest.mark.anyio
+async def test_affinity_keeps_a_conversation_on_one_endpoint():
+    pool = make_pool(affinity=True)
+    key = (1, 2)
+
+    first = pool.pick(key)
+    # 其他请求让粘滞节点稍忙，但未超过允许的偏差
+    first.outstanding += 1
+    assert pool.pick(key) is first
+
+    # 偏差过大时改派最空闲的节点，并更新粘滞关系
+    first.outstanding += 5
+    moved = pool.pick(key)
+    assert moved is not first
+    assert pool.pick(key) is moved
+    assert pool.stats()["sticky_sessions"] == 1
+
+
+@pytest.mark.anyio
+async def test_affinity_moves_off_unavailable_endpoint():
+    pool = make_pool(affinity=True)
+    first = pool.pick((1, 2))
+    first.healthy = False
+
+    assert pool.pick((1, 2)) is not first
+
+
+@pytest.mark.anyio
+async def test_hedged_request_uses_another_endpoint_when_primary_is_slow():
+    pool = make_pool(affinity=False)
+
+    async def call(ep):
+        if ep is pool.endpoints[0]:
+            await asyncio.sleep(10)
+        return ep.url
+
+    # 在途数相同时选第一个节点 a
+    result = await pool.hedged(None, call, hedge_after=0.01)
+
+    assert result != "http://a"
+    assert pool.stats()["hedges"] == 1 and pool.stats()["hedge_wins"] == 1
+    # 被取消的主请求不计入熔断统计
+    assert pool.endpoints[0].breaker.to_dict()["recent_calls"] == 0
+
+
+@pytest.mark.anyio
+async def test_backend_errors_count_toward_the_breaker():
+    pool = make_pool(affinity=False)
+    ep = pool.endpoints[0]
+    for _ in range(ep.breaker.min_calls):
+        with pytest.raises(BackendError):
+            async with pool.lease(exclude=tuple(pool.endpoints[1:])):
+                raise BackendError(500, "boom")
+
+    assert not ep.breaker.available()
+    assert pool.pick() is not ep
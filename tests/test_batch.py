@@ -0,0 +1,80 @@
+# tests/test_batch.py
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from backend.routes import ai
+from backend.services.balancer import NoBackendAvailable
+from backend.services.scheduler import SchedulerRejected
+
+
+@pytest.fixture
+def saved_batches(monkeypatch):
+    batches = []
+
+    async def save_conversations_bulk(records):
+        batches.append(records)
+        return len(records)
+
+    monkeypatch.setattr(ai.conversation, "save_conversations_bulk", save_conversations_bulk)
+    return batches
+
+
+def test_batch_reports_each_failure_and_saves_only_successes(ai_client, monkeypatch, saved_batches):
+    failures = {
+        "timeout": HTTPException(status_code=504, detail="大模型响应超时"),
+        "busy": SchedulerRejected(503, "服务繁忙，请稍后再试", 5),
+        "down": NoBackendAvailable("all endpoints open"),
+        "boom": RuntimeError("unexpected"),
+    }
+
+    async def generate_reply(key, character_id, payload, deadline):
+        message = payload["messages"][-1]["content"]
+        if message in failures:
+            raise failures[message]
+        return f"re:{message}"
+
+    monkeypatch.setattr(ai, "_generate_reply", generate_reply)
+    messages = ["ok1", "timeout", "busy", "down", "boom", "ok2"]
+
+    resp = ai_client.post("/ai/chat/batch", json={"character_id": 1, "messages": messages})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    *items, summary = lines
+    by_index = {item["index"]: item for item in items}
+    assert sorted(by_index) == list(range(len(messages)))
+    assert by_index[0]["reply"] == "re:ok1" and by_index[5]["reply"] == "re:ok2"
+    assert by_index[1]["error"] == "大模型响应超时"
+    assert by_index[2]["error"] == "服务繁忙，请稍后再试"
+    assert by_index[3]["error"] == "大模型服务暂不可用"
+    assert by_index[4]["error"].startswith("请求失败")
+    assert all(by_index[i]["message"] == m for i, m in enumerate(messages))
+
+    assert summary == {"done": True, "total": 6, "failed": 4, "saved": 2}
+    [records] = saved_batches
+    assert sorted(r["user_message"] for r in records) == ["ok1", "ok2"]
+
+
+def test_batch_persistence_failure_still_ends_with_summary(ai_client, monkeypatch):
+    async def generate_reply(key, character_id, payload, deadline):
+        return "ok"
+
+    async def save_conversations_bulk(records):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(ai, "_generate_reply", generate_reply)
+    monkeypatch.setattr(ai.conversation, "save_conversations_bulk", save_conversations_bulk)
+
+    resp = ai_client.post("/ai/chat/batch", json={"character_id": 1, "messages": ["a", "b"]})
+
+    summary = json.loads(resp.text.splitlines()[-1])
+    assert summary == {"done": True, "total": 2, "failed": 0, "saved": 0}
+
+
+def test_batch_rejects_oversized_request(ai_client):
+    resp = ai_client.post("/ai/chat/batch", json={"character_id": 1, "messages": ["x"] * (ai.BATCH_MAX_MESSAGES + 1)})
+
+    assert resp.status_code == 400
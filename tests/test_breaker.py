@@ -0,0 +1,61 @@
+# tests/test_breaker.py
+import asyncio
+
+import httpx
+import pytest
+
+from backend.routes import ai
+
+
+@pytest.fixture
+def tripped(ai_client, llm):
+    """
+    唯一的节点已熔断；模型一旦被调用即记录下来
+    """
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise AssertionError("熔断期间不应调用模型")
+
+    llm.handler = handler
+    breaker = ai.pool.endpoints[0].breaker
+    for _ in range(breaker.min_calls):
+        breaker.record(False)
+    assert not breaker.available()
+    return calls
+
+
+@pytest.mark.parametrize("path, body", [
+    ("/ai/chat", {"character_id": 1, "user_message": "hi"}),
+    ("/ai/chat/stream", {"character_id": 1, "user_message": "hi"}),
+    ("/ai/chat/batch", {"character_id": 1, "messages": ["a", "b"]}),
+])
+def test_open_breaker_returns_503_with_retry_after(ai_client, tripped, path, body):
+    resp = ai_client.post(path, json=body)
+
+    assert resp.status_code == 503
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert resp.json()["detail"] == "大模型服务暂不可用，请稍后再试"
+    assert tripped == []
+    assert ai_client.saved == []
+
+
+@pytest.mark.parametrize("path", ["/ai/chat", "/ai/chat/stream"])
+def test_expired_client_deadline_does_not_trip_breaker(ai_client, llm, path):
+    async def slow(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200, json={"choices": [{"message": {"content": "late"}}]})
+
+    llm.handler = slow
+    for _ in range(5):
+        resp = ai_client.post(path, json={"character_id": 1, "user_message": "hi", "deadline": 0.01})
+        if path == "/ai/chat":
+            assert resp.status_code == 504
+        else:
+            assert "event: error" in resp.text and "模型响应超时" in resp.text
+
+    ep = ai.pool.endpoints[0]
+    assert ep.breaker.available() and ep.breaker.to_dict()["recent_calls"] == 0
+    assert ep.healthy and ep.outstanding == 0
+    assert ai_client.saved == []
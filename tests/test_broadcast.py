@@ -0,0 +1,110 @@
+# tests/test_broadcast.py
+import asyncio
+import json
+
+import pytest
+
+from backend.services.broadcast import CLOSE_SLOW_CONSUMER, RoomBroadcaster
+
+
+class FakeWebSocket:
+    """
+    stall=True 时 send_text 永不返回，模拟接收过慢的客户端
+    """
+
+    def __init__(self, stall: bool = False):
+        self.stall = stall
+        self.received: list[str] = []
+        self.closed_with = None
+
+    async def send_text(self, text: str):
+        if self.stall:
+            await asyncio.sleep(3600)
+        self.received.append(text)
+
+    async def close(self, code: int = 1000, reason: str = None):
+        self.closed_with = code
+
+
+async def broadcast_all(broadcaster: RoomBroadcaster, count: int):
+    for i in range(count):
+        broadcaster.broadcast({"i": i, "content": "你好"})
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.anyio
+async def test_drop_oldest_keeps_fast_clients_whole_and_times_out_slow_ones():
+    broadcaster = RoomBroadcaster(queue_size=3, send_timeout=0.2, policy="drop_oldest")
+    fast, slow = FakeWebSocket(), FakeWebSocket(stall=True)
+    broadcaster.connect(fast)
+    broadcaster.connect(slow)
+
+    await broadcast_all(broadcaster, 6)
+    await asyncio.sleep(0.02)
+
+    # 快客户端收到全部消息，序列化方式与 send_json 一致
+    assert [json.loads(t)["i"] for t in fast.received] == list(range(6))
+    assert fast.received[0] == '{"i":0,"content":"你好"}'
+    # 慢客户端卡在第 0 条上：队列中保留最新的 3 条，更早的 2 条被丢弃
+    assert broadcaster.stats()["dropped"] == 2
+    assert slow.closed_with is None
+
+    await asyncio.sleep(0.3)
+    assert slow.closed_with == CLOSE_SLOW_CONSUMER
+    assert broadcaster.stats()["slow_disconnects"] == 1
+    assert len(broadcaster) == 1
+
+    broadcaster.broadcast({"i": 6})
+    await asyncio.sleep(0.01)
+    assert len(fast.received) == 7
+
+    await broadcaster.disconnect(fast)
+    await broadcaster.disconnect(slow)
+    assert len(broadcaster) == 0
+
+
+@pytest.mark.anyio
+async def test_disconnect_policy_evicts_when_queue_is_full():
+    broadcaster = RoomBroadcaster(queue_size=3, send_timeout=10, policy="disconnect")
+    fast, slow = FakeWebSocket(), FakeWebSocket(stall=True)
+    broadcaster.connect(fast)
+    broadcaster.connect(slow)
+
+    await broadcast_all(broadcaster, 6)
+    await asyncio.sleep(0.02)
+
+    # 不等发送超时：队列一满立即断开
+    assert slow.closed_with == CLOSE_SLOW_CONSUMER
+    stats = broadcaster.stats()
+    assert stats["slow_disconnects"] == 1 and stats["dropped"] == 0
+    assert stats["connections"] == 1
+    assert len(fast.received) == 6
+
+    await broadcaster.disconnect(fast)
+    await broadcaster.disconnect(slow)
+
+
+@pytest.mark.anyio
+async def test_disconnect_right_after_a_send_completes_does_not_hang():
+    broadcaster = RoomBroadcaster(send_timeout=10)
+    ws = FakeWebSocket()
+    tasks = []
+
+    async def send_text(text):
+        ws.received.append(text)
+        # 客户端恰好在这条消息发完时断开：取消与发送完成落在同一轮事件循环
+        tasks.append(asyncio.ensure_future(broadcaster.disconnect(ws)))
+
+    ws.send_text = send_text
+    conn = broadcaster.connect(ws)
+    broadcaster.broadcast({"i": 0})
+    await asyncio.sleep(0.01)
+
+    done, _ = await asyncio.wait(tasks, timeout=1)
+    assert done and conn.writer.done()
+    assert len(broadcaster) == 0 and len(ws.received) == 1
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        RoomBroadcaster(policy="block")
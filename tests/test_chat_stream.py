@@ -0,0 +1,97 @@
+# tests/test_chat_stream.py
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from backend.routes import ai
+
+
+def parse_sse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = "message", None
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+        events.append((event, data))
+    return events
+
+
+def test_sse_framing():
+    assert ai._sse({"delta": "你好"}) == 'data: {"delta": "你好"}\n\n'
+    assert ai._sse({"reply": "好"}, event="done") == 'event: done\ndata: {"reply": "好"}\n\n'
+
+
+def test_stream_relays_deltas_then_done(ai_client, llm):
+    chunks = ["你", "好", "呀"]
+    body = "".join(
+        f"data: {json.dumps({'choices': [{'delta': {'content': c}}]}, ensure_ascii=False)}\n\n" for c in chunks
+    ) + "data: [DONE]\n\n"
+    llm.handler = lambda request: httpx.Response(200, text=body)
+
+    resp = ai_client.post("/ai/chat/stream", json={"character_id": 1, "user_message": "hi"})
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(resp.text)
+    assert events == [("message", {"delta": c}) for c in chunks] + [("done", {"reply": "你好呀"})]
+    assert ai_client.saved == [(1, 1, "hi", "你好呀")]
+
+
+def test_stream_reports_backend_error_as_event(ai_client, llm):
+    llm.handler = lambda request: httpx.Response(400, text="bad request")
+
+    resp = ai_client.post("/ai/chat/stream", json={"character_id": 1, "user_message": "hi"})
+
+    (event, data), = parse_sse(resp.text)
+    assert event == "error"
+    assert "bad request" in data["message"]
+    assert ai_client.saved == []
+
+
+class FakeRequest:
+    def __init__(self, disconnect_after: int):
+        self.polls = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self) -> bool:
+        self.polls += 1
+        return self.polls > self.disconnect_after
+
+
+@pytest.mark.anyio
+async def test_disconnect_cancels_generation(monkeypatch):
+    monkeypatch.setattr(ai, "DISCONNECT_POLL_INTERVAL", 0.01)
+    state = {"cancelled": False, "produced": 0}
+
+    async def generation():
+        try:
+            while True:
+                state["produced"] += 1
+                yield ai._sse({"delta": "x"})
+                await asyncio.sleep(0.005)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    received = []
+    with pytest.raises(ai.ClientDisconnected):
+        async for item in ai._stream_until_disconnect(FakeRequest(disconnect_after=3), generation()):
+            received.append(item)
+
+    assert state["cancelled"]
+    assert received and all(item == 'data: {"delta": "x"}\n\n' for item in received)
+
+
+@pytest.mark.anyio
+async def test_stream_finishes_normally_without_disconnect():
+    async def generation():
+        for i in range(3):
+            yield str(i)
+
+    items = [item async for item in ai._stream_until_disconnect(FakeRequest(disconnect_after=10**6), generation())]
+    assert items == ["0", "1", "2"]
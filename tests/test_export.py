@@ -0,0 +1,116 @@
+# tests/test_export.py
+import gzip
+import json
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from backend.jobs import export_conversations as job
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# 在子进程中导出，两个块完成后用 os._exit 硬杀（不执行 finally、不关闭文件）：
+# between_chunks —— 读第三块前被杀；mid_write —— 第三块写到一半被杀
+KILLED_EXPORT = """
+import asyncio, os, sys
+from datetime import datetime
+from pathlib import Path
+from backend.jobs import export_conversations as job
+
+out_dir, kill = Path(sys.argv[1]), sys.argv[2]
+
+async def get_all_characters():
+    return []
+
+async def iter_conversations(after_id=0, chunk_size=3, **filters):
+    for n, start in enumerate(range(after_id + 1, 10, chunk_size)):
+        if n == 2 and kill == "between_chunks":
+            os._exit(1)
+        yield [{"id": i, "user_id": 1, "character_id": 1 + i % 2, "user_message": f"u{i}", "ai_message": f"a{i}",
+                "timestamp": datetime(2026, 1, 1)} for i in range(start, min(start + chunk_size, 10))]
+
+open_output = job.open_output
+
+def killing_open_output(path, compress):
+    writer = open_output(path, compress)
+    state = job.load_state(out_dir)
+    if kill == "mid_write" and state and state["last_id"] >= 6:
+        writer.write('{"id": 7, "user_id"')
+        writer.flush()
+        os._exit(1)
+    return writer
+
+job.character.get_all_characters = get_all_characters
+job.conversation.iter_conversations = iter_conversations
+job.open_output = killing_open_output
+asyncio.run(job.export(out_dir, compress="gzip", chunk_size=3, with_system=False))
+"""
+
+
+def fake_rows(start: int, count: int) -> list[dict]:
+    return [{
+        "id": i,
+        "user_id": 1,
+        "character_id": 1 + i % 2,
+        "user_message": f"u{i}",
+        "ai_message": f"a{i}",
+        "timestamp": datetime(2026, 1, 1),
+    } for i in range(start, start + count)]
+
+
+@pytest.fixture
+def source(monkeypatch):
+    """
+    id 1..9，每块 3 行
+    """
+    async def get_all_characters():
+        return []
+
+    async def iter_conversations(after_id=0, chunk_size=3, **filters):
+        for start in range(after_id + 1, 10, chunk_size):
+            yield fake_rows(start, min(chunk_size, 10 - start))
+
+    monkeypatch.setattr(job.character, "get_all_characters", get_all_characters)
+    monkeypatch.setattr(job.conversation, "iter_conversations", iter_conversations)
+
+
+def exported_ids(out_dir) -> list[int]:
+    ids = []
+    for path in out_dir.glob("character_*.jsonl.gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            ids += [json.loads(line)["id"] for line in f]
+    return sorted(ids)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("kill", ["between_chunks", "mid_write"])
+async def test_killed_export_resumes_without_gaps_or_duplicates(tmp_path, source, kill):
+    proc = subprocess.run(
+        [sys.executable, "-c", KILLED_EXPORT, str(tmp_path), kill],
+        cwd=ROOT, capture_output=True, timeout=60
+    )
+    assert proc.returncode == 1, proc.stderr.decode()
+
+    # 已完成的两个块已落盘并记录进度
+    assert job.load_state(tmp_path)["last_id"] == 6
+    if kill == "between_chunks":
+        assert exported_ids(tmp_path) == list(range(1, 7))
+
+    exported, last_id = await job.export(tmp_path, resume=True, compress="gzip", chunk_size=3, with_system=False)
+
+    assert (exported, last_id) == (3, 9)
+    assert exported_ids(tmp_path) == list(range(1, 10))
+    state = job.load_state(tmp_path)
+    assert (state["last_id"], state["exported"]) == (9, 9)
+
+
+@pytest.mark.anyio
+async def test_resume_with_different_filters_is_refused(tmp_path, source):
+    await job.export(tmp_path, compress="gzip", chunk_size=3, with_system=False)
+
+    with pytest.raises(SystemExit, match="导出条件与上次不同"):
+        await job.export(tmp_path, resume=True, user_id=1, compress="gzip", chunk_size=3, with_system=False)
+    assert exported_ids(tmp_path) == list(range(1, 10))
@@ -0,0 +1,101 @@
+# tests/test_memory.py
+import asyncio
+
+import httpx
+import numpy as np
+import pytest
+
+from backend.services import memory
+from backend.services.memory import MemoryStore, UserMemory
+
+
+@pytest.fixture(autouse=True)
+def memory_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory, "MEMORY_DIR", tmp_path)
+    return tmp_path
+
+
+def unit(rows: int, dim: int = 4, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_save_appends_and_reload_maps_files(memory_dir):
+    mem = UserMemory(7)
+    first, second = unit(2, seed=1), unit(3, seed=2)
+    mem.add(first, [1, 1], ["a", "b"])
+    mem.save()
+    size = (memory_dir / "7.f16").stat().st_size
+    mem.add(second, [2, 1, 2], ["c", "d", "e"])
+    mem.save()
+
+    # 第二次保存只追加新行
+    assert (memory_dir / "7.f16").stat().st_size == size + 3 * 4 * 2
+    loaded = UserMemory(7)
+    loaded.load()
+    assert isinstance(loaded.vectors, np.memmap)
+    assert loaded.texts == ["a", "b", "c", "d", "e"]
+    assert loaded.character_ids.tolist() == [1, 1, 2, 1, 2]
+    np.testing.assert_allclose(loaded.vectors, np.concatenate([first, second]).astype(np.float16))
+    assert loaded.search(second[0], character_id=2, k=1) == ["c"]
+
+
+def test_partial_rows_are_overwritten_by_next_save(memory_dir):
+    mem = UserMemory(7)
+    mem.add(unit(2), [1, 1], ["a", "b"])
+    mem.save()
+    # 模拟写到一半中断：向量文件多出半行，文本文件多出未写完的一行
+    with open(memory_dir / "7.f16", "ab") as f:
+        f.write(b"\0" * 3)
+    with open(memory_dir / "7.jsonl", "ab") as f:
+        f.write(b'"trunc')
+
+    loaded = UserMemory(7)
+    loaded.load()
+    assert loaded.texts == ["a", "b"]
+    loaded.add(unit(1, seed=3), [1], ["c"])
+    loaded.save()
+
+    reloaded = UserMemory(7)
+    reloaded.load()
+    assert reloaded.texts == ["a", "b", "c"]
+    assert (memory_dir / "7.f16").stat().st_size == 3 * 4 * 2
+    assert len(reloaded.vectors) == len(reloaded.character_ids) == 3
+
+
+@pytest.mark.anyio
+async def test_concurrent_loads_share_one_instance(monkeypatch):
+    store = MemoryStore(enabled=True)
+    loads = 0
+    original = UserMemory.load
+
+    def slow_load(self):
+        nonlocal loads
+        loads += 1
+        original(self)
+
+    monkeypatch.setattr(UserMemory, "load", slow_load)
+    results = await asyncio.gather(*(store._get_user(7) for _ in range(5)))
+
+    assert loads == 1
+    assert all(mem is results[0] for mem in results)
+    assert store._loading == {}
+
+
+@pytest.mark.anyio
+async def test_slow_query_embedding_does_not_penalize_chat_endpoints(llm):
+    def handler(request):
+        raise httpx.ReadTimeout("slow embedding", request=request)
+
+    llm.handler = handler
+    store = MemoryStore(enabled=True)
+    store._users[7] = mem = UserMemory(7)
+    mem.add(unit(1), [1], ["a"])
+
+    for _ in range(10):
+        assert await store.recall(7, 1, "hi") == []
+
+    ep = memory.pool.endpoints[0]
+    assert ep.healthy and ep.failures == 0
+    assert ep.breaker.available() and ep.breaker.to_dict()["recent_calls"] == 0
+    assert store.stats()["recall_failures"] == 10
@@ -0,0 +1,53 @@
+# tests/test_read_your_writes.py
+import pytest
+
+from backend import database
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    """
+    模拟配置了只读副本：主库与副本使用不同的引擎对象
+    """
+    monkeypatch.setattr(database, "read_engine", object())
+    monkeypatch.setattr(database, "_recent_writes", type(database._recent_writes)())
+    monkeypatch.setattr(database, "AsyncSessionLocal", lambda: "primary")
+    monkeypatch.setattr(database, "ReadSessionLocal", lambda: "replica")
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(database.time, "monotonic", lambda: clock["now"])
+    return clock
+
+
+def bound_to_primary(session) -> bool:
+    return session == "primary"
+
+
+def test_reads_follow_own_writes_to_primary(replica, monkeypatch):
+    monkeypatch.setattr(database, "READ_YOUR_WRITES_WINDOW", 5)
+
+    assert not bound_to_primary(database.read_session(1))
+
+    database.mark_written(1)
+    assert bound_to_primary(database.read_session(1))
+    # 其他用户不受影响
+    assert not bound_to_primary(database.read_session(2))
+    assert not bound_to_primary(database.read_session())
+
+    replica["now"] += 5
+    assert not bound_to_primary(database.read_session(1))
+
+
+def test_expired_writes_are_pruned(replica, monkeypatch):
+    monkeypatch.setattr(database, "READ_YOUR_WRITES_WINDOW", 5)
+    database.mark_written(1, 2)
+    replica["now"] += 10
+    database.mark_written(3)
+
+    assert list(database._recent_writes) == [3]
+
+
+def test_no_replica_means_nothing_to_track(monkeypatch):
+    monkeypatch.setattr(database, "_recent_writes", type(database._recent_writes)())
+    assert database.read_engine is database.engine
+    database.mark_written(1)
+    assert not database._recent_writes
@@ -0,0 +1,126 @@
+# tests/test_reply_cache.py
+import asyncio
+
+import pytest
+
+from backend.services import reply_cache as module
+from backend.services.reply_cache import ReplyCache, make_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = {"t": 1000.0}
+    monkeypatch.setattr(module.time, "monotonic", lambda: now["t"])
+    return now
+
+
+def test_key_normalizes_message_but_not_character_or_params():
+    base = make_key(1, "你好  World", "m", {"temperature": 0.8})
+    assert make_key(1, " 你好 world ", "m", {"temperature": 0.8}) == base
+    assert make_key(1, "你好\u3000ＷＯＲＬＤ", "m", {"temperature": 0.8}) == base  # 全角字符经 NFKC 归一
+    assert make_key(2, "你好 World", "m", {"temperature": 0.8}) != base
+    assert make_key(1, "你好 World", "m", {"temperature": 0.9}) != base
+
+
+def test_lru_eviction_by_entry_count():
+    cache = ReplyCache(enabled=True, max_entries=2, max_bytes=10 ** 6, ttl=60)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"  # a 变为最近使用
+    cache.put("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry(clock):
+    cache = ReplyCache(enabled=True, max_entries=10, max_bytes=10 ** 6, ttl=60)
+    cache.put("a", "1")
+    clock["t"] += 59
+    assert cache.get("a") == "1"
+    clock["t"] += 2
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0 and cache.stats()["bytes"] == 0
+
+
+def test_memory_cap_evicts_oldest_and_skips_oversized_replies():
+    cache = ReplyCache(enabled=True, max_entries=100, max_bytes=30, ttl=60)
+    cache.put("k1", "x" * 10)   # 12 字节
+    cache.put("k2", "x" * 10)   # 24 字节
+    cache.put("k3", "好" * 3)   # 中文按 UTF-8 计：2 + 9，超出 30 淘汰 k1
+
+    assert cache.get("k1") is None
+    assert cache.stats()["bytes"] == 12 + 11
+    cache.put("big", "x" * 100)
+    assert cache.get("big") is None
+
+
+@pytest.mark.anyio
+async def test_single_flight_collapses_identical_requests():
+    cache = ReplyCache(enabled=True, max_entries=10, max_bytes=10 ** 6, ttl=60)
+    calls = 0
+    release = asyncio.Event()
+
+    async def producer():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "reply"
+
+    tasks = [asyncio.create_task(cache.get_or_generate("k", producer)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert calls == 1
+    assert results.count(("reply", False)) == 1 and results.count(("reply", True)) == 4
+    assert await cache.get_or_generate("k", producer) == ("reply", True)
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["hits"]) == (1, 4, 1)
+    assert stats["hit_ratio"] == 0.5
+
+
+@pytest.mark.anyio
+async def test_leader_failure_is_shared_and_not_cached():
+    cache = ReplyCache(enabled=True, max_entries=10, max_bytes=10 ** 6, ttl=60)
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("backend down")
+
+    results = await asyncio.gather(*(cache.get_or_generate("k", failing) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.anyio
+async def test_cancelled_leader_hands_over_to_a_follower():
+    cache = ReplyCache(enabled=True, max_entries=10, max_bytes=10 ** 6, ttl=60)
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(0.05)
+        return "reply"
+
+    leader = asyncio.create_task(cache.get_or_generate("k", slow))
+    await started.wait()
+    follower = asyncio.create_task(cache.get_or_generate("k", slow))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert await follower == ("reply", False)
+
+
+def test_lookup_counts_hits_and_misses_and_disabled_cache_is_inert():
+    cache = ReplyCache(enabled=True, max_entries=10, max_bytes=10 ** 6, ttl=60)
+    assert cache.lookup("k") is None
+    cache.store("k", "v")
+    assert cache.lookup("k") == "v"
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+    disabled = ReplyCache(enabled=False)
+    disabled.store("k", "v")
+    assert disabled.lookup("k") is None and disabled.stats()["entries"] == 0
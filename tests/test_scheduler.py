@@ -0,0 +1,101 @@
+# tests/test_scheduler.py
+import asyncio
+
+import pytest
+
+from backend.services.scheduler import InferenceScheduler, SchedulerRejected
+
+
+async def run_requests(scheduler: InferenceScheduler, requests: list[str]) -> list[str]:
+    """
+    按顺序提交请求（每个请求占用名额片刻），返回获得名额的先后顺序
+    """
+    order = []
+    release = asyncio.Event()
+
+    async def one(key: str, n: int):
+        async with scheduler.slot(key):
+            order.append(f"{key}{n}")
+            await release.wait()
+
+    tasks = []
+    for n, key in enumerate(requests):
+        tasks.append(asyncio.create_task(one(key, n)))
+        await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.anyio
+async def test_round_robin_between_users():
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=16, max_per_user=8, queue_timeout=5)
+
+    # A 先占满名额并排了三个请求，B 随后只排一个
+    order = await run_requests(scheduler, ["a", "a", "a", "a", "b"])
+
+    # B 不必等 A 的全部请求完成：A 当前的请求结束后紧接着轮到 B
+    assert order == ["a0", "a1", "b4", "a2", "a3"]
+    assert scheduler.stats()["admitted"] == 5
+    assert scheduler.stats()["active"] == 0 and scheduler.stats()["waiting"] == 0
+
+
+@pytest.mark.anyio
+async def test_interleaves_equally_loaded_users():
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=16, max_per_user=8, queue_timeout=5)
+
+    order = await run_requests(scheduler, ["a", "a", "a", "b", "b", "c"])
+
+    assert order == ["a0", "a1", "b3", "c5", "a2", "b4"]
+
+
+@pytest.mark.anyio
+async def test_per_user_limit_and_full_queue_reject():
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=1, max_per_user=2, queue_timeout=5)
+    release = asyncio.Event()
+
+    async def hold(key):
+        async with scheduler.slot(key):
+            await release.wait()
+
+    running = asyncio.create_task(hold("a"))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(hold("a"))
+    await asyncio.sleep(0)
+
+    with pytest.raises(SchedulerRejected) as per_user:
+        scheduler.check_admission("a")
+    assert per_user.value.status_code == 429
+    with pytest.raises(SchedulerRejected) as full:
+        scheduler.check_admission("b")
+    assert full.value.status_code == 503
+    assert full.value.retry_after >= 1
+
+    release.set()
+    await asyncio.gather(running, queued)
+
+
+@pytest.mark.anyio
+async def test_cancelled_waiter_frees_queue_position():
+    scheduler = InferenceScheduler(max_concurrency=1, max_queue=4, max_per_user=4, queue_timeout=5)
+    release = asyncio.Event()
+
+    async def hold(key):
+        async with scheduler.slot(key):
+            await release.wait()
+
+    running = asyncio.create_task(hold("a"))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold("b"))
+    await asyncio.sleep(0)
+    assert scheduler.stats()["waiting"] == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert scheduler.stats()["waiting"] == 0
+    assert scheduler.stats()["cancelled_queued"] == 1
+
+    release.set()
+    await running
+    assert scheduler.stats()["active"] == 0
@@ -0,0 +1,141 @@
+# tests/test_sessions.py
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import jwt_handler
+from backend.routes import pages
+from backend.services.sessions import MemorySessionBackend, SessionManager
+
+
+@pytest.fixture
+def manager():
+    return SessionManager(backend=MemorySessionBackend(), ttl=3600)
+
+
+@pytest.mark.anyio
+async def test_refresh_rotates_token_and_rejects_reuse(manager):
+    sid, token = await manager.create(7)
+
+    refreshed = await manager.refresh(token)
+    assert refreshed is not None
+    new_sid, user_id, new_token = refreshed
+    assert (new_sid, user_id) == (sid, 7)
+    assert new_token != token
+
+    # 旧令牌（如被窃取后重放）不能再换取访问令牌，新令牌不受影响
+    assert await manager.refresh(token) is None
+    assert (await manager.refresh(new_token))[1] == 7
+    assert manager.stats()["rejected"] == 1
+
+
+@pytest.mark.anyio
+async def test_malformed_refresh_tokens_are_rejected(manager):
+    for token in ("", "no-dot", ".secret", "sid."):
+        assert await manager.refresh(token) is None
+
+
+@pytest.mark.anyio
+async def test_end_requires_current_secret(manager):
+    sid, token = await manager.create(7)
+
+    assert await manager.end(f"{sid}.forged") is None
+    assert len(manager.backend) == 1
+
+    assert await manager.end(token) == sid
+    assert len(manager.backend) == 0
+    assert await manager.refresh(token) is None
+
+
+@pytest.fixture
+def client(monkeypatch, manager):
+    monkeypatch.setattr(pages, "session_manager", manager)
+    monkeypatch.setattr(jwt_handler, "token_cache", jwt_handler.VerifiedTokenCache())
+    app = FastAPI()
+    app.include_router(pages.router)
+
+    @app.get("/whoami")
+    async def whoami(user_id=pages.Depends(jwt_handler.get_current_user_id)):
+        return {"user_id": user_id}
+
+    with TestClient(app) as c:
+        c.manager = manager
+        yield c
+
+
+def send(client, path: str, method: str = "post", **cookies):
+    """
+    只带指定 Cookie 发请求，返回响应
+    """
+    client.cookies.clear()
+    for name, value in cookies.items():
+        client.cookies.set(name, value)
+    return client.request(method.upper(), path)
+
+
+def login(client, user_id: int = 7) -> tuple[str, str]:
+    """
+    直接创建会话并换发访问令牌（等同于登录成功）
+    :return: (刷新令牌, 访问令牌)
+    """
+    _, token = client.portal.call(client.manager.create, user_id)
+    resp = send(client, "/refresh", refresh_token=token)
+    assert resp.status_code == 200
+    return resp.cookies["refresh_token"], resp.cookies["access_token"]
+
+
+def test_refresh_endpoint_rotates_cookies(client):
+    token, access = login(client)
+    assert send(client, "/whoami", "get", access_token=access).json() == {"user_id": 7}
+
+    resp = send(client, "/refresh", refresh_token=token)
+    assert resp.status_code == 200
+    assert resp.cookies["refresh_token"] != token
+
+    # 重放已轮换的刷新令牌被拒绝
+    resp = send(client, "/refresh", refresh_token=token)
+    assert resp.status_code == 401
+
+
+@pytest.mark.parametrize("method, path", [("post", "/refresh"), ("get", "/login")])
+def test_losing_a_concurrent_refresh_keeps_the_winners_cookies(client, method, path):
+    token, _ = login(client)
+    # 另一个标签页先完成了轮换
+    winner = send(client, "/refresh", refresh_token=token)
+    assert winner.status_code == 200
+
+    loser = send(client, path, method, refresh_token=token)
+
+    assert loser.status_code == (401 if path == "/refresh" else 200)
+    assert "set-cookie" not in loser.headers
+    assert send(client, "/refresh", refresh_token=winner.cookies["refresh_token"]).status_code == 200
+
+
+def test_logout_with_access_token_ends_session(client):
+    token, access = login(client)
+
+    assert send(client, "/logout", access_token=access, refresh_token=token).json() == {"success": True}
+
+    assert send(client, "/whoami", "get", access_token=access).json() == {"user_id": None}
+    assert send(client, "/refresh", refresh_token=token).status_code == 401
+
+
+def test_logout_with_refresh_token_only(client):
+    token, _ = login(client)
+
+    send(client, "/logout", refresh_token=token)
+
+    assert len(client.manager.backend) == 0
+    assert send(client, "/refresh", refresh_token=token).status_code == 401
+
+
+def test_forged_refresh_cookie_cannot_end_another_session(client):
+    token, access = login(client)
+    sid = token.split(".")[0]
+
+    send(client, "/logout", refresh_token=f"{sid}.forged")
+
+    assert len(client.manager.backend) == 1
+    assert jwt_handler.token_cache.stats()["revoked_sessions"] == 0
+    assert send(client, "/whoami", "get", access_token=access).json() == {"user_id": 7}
+    assert send(client, "/refresh", refresh_token=token).status_code == 200
@@ -0,0 +1,52 @@
+# tests/test_static_pages.py
+import gzip
+from email.utils import formatdate
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.routes import pages
+from backend.services import templates
+from backend.services.templates import StaticPageCache
+
+
+@pytest.fixture
+def client(monkeypatch):
+    templates.init_template_cache()
+    monkeypatch.setattr(pages, "static_pages", StaticPageCache())
+    app = FastAPI()
+    app.include_router(pages.router)
+    with TestClient(app) as c:
+        yield c
+
+
+def test_page_is_served_gzipped_and_revalidated_by_etag(client):
+    resp = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-encoding"] == "gzip"
+    etag = resp.headers["etag"]
+    assert etag.endswith('-gz"')
+
+    again = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert pages.static_pages.stats() == {"pages": 1, "rendered": 1, "not_modified": 1}
+
+    plain = client.get("/", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["etag"] == etag.replace("-gz", "")
+    assert gzip.decompress(pages.static_pages.get("index.html").gzip_body) == plain.content
+
+
+def test_last_modified_follows_asset_rebuild(client, monkeypatch):
+    template_mtime = int((templates.FRONTEND_DIR / "index.html").stat().st_mtime)
+    built_at = template_mtime + 3600
+    monkeypatch.setattr(templates.asset_manifest, "built_at", float(built_at))
+
+    resp = client.get("/")
+    assert resp.headers["last-modified"] == formatdate(built_at, usegmt=True)
+
+    # 只比模板新、但早于资源构建时间的缓存副本已过时
+    stale = client.get("/", headers={"If-Modified-Since": formatdate(template_mtime, usegmt=True)})
+    assert stale.status_code == 200
+    fresh = client.get("/", headers={"If-Modified-Since": resp.headers["last-modified"]})
+    assert fresh.status_code == 304
@@ -0,0 +1,60 @@
+# tests/test_token_cache.py
+import time
+from datetime import timedelta
+
+from jose import jwt
+
+from jwt_handler import ALGORITHM, VerifiedTokenCache, create_access_token
+
+
+def forged(sub: str = "1", exp_in: float = 10 ** 9) -> str:
+    return jwt.encode({"sub": sub, "exp": time.time() + exp_in}, "not-the-secret", algorithm=ALGORITHM)
+
+
+def test_revoked_token_is_rejected_until_it_expires():
+    cache = VerifiedTokenCache()
+    token = create_access_token({"sub": "1", "sid": "s1"}, expires_delta=timedelta(minutes=5))
+    assert cache.claims(token) == ("1", "s1")
+
+    cache.revoke(token)
+
+    assert cache.claims(token) is None
+    assert cache.stats()["revoked"] == 1
+
+
+def test_forged_tokens_are_not_recorded():
+    cache = VerifiedTokenCache()
+    for i in range(100):
+        cache.revoke(forged(sub=str(i)))
+    cache.revoke("not a jwt")
+
+    assert cache.stats()["revoked"] == 0
+
+
+def test_revocations_are_capped_and_pruned():
+    cache = VerifiedTokenCache(max_size=3)
+    tokens = [create_access_token({"sub": str(i)}, expires_delta=timedelta(minutes=5)) for i in range(5)]
+    for token in tokens:
+        cache.revoke(token)
+
+    assert cache.stats()["revoked"] == 3
+    assert cache.stats()["revocations_evicted"] == 2
+
+    # 已过期的注销记录在查询时清理
+    key = cache._digest(tokens[-1])
+    cache._revoked[key] = time.time() - 1
+    assert not cache._still_revoked(cache._revoked, key, time.time())
+    assert key not in cache._revoked
+
+
+def test_revoked_session_rejects_cached_tokens_and_is_capped():
+    cache = VerifiedTokenCache(max_size=2)
+    token = create_access_token({"sub": "1", "sid": "s1"}, expires_delta=timedelta(minutes=5))
+    assert cache.claims(token) == ("1", "s1")
+
+    cache.revoke_session("s1")
+    assert cache.claims(token) is None
+
+    cache.revoke_session("s2")
+    cache.revoke_session("s3")
+    assert list(cache._revoked_sessions) == ["s2", "s3"]
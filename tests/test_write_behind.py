@@ -0,0 +1,136 @@
+# tests/test_write_behind.py
+import asyncio
+
+import pytest
+
+from backend.services import context, write_behind
+from backend.services.write_behind import ConversationWriter
+
+
+class FakeDB:
+    """
+    save_conversations_bulk 的替身：提交需要一段时间，可让前几次提交失败
+    """
+
+    def __init__(self, commit_delay: float = 0.05, failures: int = 0):
+        self.rows: list[dict] = []
+        self.commit_delay = commit_delay
+        self.failures = failures
+        self.committing = asyncio.Event()
+
+    async def save_conversations_bulk(self, records):
+        self.committing.set()
+        await asyncio.sleep(self.commit_delay)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is down")
+        self.rows.extend(records)
+        return len(records)
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    fake = FakeDB()
+    monkeypatch.setattr(write_behind.conversation, "save_conversations_bulk", fake.save_conversations_bulk)
+    monkeypatch.setattr(write_behind, "SPILL_FILE", tmp_path / "spill.jsonl")
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_FLUSH_INTERVAL", 0.01)
+    return fake
+
+
+@pytest.mark.anyio
+async def test_stop_during_commit_writes_each_turn_once(db):
+    writer = ConversationWriter(enabled=True)
+    writer.start()
+    for i in range(5):
+        await writer.save(1, 1, f"u{i}", f"a{i}")
+    await db.committing.wait()
+    # 此时第一批正在提交，再来两条
+    await writer.save(1, 1, "u5", "a5")
+    await writer.save(1, 1, "u6", "a6")
+
+    await writer.stop()
+
+    assert [r["user_message"] for r in db.rows] == [f"u{i}" for i in range(7)]
+    assert writer.pending(1, 1) == []
+    assert not write_behind.SPILL_FILE.exists()
+
+
+@pytest.mark.anyio
+async def test_pending_keeps_batch_until_committed(db):
+    writer = ConversationWriter(enabled=True)
+    writer.start()
+    await writer.save(1, 1, "u0", "a0")
+    await writer.save(2, 1, "other", "user")
+    await db.committing.wait()
+
+    # 提交尚未完成：仍能读到，且不会重复
+    assert [r["user_message"] for r in writer.pending(1, 1)] == ["u0"]
+    assert writer.stats()["buffered"] == 2
+
+    await writer.stop()
+    assert writer.pending(1, 1) == []
+
+
+@pytest.mark.anyio
+async def test_unavailable_database_spills_on_stop(db):
+    db.failures = 10
+    writer = ConversationWriter(enabled=True)
+    writer.start()
+    await writer.save(1, 1, "u0", "a0")
+    await db.committing.wait()
+
+    await writer.stop()
+
+    assert db.rows == []
+    assert write_behind.SPILL_FILE.read_text(encoding="utf-8").count("\n") == 1
+
+
+def test_context_merge_drops_turns_already_read_from_db():
+    db_turns = [{"user_message": f"u{i}", "ai_message": f"a{i}"} for i in range(3)]
+    committed_batch = [{"user_message": "u2", "ai_message": "a2"}, {"user_message": "u3", "ai_message": "a3"}]
+
+    assert context._overlap(db_turns, committed_batch) == 1
+    assert context._overlap(db_turns[:2], committed_batch) == 0
+    assert context._overlap(db_turns, []) == 0
+
+
+@pytest.mark.anyio
+async def test_spill_file_kept_until_replayed_rows_are_written(db):
+    db.failures = 10
+    writer = ConversationWriter(enabled=True)
+    writer.start()
+    await writer.save(1, 1, "u0", "a0")
+    await writer.stop()
+
+    # 重启后数据库仍不可用：重放文件不能删除，再次停机时写回溢写文件
+    writer = ConversationWriter(enabled=True)
+    writer.start()
+    replay = write_behind.SPILL_FILE.with_suffix(".replaying")
+    assert replay.exists() and writer.pending(1, 1)
+    await writer.stop()
+    assert not replay.exists()
+    assert write_behind.SPILL_FILE.read_text(encoding="utf-8").count("\n") == 1
+
+    # 数据库恢复：落库后才删除
+    db.failures = 0
+    writer = ConversationWriter(enabled=True)
+    writer.start()
+    await writer.save(1, 1, "u1", "a1")
+    await writer.stop()
+    assert [r["user_message"] for r in db.rows] == ["u0", "u1"]
+    assert not replay.exists() and not write_behind.SPILL_FILE.exists()
+
+
+@pytest.mark.anyio
+async def test_interrupted_replay_is_resumed_on_next_start(db):
+    replay = write_behind.SPILL_FILE.with_suffix(".replaying")
+    line = '{"user_id": 1, "character_id": 1, "user_message": "%s", "ai_message": "a", "timestamp": "2024-01-01T00:00:00+00:00"}\n'
+    replay.write_text(line % "old", encoding="utf-8")
+    write_behind.SPILL_FILE.write_text(line % "new", encoding="utf-8")
+
+    writer = ConversationWriter(enabled=True)
+    writer.start()
+    await writer.stop()
+
+    assert [r["user_message"] for r in db.rows] == ["old", "new"]
+    assert not replay.exists() and not write_behind.SPILL_FILE.exists()